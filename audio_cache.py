@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Iterator, Optional, Tuple
+
+from AIAPI import llm, metrics, resilience
+from AIAPI.singleflight import SingleFlight
+from AIAPI.governor import upstream_governor
+
+logger = logging.getLogger(__name__)
+
+# --- Caché de audio TTS en disco, direccionada por contenido ---
+# La clave es el sha256 de (texto, voz, modelo, formato): el mismo texto con la
+# misma voz nunca se sintetiza dos veces y el archivo es inmutable.
+AUDIO_CACHE_DIR = os.getenv("MILO_AUDIO_CACHE_DIR", "./audio_cache")
+AUDIO_CACHE_MAX_BYTES = int(float(os.getenv("MILO_AUDIO_CACHE_MAX_MB", "500")) * 1024 * 1024)
+TTS_MODEL = os.getenv("MILO_TTS_MODEL", "tts-1")
+TTS_VOICES = {"alloy", "echo", "fable", "onyx", "nova", "shimmer"}
+DEFAULT_VOICE = os.getenv("MILO_TTS_VOICE", "alloy")
+AUDIO_FORMAT = "mp3"
+CHUNK_SIZE = 64 * 1024
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """El rango pedido queda fuera del archivo"""
+
+
+def make_audio_key(text: str, voice: str = DEFAULT_VOICE, model: str = TTS_MODEL) -> str:
+    raw = json.dumps([text.strip(), voice, model, AUDIO_FORMAT], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpretar una cabecera Range de un solo rango en bytes.
+    Retorna (inicio, fin) inclusivos, o None si no hay cabecera o no se entiende
+    (en ese caso se sirve el archivo completo, como permite RFC 9110).
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        # Sufijo: los últimos N bytes
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def iter_file(path: str, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+    """Leer el archivo por bloques sin cargarlo entero en memoria"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class AudioCache:
+    """Archivos .mp3 en disco con tope de tamaño y expulsión LRU por fecha de último acceso (mtime)"""
+
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # bytes en disco según este proceso; se recalcula al expulsar
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.{AUDIO_FORMAT}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Ruta del audio si está en caché (y marcarlo como usado recientemente)"""
+        if not KEY_PATTERN.match(key):
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """Guardar el audio de forma atómica y expulsar lo más antiguo si se supera el tope"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(f".{AUDIO_FORMAT}"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # expulsado por otro worker
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _path, size, _mtime in self._entries())
+
+    def _evict(self, keep: str = None):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _path, size, _mtime in entries)
+        for path, size, _mtime in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                metrics.AUDIO_CACHE_EVICTIONS.inc()
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._size is None and os.path.isdir(self.directory):
+                self._size = self._scan_size()
+            return {"bytes": self._size or 0, "max_bytes": self.max_bytes}
+
+
+_audio_cache = None
+tts_flight = SingleFlight("tts")
+
+
+def get_audio_cache() -> AudioCache:
+    global _audio_cache
+    if _audio_cache is None:
+        _audio_cache = AudioCache()
+    return _audio_cache
+
+
+async def synthesize(text: str, voice: str = DEFAULT_VOICE, model: str = TTS_MODEL, mode: str = "audio") -> Tuple[str, bool]:
+    """
+    Retorna (clave, hit) del audio del texto, sintetizándolo solo si no está en caché.
+    Las peticiones concurrentes del mismo audio comparten una única llamada TTS.
+    """
+    cache = get_audio_cache()
+    key = make_audio_key(text, voice, model)
+    if await asyncio.to_thread(cache.get, key):
+        metrics.AUDIO_CACHE_REQUESTS.labels(result="hit").inc()
+        return key, True
+    metrics.AUDIO_CACHE_REQUESTS.labels(result="miss").inc()
+
+    async def generate():
+        async def create():
+            return await llm.get_client().audio.speech.create(
+                model=model, input=text, voice=voice, response_format=AUDIO_FORMAT
+            )
+
+        async with upstream_governor.slot(mode):
+            speech = await resilience.call_upstream(mode, create)
+        await asyncio.to_thread(cache.put, key, speech.content)
+        return key
+
+    return await tts_flight.do(key, generate), False
@@ -0,0 +1,276 @@
+"""
+Generación masiva offline a partir de un archivo JSONL, sin pasar por los workers de la API.
+
+Cada línea es un trabajo:
+    {"id": "j1", "mode": "mensaje_diario", "prompt": "", "user_vars": {...}}
+    {"id": "j2", "mode": "text", "prompt": "Dame un consejo", "target": "messages", "user_id": 3}
+    {"id": "j3", "mode": "silencio_sagrado", "target": "pool"}
+    {"id": "j4", "target": "welcome", "session_id": "..."}
+
+target:
+- (omitido) solo se escribe en el JSONL de salida
+- messages: además guarda la respuesta como mensaje 'ai' del usuario `user_id`
+- pool: siembra el pool de contenido del modo (content_pool_items)
+- welcome: genera y guarda welcome_message en la sesión de onboarding `session_id`
+
+Uso:
+    python batch.py jobs.jsonl --output results.jsonl --concurrency 8
+    python batch.py --backfill-welcome --checkpoint welcome.ckpt
+    python batch.py --seed-pool silencio_sagrado=60 ritual_diario=40
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from AIAPI import crud, llm, models
+from AIAPI.database import SessionLocal
+from AIAPI.prompts import get_prompt_by_mode, PROMPTS
+from AIAPI.content_pool import POOL_MODES, approve
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("batch")
+
+
+def job_id(job: dict, line_number: int) -> str:
+    """Identificador estable del trabajo para el checkpoint"""
+    if job.get("id") or job.get("request_id"):
+        return str(job.get("id") or job.get("request_id"))
+    raw = json.dumps(job, sort_keys=True, ensure_ascii=False)
+    return f"line{line_number}-{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:10]}"
+
+
+def read_jobs(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                job = json.loads(line)
+                job["id"] = job_id(job, line_number)
+                yield job
+
+
+def backfill_welcome_jobs():
+    """Trabajos para las sesiones de onboarding vigentes sin mensaje de bienvenida"""
+    db = SessionLocal()
+    try:
+        sessions = db.query(models.UserOnboardingSession).filter(
+            models.UserOnboardingSession.welcome_message.is_(None),
+            models.UserOnboardingSession.full_name.isnot(None)
+        ).all()
+        return [{"id": f"welcome-{s.session_id}", "target": "welcome", "session_id": s.session_id} for s in sessions]
+    finally:
+        db.close()
+
+
+def seed_pool_jobs(specs: list):
+    """Trabajos de siembra del pool: ["silencio_sagrado=60", ...]"""
+    # Ids por día: relanzar el mismo día con --checkpoint reanuda en lugar de duplicar
+    stamp = time.strftime("%Y%m%d", time.gmtime())
+    jobs = []
+    for spec in specs:
+        mode, _, count = spec.partition("=")
+        if mode not in POOL_MODES:
+            raise SystemExit(f"Modo sin pool de contenido: {mode}")
+        jobs.extend({"id": f"pool-{mode}-{stamp}-{i}", "target": "pool", "mode": mode}
+                    for i in range(int(count or POOL_MODES[mode]["capacity"])))
+    return jobs
+
+
+def load_checkpoint(path: str) -> set:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+async def generate_text(job: dict, model: str) -> str:
+    mode = job.get("mode", "text")
+    prompt = job.get("prompt") or ""
+    if mode in PROMPTS:
+        prompt = get_prompt_by_mode(mode, job.get("user_vars"), prompt)
+    elif not prompt:
+        raise ValueError("Trabajo sin prompt")
+    # El pool busca variedad; el resto usa la temperatura del perfil del modo
+    temperature = 1.0 if job.get("target") == "pool" else None
+    return await llm.chat([{"role": "user", "content": prompt}], model=model, temperature=temperature, mode=mode)
+
+
+async def run_job(job: dict, model: str) -> dict:
+    """Ejecutar un trabajo y persistirlo según su target"""
+    target = job.get("target")
+
+    if target == "welcome":
+        def load_session():
+            db = SessionLocal()
+            try:
+                return crud.get_onboarding_session(db, job["session_id"])
+            finally:
+                db.close()
+
+        session = await asyncio.to_thread(load_session)
+        if not session:
+            return {"status": "skipped", "reason": "sesión no encontrada o expirada"}
+        if session.welcome_message:
+            return {"status": "skipped", "reason": "ya tiene mensaje", "text": session.welcome_message}
+        # Sin texto genérico: un fallo del upstream va a los reintentos y no se guarda
+        text = await crud.generate_welcome_message(session, fallback=False)
+
+        def store():
+            db = SessionLocal()
+            try:
+                crud.update_onboarding_session(db, job["session_id"], welcome_message=text)
+            finally:
+                db.close()
+
+        await asyncio.to_thread(store)
+        return {"status": "ok", "text": text}
+
+    text = await generate_text(job, model)
+
+    if target == "pool":
+        mode = job["mode"]
+        approved = approve(text, POOL_MODES[mode]["max_words"])
+        if not approved:
+            return {"status": "rejected", "text": text}
+
+        def store():
+            db = SessionLocal()
+            try:
+                crud.create_content_pool_items(db, mode, [approved])
+            finally:
+                db.close()
+
+        await asyncio.to_thread(store)
+        return {"status": "ok", "text": approved}
+
+    if target == "messages":
+        def store():
+            db = SessionLocal()
+            try:
+                crud.create_message(db, int(job["user_id"]), "ai", text)
+            finally:
+                db.close()
+
+        await asyncio.to_thread(store)
+
+    return {"status": "ok", "text": text}
+
+
+async def run_batch(jobs: list, args) -> dict:
+    done_ids = load_checkpoint(args.checkpoint)
+    pending = [job for job in jobs if job["id"] not in done_ids]
+    skipped = len(jobs) - len(pending)
+    if skipped:
+        logger.info(f"Reanudando: {skipped} trabajos ya completados según el checkpoint")
+
+    queue = asyncio.Queue()
+    for job in pending:
+        queue.put_nowait(job)
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    checkpoint = open(args.checkpoint, "a", encoding="utf-8") if args.checkpoint else None
+    stats = {"ok": 0, "failed": 0, "other": 0}
+    start = time.perf_counter()
+
+    def record(job: dict, result: dict):
+        if output:
+            output.write(json.dumps({"id": job["id"], "job": job, **result}, ensure_ascii=False) + "\n")
+            output.flush()
+        if checkpoint and result["status"] != "failed":
+            checkpoint.write(job["id"] + "\n")
+            checkpoint.flush()
+
+    async def worker():
+        while not queue.empty():
+            job = queue.get_nowait()
+            for attempt in range(args.retries + 1):
+                try:
+                    result = await run_job(job, args.model)
+                    break
+                except Exception as e:
+                    if attempt == args.retries:
+                        logger.error(f"Trabajo {job['id']} falló tras {attempt + 1} intentos: {e}")
+                        result = {"status": "failed", "error": str(e)}
+                        break
+                    # Backoff exponencial con jitter
+                    delay = args.backoff * (2 ** attempt) * (0.5 + random.random())
+                    logger.warning(f"Trabajo {job['id']} falló ({e}); reintento en {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            status = result["status"]
+            stats[status if status in ("ok", "failed") else "other"] += 1
+            record(job, result)
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.report_every)
+            finished = stats["ok"] + stats["failed"] + stats["other"]
+            elapsed = time.perf_counter() - start
+            logger.info(f"Progreso: {finished}/{len(pending)} trabajos, {finished / elapsed:.2f} trabajos/s")
+
+    reporter = asyncio.ensure_future(report())
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    finally:
+        reporter.cancel()
+        if output:
+            output.close()
+        if checkpoint:
+            checkpoint.close()
+        await llm.close_client()
+
+    elapsed = time.perf_counter() - start
+    finished = stats["ok"] + stats["failed"] + stats["other"]
+    summary = {
+        "jobs": len(jobs),
+        "skipped_from_checkpoint": skipped,
+        "ok": stats["ok"],
+        "failed": stats["failed"],
+        "skipped_or_rejected": stats["other"],
+        "seconds": round(elapsed, 2),
+        "jobs_per_second": round(finished / elapsed, 2) if elapsed else 0.0,
+    }
+    logger.info(f"Resumen: {json.dumps(summary, ensure_ascii=False)}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generación masiva offline desde JSONL")
+    parser.add_argument("input", nargs="?", help="archivo JSONL de trabajos")
+    parser.add_argument("--output", help="JSONL de resultados (se agrega al final)")
+    parser.add_argument("--checkpoint", help="archivo de checkpoint para reanudar")
+    parser.add_argument("--concurrency", type=int, default=4, help="llamadas simultáneas al modelo")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=1.0, help="espera base del backoff en segundos")
+    parser.add_argument("--model", default=None, help="forzar un modelo (por defecto, el del perfil de cada modo)")
+    parser.add_argument("--report-every", type=float, default=10.0, help="segundos entre reportes de progreso")
+    parser.add_argument("--backfill-welcome", action="store_true",
+                        help="generar welcome_message para las sesiones de onboarding que no lo tienen")
+    parser.add_argument("--seed-pool", nargs="+", metavar="MODO=N", help="sembrar el pool de contenido")
+    args = parser.parse_args()
+
+    jobs = []
+    if args.input:
+        jobs.extend(read_jobs(args.input))
+    if args.backfill_welcome:
+        jobs.extend(backfill_welcome_jobs())
+    if args.seed_pool:
+        jobs.extend(seed_pool_jobs(args.seed_pool))
+    if not jobs:
+        parser.error("no hay trabajos: indica un archivo JSONL, --backfill-welcome o --seed-pool")
+
+    summary = asyncio.run(run_batch(jobs, args))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from AIAPI import metrics
+from AIAPI.prompts import get_prompt_version
+
+# --- Caché de respuestas para los modos sin estado de PROMPTS ---
+# TTL en segundos por modo. Solo se cachean los modos listados aquí;
+# dialogo_sagrado y medita_conmigo siempre generan una respuesta nueva.
+CACHE_TTLS = {
+    "silencio_sagrado": 6 * 3600,
+    "mensaje_diario": 6 * 3600,
+    "ritual_diario": 6 * 3600,
+    "diario_vivo": 3 * 3600,
+    "mapa_interior": 3600,
+}
+
+# Sobrescribir TTLs por entorno: MILO_CACHE_TTLS="silencio_sagrado=600,ritual_diario=0"
+for _item in os.getenv("MILO_CACHE_TTLS", "").split(","):
+    if "=" in _item:
+        _mode, _ttl = _item.split("=", 1)
+        CACHE_TTLS[_mode.strip()] = int(_ttl)
+
+CACHE_BACKEND = os.getenv("MILO_CACHE_BACKEND", "memory")  # memory | sqlite
+CACHE_PATH = os.getenv("MILO_CACHE_PATH", "./milo_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("MILO_CACHE_MAX_ENTRIES", "1000"))
+
+# Cabecera para saltarse la caché (la respuesta nueva sí se guarda)
+BYPASS_HEADER = "X-Cache-Bypass"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizar el prompt para que variaciones de espacios o mayúsculas compartan entrada"""
+    return " ".join(prompt.split()).casefold()
+
+
+def make_cache_key(mode: str, prompt: str, model: str) -> str:
+    """Clave estable: modo, prompt normalizado, modelo y versión del template"""
+    raw = json.dumps([mode, normalize_prompt(prompt), model, get_prompt_version(mode)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """Caché LRU en memoria del proceso con expiración por entrada"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Caché LRU en un archivo SQLite, compartida entre los workers de uvicorn
+    de la misma máquina. Sus llamadas bloquean (lock del archivo, timeout=5):
+    ResponseCache las ejecuta en un hilo, nunca en el event loop.
+
+    La expulsión corre cada `evict_every` escrituras en lugar de contar la tabla
+    en cada set, así que el archivo puede superar max_entries en ese margen.
+    """
+    blocking = True
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES, evict_every: int = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every or max(1, max_entries // 20)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_response_cache_last_access ON response_cache (last_access)"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._writes += 1
+            if self._writes >= self.evict_every:
+                self._writes = 0
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Expulsar primero lo expirado y después lo menos usado recientemente"""
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM response_cache ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Caché de completions por modo con TTL por modo y contadores de aciertos"""
+
+    def __init__(self, backend, ttls: dict = None):
+        self.backend = backend
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.hits = 0
+        self.misses = 0
+
+    def is_cacheable(self, mode: str) -> bool:
+        return self.ttls.get(mode, 0) > 0
+
+    async def _call(self, fn, *args):
+        """Los backends que bloquean (SQLite) corren en un hilo; el de memoria, directo"""
+        if getattr(self.backend, "blocking", False):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, mode: str, prompt: str, model: str) -> Optional[str]:
+        value = await self._call(self.backend.get, make_cache_key(mode, prompt, model))
+        if value is None:
+            self.misses += 1
+            metrics.RESPONSE_CACHE_REQUESTS.labels(mode=mode, result="miss").inc()
+        else:
+            self.hits += 1
+            metrics.RESPONSE_CACHE_REQUESTS.labels(mode=mode, result="hit").inc()
+        return value
+
+    async def set(self, mode: str, prompt: str, model: str, value: str):
+        if value and self.is_cacheable(mode):
+            await self._call(self.backend.set, make_cache_key(mode, prompt, model), value, self.ttls[mode])
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.backend)}
+
+
+_response_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Obtener (o crear) la caché de respuestas según MILO_CACHE_BACKEND"""
+    global _response_cache
+    if _response_cache is None:
+        if CACHE_BACKEND == "sqlite":
+            backend = SQLiteCacheBackend(CACHE_PATH, CACHE_MAX_ENTRIES)
+        else:
+            backend = MemoryCacheBackend(CACHE_MAX_ENTRIES)
+        _response_cache = ResponseCache(backend)
+    return _response_cache
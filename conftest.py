@@ -0,0 +1,45 @@
+import os
+import uuid
+import shutil
+import tempfile
+
+import pytest
+
+# Base de datos propia de la sesión de pruebas, migrada antes de importar
+# AIAPI.database: las pruebas nunca tocan ./milo.db ni la de DATABASE_URL.
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="milo_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DB_DIR, 'milo_test.db')}"
+
+
+def pytest_configure(config):
+    from AIAPI import migrations
+    from AIAPI.database import engine
+
+    migrations.upgrade(engine)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_TEST_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def rate_limit_buckets(monkeypatch):
+    """Cubos en memoria por prueba: nunca se toca el archivo compartido de un servidor real"""
+    from AIAPI.ratelimit import MemoryBuckets, rate_limiter
+
+    monkeypatch.setattr(rate_limiter, "_store", MemoryBuckets())
+
+
+@pytest.fixture
+def auth_headers():
+    """
+    Registrar un usuario y obtener sus cabeceras Bearer: `headers = await auth_headers(ac)`.
+    Sin username se crea uno nuevo por llamada.
+    """
+    async def login(ac, username: str = None, password: str = "milotest123") -> dict:
+        username = username or f"test-{uuid.uuid4().hex[:8]}"
+        await ac.post("/register", json={"username": username, "full_name": "Prueba", "password": password})
+        token = (await ac.post("/token", data={"username": username, "password": password})).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return login
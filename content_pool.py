@@ -0,0 +1,244 @@
+import os
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from AIAPI import crud, llm, metrics
+from AIAPI.governor import set_flow
+from AIAPI.database import SessionLocal
+from AIAPI.prompts import get_prompt_by_mode
+
+logger = logging.getLogger(__name__)
+
+# --- Pool de contenido pre-generado para modos cortos ---
+# capacity: tamaño objetivo del reservorio en horas valle
+# low_watermark: por debajo de este número se repone también en horas pico
+# max_words: límite de palabras para aprobar un texto (None = sin límite)
+POOL_MODES = {
+    "silencio_sagrado": {"capacity": 60, "low_watermark": 15, "max_words": 15},
+    "mensaje_diario": {"capacity": 40, "low_watermark": 10, "max_words": 80},
+    "ritual_diario": {"capacity": 40, "low_watermark": 10, "max_words": 120},
+}
+
+POOL_ENABLED = os.getenv("MILO_CONTENT_POOL", "1") == "1"
+# Generar contenido en este proceso. Activarlo en un solo proceso (o usar
+# `batch.py --seed-pool` desde cron): el resto de workers solo sirve lo que hay en la BD.
+POOL_REFILL = os.getenv("MILO_POOL_REFILL", "0") == "1"
+POOL_MAX_AGE_HOURS = int(os.getenv("MILO_POOL_MAX_AGE_HOURS", "24"))  # contenido "del día"
+POOL_REFILL_INTERVAL = int(os.getenv("MILO_POOL_REFILL_INTERVAL", "300"))  # segundos
+POOL_REFILL_BATCH = int(os.getenv("MILO_POOL_REFILL_BATCH", "5"))
+POOL_MAX_TRACKED_USERS = int(os.getenv("MILO_POOL_MAX_TRACKED_USERS", "10000"))
+# Horas valle en UTC, formato "inicio-fin" (fin excluido), p.ej. "2-7"
+POOL_OFFPEAK_HOURS = os.getenv("MILO_POOL_OFFPEAK_HOURS", "2-7")
+
+
+def is_offpeak(now: datetime = None) -> bool:
+    """Indicar si la hora actual (UTC) está dentro de la ventana valle"""
+    start, end = (int(h) for h in POOL_OFFPEAK_HOURS.split("-"))
+    hour = (now or datetime.utcnow()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def approve(text: str, max_words: Optional[int] = None) -> Optional[str]:
+    """Validar un texto generado antes de admitirlo en el pool"""
+    text = (text or "").strip().strip('"').strip()
+    if not text:
+        return None
+    if max_words and len(text.split()) > max_words:
+        return None
+    return text
+
+
+class ContentPool:
+    """
+    Reservorio por modo de textos aprobados. serve() es O(1) esperado: elige al
+    azar entre los elementos en memoria evitando los que el usuario ya recibió.
+    """
+
+    def __init__(self, modes: dict = None):
+        self.modes = POOL_MODES if modes is None else modes
+        self._items = {mode: [] for mode in self.modes}  # [(id, content, created_at)]
+        self._ids = {mode: set() for mode in self.modes}
+        self._seen = OrderedDict()  # (user_id, mode) -> set(item_id), LRU por usuario
+        self._task = None
+        self._refilling = set()
+        self._background = set()
+
+    def size(self, mode: str) -> int:
+        return len(self._items.get(mode, []))
+
+    def serve(self, mode: str, user_id: int) -> Optional[str]:
+        """Entregar un texto del pool que el usuario no haya recibido, o None"""
+        items = self._items.get(mode)
+        if not items:
+            metrics.CONTENT_POOL_REQUESTS.labels(mode=mode, result="empty").inc()
+            return None
+        seen_key = (user_id, mode)
+        seen = self._seen.get(seen_key)
+        if seen is None:
+            seen = self._seen[seen_key] = set()
+            while len(self._seen) > POOL_MAX_TRACKED_USERS:
+                self._seen.popitem(last=False)
+        else:
+            self._seen.move_to_end(seen_key)
+        # Muestreo con rechazo; el recorrido lineal solo ocurre si casi todo está visto
+        for _ in range(8):
+            item_id, content, _created = random.choice(items)
+            if item_id not in seen:
+                break
+        else:
+            unseen = [item for item in items if item[0] not in seen]
+            if not unseen:
+                # El usuario ya recibió todo el reservorio actual
+                metrics.CONTENT_POOL_REQUESTS.labels(mode=mode, result="exhausted").inc()
+                return None
+            item_id, content, _created = random.choice(unseen)
+        seen.add(item_id)
+        metrics.CONTENT_POOL_REQUESTS.labels(mode=mode, result="hit").inc()
+        return content
+
+    def add(self, mode: str, item_id: int, content: str, created_at: datetime):
+        if item_id in self._ids[mode]:
+            return
+        self._ids[mode].add(item_id)
+        self._items[mode].append((item_id, content, created_at))
+        metrics.CONTENT_POOL_SIZE.labels(mode=mode).set(len(self._items[mode]))
+
+    def retire_expired(self, now: datetime = None):
+        """Retirar el contenido más antiguo que POOL_MAX_AGE_HOURS"""
+        cutoff = (now or datetime.utcnow()) - timedelta(hours=POOL_MAX_AGE_HOURS)
+        for mode, items in self._items.items():
+            fresh = [item for item in items if item[2] >= cutoff]
+            if len(fresh) != len(items):
+                self._items[mode] = fresh
+                self._ids[mode] = {item[0] for item in fresh}
+                metrics.CONTENT_POOL_SIZE.labels(mode=mode).set(len(fresh))
+
+    def refill_target(self, mode: str, now: datetime = None, size: int = None) -> int:
+        """
+        Número de textos a generar: hasta capacity en horas valle, solo bajo el low watermark en pico.
+        :param size: textos vigentes (por defecto los de este proceso; refill pasa los de la BD)
+        """
+        config = self.modes[mode]
+        size = self.size(mode) if size is None else size
+        if is_offpeak(now):
+            return max(config["capacity"] - size, 0)
+        if size < config["low_watermark"]:
+            return config["low_watermark"] - size
+        return 0
+
+    async def load(self, modes: list = None) -> dict:
+        """
+        Cargar desde la BD el contenido vigente (incluye lo generado por otros workers o por batch).
+        Retorna {modo: [(id, content, created_at)]} tal como está en la BD.
+        """
+        since = datetime.utcnow() - timedelta(hours=POOL_MAX_AGE_HOURS)
+
+        def read():
+            db = SessionLocal()
+            try:
+                return {
+                    mode: [(i.id, i.content, i.created_at) for i in crud.get_content_pool_items(db, mode, since)]
+                    for mode in (modes or self.modes)
+                }
+            finally:
+                db.close()
+
+        stored = await asyncio.to_thread(read)
+        for mode, items in stored.items():
+            for item in items:
+                self.add(mode, *item)
+        self.retire_expired()
+        return stored
+
+    async def refill(self, mode: str, count: int = None) -> int:
+        """
+        Generar, aprobar y guardar los textos que le faltan al pool compartido de un modo
+        (como mucho `count`). El objetivo se calcula con lo que hay en la BD y se descartan
+        los textos que ya están en ella, no solo los de este proceso.
+        """
+        if mode in self._refilling:
+            return 0
+        self._refilling.add(mode)
+        set_flow("background:content_pool")
+        try:
+            stored = (await self.load([mode]))[mode]
+            target = self.refill_target(mode, size=len(stored))
+            count = target if count is None else min(count, target)
+            if count <= 0:
+                return 0
+            prompt_text = get_prompt_by_mode(mode)
+            known = {item[1] for item in stored}
+            approved = []
+            for start in range(0, count, POOL_REFILL_BATCH):
+                batch = min(POOL_REFILL_BATCH, count - start)
+                results = await asyncio.gather(
+                    *(llm.chat([{"role": "user", "content": prompt_text}], temperature=1.0, mode=mode) for _ in range(batch)),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.warning(f"Error generando contenido del pool ({mode}): {result}")
+                        continue
+                    text = approve(result, self.modes[mode]["max_words"])
+                    if text and text not in known:
+                        known.add(text)
+                        approved.append(text)
+            if not approved:
+                return 0
+
+            def write():
+                db = SessionLocal()
+                try:
+                    return [(i.id, i.content, i.created_at) for i in crud.create_content_pool_items(db, mode, approved)]
+                finally:
+                    db.close()
+
+            for item in await asyncio.to_thread(write):
+                self.add(mode, *item)
+            metrics.CONTENT_POOL_GENERATED.labels(mode=mode).inc(len(approved))
+            return len(approved)
+        finally:
+            self._refilling.discard(mode)
+
+    def trigger_refill(self, mode: str):
+        """Reponer en segundo plano si el modo quedó bajo su low watermark"""
+        if POOL_REFILL and self.size(mode) < self.modes[mode]["low_watermark"] and mode not in self._refilling:
+            task = asyncio.ensure_future(self.refill(mode))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def run(self):
+        """Bucle de mantenimiento: recargar, retirar lo caducado y reponer (solo con POOL_REFILL)"""
+        while True:
+            try:
+                await self.load()
+                if POOL_REFILL:
+                    for mode in self.modes:
+                        await self.refill(mode)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error manteniendo el pool de contenido: {e}")
+            await asyncio.sleep(POOL_REFILL_INTERVAL)
+
+    def start(self):
+        if POOL_ENABLED and self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+content_pool = ContentPool()
@@ -0,0 +1,140 @@
+import os
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from AIAPI import crud, metrics
+
+# --- Contexto de conversación con presupuesto de tokens ---
+# Presupuesto de tokens del prompt (sistema + historial + mensaje actual) por modo.
+# Los modos sin presupuesto no llevan historial.
+CONTEXT_BUDGETS = {
+    "dialogo_sagrado": 1500,
+}
+
+# Sobrescribir por entorno: MILO_CONTEXT_BUDGETS="dialogo_sagrado=2000,text=800"
+for _item in os.getenv("MILO_CONTEXT_BUDGETS", "").split(","):
+    if "=" in _item:
+        _mode, _tokens = _item.split("=", 1)
+        CONTEXT_BUDGETS[_mode.strip()] = int(_tokens)
+
+CONTEXT_DAYS = int(os.getenv("MILO_CONTEXT_DAYS", "7"))
+CONTEXT_MAX_TURNS = int(os.getenv("MILO_CONTEXT_MAX_TURNS", "40"))
+CONTEXT_MAX_USERS = int(os.getenv("MILO_CONTEXT_MAX_USERS", "5000"))
+
+ROLES = {"user": "user", "ai": "assistant"}
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken es opcional
+    _encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación local de tokens: tiktoken si está instalado, si no ~4 caracteres por token"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+class ConversationWindow:
+    """Últimos turnos de un usuario, ya contados, hasta el mayor presupuesto configurado"""
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.turns = deque()  # (id, role, content, tokens, timestamp), del más antiguo al más reciente
+        self.tokens = 0
+        self.last_id = 0
+
+    def append(self, message_id: int, role: str, content: str, timestamp: datetime):
+        tokens = estimate_tokens(content)
+        self.turns.append((message_id, role, content, tokens, timestamp))
+        self.tokens += tokens
+        self.last_id = max(self.last_id, message_id)
+        self.trim()
+
+    def trim(self, now: datetime = None):
+        cutoff = (now or datetime.utcnow()) - timedelta(days=CONTEXT_DAYS)
+        while self.turns and (self.tokens > self.max_tokens or len(self.turns) > CONTEXT_MAX_TURNS
+                              or self.turns[0][4] < cutoff):
+            self.tokens -= self.turns.popleft()[3]
+
+
+class ContextBuilder:
+    """
+    Construye los mensajes para el upstream con los turnos recientes que caben
+    en el presupuesto del modo. La ventana se guarda por usuario (LRU) y en cada
+    turno solo se leen de la BD los mensajes con id posterior al último conocido,
+    así que también ve lo que escriben otros workers.
+    """
+
+    def __init__(self, budgets: dict = None, max_users: int = CONTEXT_MAX_USERS):
+        self.budgets = CONTEXT_BUDGETS if budgets is None else budgets
+        self.max_users = max_users
+        self._windows = OrderedDict()  # user_id -> ConversationWindow
+
+    def uses_history(self, mode: str) -> bool:
+        return self.budgets.get(mode, 0) > 0
+
+    def window(self, db: Session, user_id: int) -> ConversationWindow:
+        """Ventana del usuario, actualizada con los mensajes nuevos desde la última lectura"""
+        window = self._windows.get(user_id)
+        if window is None:
+            metrics.CONVERSATION_WINDOW_CACHE.labels(result="miss").inc()
+            window = ConversationWindow(max(self.budgets.values(), default=0))
+            # get_messages ordena del más reciente al más antiguo: recorrer solo hasta llenar el presupuesto
+            recent = []
+            tokens = 0
+            for message in crud.get_messages(db, user_id, CONTEXT_DAYS):
+                tokens += estimate_tokens(message.content)
+                if tokens > window.max_tokens or len(recent) >= CONTEXT_MAX_TURNS:
+                    window.last_id = max(window.last_id, message.id)
+                    break
+                recent.append(message)
+            for message in reversed(recent):
+                window.append(message.id, message.role, message.content, message.timestamp)
+            self._windows[user_id] = window
+            while len(self._windows) > self.max_users:
+                self._windows.popitem(last=False)
+        else:
+            metrics.CONVERSATION_WINDOW_CACHE.labels(result="hit").inc()
+            self._windows.move_to_end(user_id)
+            for message in crud.get_messages_after(db, user_id, window.last_id, CONTEXT_DAYS):
+                window.append(message.id, message.role, message.content, message.timestamp)
+            window.trim()
+        return window
+
+    def build_messages(self, db: Session, user_id: int, mode: str, system_prompt: str, prompt: str,
+                       exclude_id: Optional[int] = None) -> list:
+        """
+        Mensajes en formato OpenAI: sistema, historial reciente (del más antiguo al
+        más reciente) y el mensaje actual, sin superar el presupuesto del modo.
+        :param exclude_id: id del mensaje actual si ya se guardó en la tabla messages
+        """
+        budget = self.budgets.get(mode, 0) - estimate_tokens(system_prompt) - estimate_tokens(prompt)
+        history = []
+        if budget > 0:
+            for message_id, role, content, tokens, _timestamp in reversed(self.window(db, user_id).turns):
+                if message_id == exclude_id:
+                    continue
+                if tokens > budget:
+                    break
+                budget -= tokens
+                history.append({"role": ROLES.get(role, "user"), "content": content})
+        history.reverse()
+        messages = [{"role": "system", "content": system_prompt}, *history, {"role": "user", "content": prompt}]
+        metrics.CONVERSATION_CONTEXT_TOKENS.labels(mode=mode).observe(
+            sum(estimate_tokens(m["content"]) for m in messages)
+        )
+        return messages
+
+    def invalidate(self, user_id: int):
+        self._windows.pop(user_id, None)
+
+
+context_builder = ContextBuilder()
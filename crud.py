@@ -1,23 +1,21 @@
+import logging
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from AIAPI import models
+from AIAPI import llm
+from AIAPI.passwords import hash_password, verify_password
+from AIAPI.identity import identity_cache
+from AIAPI.pagination import keyset_filter
 import uuid  # <-- Añadido
-import os    # <-- Añadido
-from openai import OpenAI # <-- Añadido
 
-# --- Configuración de OpenAI (Añadido) ---
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-MILO_MODEL_ID = os.getenv("MILO_MODEL_ID", "gpt-3.5-turbo")
-# -----------------------------------------
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 def get_user(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, username: str, full_name: str, password: str):
-    hashed = pwd_context.hash(password)
+def create_user(db: Session, username: str, full_name: str, password: str, hashed_password: str = None):
+    # Los handlers async pasan el hash ya calculado en el ejecutor de bcrypt
+    hashed = hashed_password or hash_password(password)
     db_user = models.User(
         username=username,
         full_name=full_name,
@@ -30,8 +28,19 @@ def create_user(db: Session, username: str, full_name: str, password: str):
 
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user(db, username)
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    if not user or user.disabled or not verify_password(password, user.hashed_password):
+        return None
+    return user
+
+def set_user_disabled(db: Session, user_id: int, disabled: bool = True):
+    """Deshabilitar (o rehabilitar) un usuario; deja de autenticarse en cuanto vence su caché de identidad"""
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
         return None
+    user.disabled = disabled
+    db.commit()
+    db.refresh(user)
+    identity_cache.invalidate(user.username)
     return user
 
 # Message CRUD functions
@@ -43,6 +52,25 @@ def get_messages(db: Session, user_id: int, days: int = 7):
         models.Message.timestamp >= cutoff_date
     ).order_by(models.Message.timestamp.desc()).all()
 
+def get_messages_page(db: Session, user_id: int, days: int, limit: int, before: tuple = None):
+    """Hasta limit + 1 mensajes de los últimos N días anteriores al cursor (timestamp, id), más recientes primero"""
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    query = db.query(models.Message).filter(
+        models.Message.user_id == user_id,
+        models.Message.timestamp >= cutoff_date
+    )
+    query = keyset_filter(query, models.Message.timestamp, models.Message.id, before)
+    return query.order_by(models.Message.timestamp.desc(), models.Message.id.desc()).limit(limit + 1).all()
+
+def get_messages_after(db: Session, user_id: int, after_id: int, days: int = 7):
+    """Get messages for a user with id greater than after_id (last N days), oldest first"""
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    return db.query(models.Message).filter(
+        models.Message.user_id == user_id,
+        models.Message.id > after_id,
+        models.Message.timestamp >= cutoff_date
+    ).order_by(models.Message.id.asc()).all()
+
 def create_message(db: Session, user_id: int, role: str, content: str):
     """Create a new message"""
     db_message = models.Message(
@@ -114,17 +142,17 @@ def complete_onboarding_session(db: Session, session_id: str):
     ]
     
     if all(required_fields):
-        session.is_complete = True
+        session.is_completed = True
         session.completed_at = datetime.utcnow()
         db.commit()
         db.refresh(session)
     
     return session
 
-def transfer_onboarding_to_user(db: Session, session_id: str, email: str, password: str):
+def transfer_onboarding_to_user(db: Session, session_id: str, email: str, password: str, hashed_password: str = None):
     """Transferir datos de onboarding a un nuevo usuario"""
     session = get_onboarding_session(db, session_id)
-    if not session or not session.is_complete:
+    if not session or not is_onboarding_complete(session)[0]:
         return None
     
     # Verificar que el email no exista
@@ -133,7 +161,7 @@ def transfer_onboarding_to_user(db: Session, session_id: str, email: str, passwo
         return None
     
     # Crear usuario con datos del onboarding
-    hashed = pwd_context.hash(password)
+    hashed = hashed_password or hash_password(password)
     user = models.User(
         username=email,  # Email como username
         full_name=session.full_name,
@@ -184,10 +212,32 @@ def cleanup_expired_sessions(db: Session):
     db.commit()
     return len(expired_sessions)
 
+# Content pool CRUD functions
+def get_content_pool_items(db: Session, mode: str, since: datetime):
+    """Obtener contenido aprobado del pool para un modo desde una fecha"""
+    return db.query(models.ContentPoolItem).filter(
+        models.ContentPoolItem.mode == mode,
+        models.ContentPoolItem.approved == True,
+        models.ContentPoolItem.created_at >= since
+    ).order_by(models.ContentPoolItem.id).all()
+
+def create_content_pool_items(db: Session, mode: str, contents: list):
+    """Guardar contenido pre-generado para un modo"""
+    items = [
+        models.ContentPoolItem(mode=mode, content=content, created_at=datetime.utcnow())
+        for content in contents
+    ]
+    db.add_all(items)
+    db.commit()
+    for item in items:
+        db.refresh(item)
+    return items
+
 # --- Función de IA (Añadido al final) ---
-def generate_welcome_message(session: models.UserOnboardingSession) -> str:
+async def generate_welcome_message(session: models.UserOnboardingSession, fallback: bool = True) -> str:
     """
     Llama a la API de OpenAI para generar un mensaje de bienvenida personalizado.
+    :param fallback: si el upstream falla, devolver un texto genérico en lugar de lanzar la excepción
     """
     prompt = (
         f"Eres Milo, un guía espiritual sereno y compasivo. "
@@ -198,16 +248,19 @@ def generate_welcome_message(session: models.UserOnboardingSession) -> str:
     )
 
     try:
-        completion = client.chat.completions.create(
-            model=MILO_MODEL_ID,
-            messages=[
+        return await llm.chat(
+            [
                 {"role": "system", "content": "Eres un guía espiritual llamado Milo. Tus respuestas son serenas, breves y profundas."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7,
-            max_tokens=100
+            mode="welcome"
         )
-        return completion.choices[0].message.content.strip()
     except Exception as e:
-        print(f"Error al llamar a OpenAI: {e}")
-        return f"Bienvenido/a a tu espacio sagrado, {session.full_name or 'viajero/a'}. Que aquí encuentres la serenidad y la guía que buscas."
+        if not fallback:
+            raise
+        logger.warning(f"Error al llamar a OpenAI: {e}")
+        return welcome_fallback(session)
+
+def welcome_fallback(session: models.UserOnboardingSession) -> str:
+    """Bienvenida genérica cuando no se puede generar; no debe guardarse en la sesión"""
+    return f"Bienvenido/a a tu espacio sagrado, {session.full_name or 'viajero/a'}. Que aquí encuentres la serenidad y la guía que buscas."
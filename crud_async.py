@@ -0,0 +1,86 @@
+"""
+Versiones async de las funciones de crud.py y crud_profile.py para los handlers.
+
+Cada función ejecuta la misma consulta que su versión síncrona mediante
+AsyncSession.run_sync: el código ORM no se duplica y el IO va por el driver
+async (aiosqlite / asyncpg), sin bloquear el event loop. Los scripts siguen
+usando crud.py / crud_profile.py con SessionLocal.
+"""
+import functools
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import AIAPI.crud as crud
+import AIAPI.crud_profile as crud_profile
+from AIAPI.passwords import password_hasher
+
+
+async def run_sync(db: AsyncSession, fn, *args, **kwargs):
+    """
+    Ejecutar cualquier función síncrona que reciba una Session (p.ej. context_builder.build_messages).
+    Al terminar se cierra la transacción de lectura que haya quedado abierta, para no
+    retener la conexión del pool mientras el handler espera al upstream.
+    """
+    result = await db.run_sync(lambda session: fn(session, *args, **kwargs))
+    if db.in_transaction():
+        await db.commit()  # expire_on_commit=False: los objetos devueltos siguen legibles
+    return result
+
+
+def _run_sync(fn):
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await run_sync(db, fn, *args, **kwargs)
+    return wrapper
+
+
+# Usuarios
+get_user = _run_sync(crud.get_user)
+create_user = _run_sync(crud.create_user)
+set_user_disabled = _run_sync(crud.set_user_disabled)
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """Consulta async y bcrypt en el ejecutor de hash"""
+    user = await get_user(db, username)
+    if not user or user.disabled or not await password_hasher.verify(password, user.hashed_password):
+        return None
+    return user
+
+
+# Mensajes
+get_messages = _run_sync(crud.get_messages)
+get_messages_page = _run_sync(crud.get_messages_page)
+get_messages_after = _run_sync(crud.get_messages_after)
+create_message = _run_sync(crud.create_message)
+
+# Onboarding
+create_onboarding_session = _run_sync(crud.create_onboarding_session)
+get_onboarding_session = _run_sync(crud.get_onboarding_session)
+update_onboarding_session = _run_sync(crud.update_onboarding_session)
+complete_onboarding_session = _run_sync(crud.complete_onboarding_session)
+transfer_onboarding_to_user = _run_sync(crud.transfer_onboarding_to_user)
+cleanup_expired_sessions = _run_sync(crud.cleanup_expired_sessions)
+
+# Pool de contenido
+get_content_pool_items = _run_sync(crud.get_content_pool_items)
+create_content_pool_items = _run_sync(crud.create_content_pool_items)
+
+# Perfil, ritmo cardíaco y eventos
+get_user_profile = _run_sync(crud_profile.get_user_profile)
+create_user_profile = _run_sync(crud_profile.create_user_profile)
+update_user_profile = _run_sync(crud_profile.update_user_profile)
+update_user_onboarding_data = _run_sync(crud_profile.update_user_onboarding_data)
+change_user_password = _run_sync(crud_profile.change_user_password)
+create_heart_rate_data = _run_sync(crud_profile.create_heart_rate_data)
+create_heart_rate_readings = _run_sync(crud_profile.create_heart_rate_readings)
+get_heart_rate_history = _run_sync(crud_profile.get_heart_rate_history)
+get_heart_rate_page = _run_sync(crud_profile.get_heart_rate_page)
+get_heart_rate_stats = _run_sync(crud_profile.get_heart_rate_stats)
+get_heart_rate_chart = _run_sync(crud_profile.get_heart_rate_chart)
+create_app_event = _run_sync(crud_profile.create_app_event)
+get_app_events_history = _run_sync(crud_profile.get_app_events_history)
+get_app_events_page = _run_sync(crud_profile.get_app_events_page)
+get_dashboard_stats = _run_sync(crud_profile.get_dashboard_stats)
+simulate_heart_rate_data = _run_sync(crud_profile.simulate_heart_rate_data)
+simulate_app_events = _run_sync(crud_profile.simulate_app_events)
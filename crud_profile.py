@@ -4,8 +4,14 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 from AIAPI import models
 import AIAPI.crud as crud
+from AIAPI.identity import identity_cache
+from AIAPI import rollups
+from AIAPI import dashboard
+from AIAPI.dashboard import dashboard_cache
+from AIAPI.pagination import keyset_filter
 import json
 import random
+import sqlite3
 
 # ============= USER PROFILE CRUD =============
 
@@ -56,20 +62,19 @@ def update_user_onboarding_data(db: Session, user_id: int, **kwargs):
     
     db.commit()
     db.refresh(user)
+    identity_cache.invalidate(user.username)
     return user
 
-def change_user_password(db: Session, user_id: int, new_password: str):
+def change_user_password(db: Session, user_id: int, new_password: str, hashed_password: str = None):
     """Cambiar contraseña del usuario"""
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         return None
     
-    user.hashed_password = pwd_context.hash(new_password)
+    user.hashed_password = hashed_password or crud.hash_password(new_password)
     db.commit()
     db.refresh(user)
+    identity_cache.invalidate(user.username)
     return user
 
 # ============= HEART RATE DATA CRUD =============
@@ -82,10 +87,87 @@ def create_heart_rate_data(db: Session, user_id: int, heart_rate: int, **kwargs)
         **kwargs
     )
     db.add(db_hr)
+    db.flush()
+    if db_hr.heart_rate is not None:
+        rollups.add_heart_rate_readings(db, user_id, [{"recorded_at": db_hr.recorded_at, "heart_rate": db_hr.heart_rate}])
     db.commit()
+    dashboard_cache.invalidate(user_id)
     db.refresh(db_hr)
     return db_hr
 
+HEART_RATE_COLUMNS = ("user_id", "heart_rate", "recorded_at", "device_type", "activity_type", "stress_level")
+# Filas por INSERT multi-VALUES en SQLite: 6 parámetros por fila bajo el límite de
+# variables (32766 desde SQLite 3.32, 999 antes)
+HEART_RATE_INSERT_CHUNK = 5000 if sqlite3.sqlite_version_info >= (3, 32, 0) else 166
+
+
+def _multi_values_sql(table, rows: int) -> str:
+    placeholders = "(" + ", ".join("?" * len(HEART_RATE_COLUMNS)) + ")"
+    return (f"INSERT INTO {table.name} ({', '.join(HEART_RATE_COLUMNS)}) "
+            f"VALUES {', '.join([placeholders] * rows)} ON CONFLICT DO NOTHING")
+
+
+def create_heart_rate_readings(db: Session, user_id: int, readings: list) -> int:
+    """
+    Insertar un lote de lecturas en una sola transacción con un executemany.
+    Las lecturas repetidas (user_id, recorded_at, device_type), ya guardadas o
+    dentro del mismo lote, se ignoran con ON CONFLICT DO NOTHING.
+    Cada lectura es un dict con recorded_at y heart_rate (datetime UTC sin tzinfo)
+    y opcionalmente device_type, activity_type y stress_level.
+    Devuelve cuántas lecturas se insertaron.
+    """
+    if not readings:
+        return 0
+    table = models.HeartRateData.__table__
+    dialect = db.get_bind().dialect
+    if dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    stmt = insert(table).on_conflict_do_nothing()
+    connection = db.connection(bind_arguments={"clause": stmt})
+
+    if dialect.name == "sqlite":
+        # Camino rápido: parámetros directos al driver en INSERT multi-VALUES, que en
+        # SQLite rinde casi el doble que un executemany fila a fila. recorded_at con el
+        # mismo formato que guarda el tipo DateTime de SQLAlchemy en SQLite, para que la
+        # deduplicación y las consultas por rango coincidan con las filas del ORM.
+        rows = [
+            (user_id, r["heart_rate"], r["recorded_at"].isoformat(" ", "microseconds"),
+             r.get("device_type") or "smartwatch", r.get("activity_type"), r.get("stress_level"))
+            for r in readings
+        ]
+        inserted = 0
+        full_chunk_sql = None
+        for i in range(0, len(rows), HEART_RATE_INSERT_CHUNK):
+            chunk = rows[i:i + HEART_RATE_INSERT_CHUNK]
+            if len(chunk) == HEART_RATE_INSERT_CHUNK:
+                full_chunk_sql = full_chunk_sql or _multi_values_sql(table, HEART_RATE_INSERT_CHUNK)
+                sql = full_chunk_sql
+            else:
+                sql = _multi_values_sql(table, len(chunk))
+            inserted += connection.exec_driver_sql(sql, tuple(value for row in chunk for value in row)).rowcount
+        # Minuto de cada lectura tomado del texto ya formateado ("AAAA-MM-DD HH:MM")
+        samples = ((row[2][:16], row[1]) for row in rows)
+    else:
+        rows = [
+            {"user_id": user_id, "heart_rate": r["heart_rate"], "recorded_at": r["recorded_at"],
+             "device_type": r.get("device_type") or "smartwatch", "activity_type": r.get("activity_type"),
+             "stress_level": r.get("stress_level")}
+            for r in readings
+        ]
+        inserted = connection.execute(stmt, rows).rowcount
+        samples = ((r["recorded_at"].replace(second=0, microsecond=0), r["heart_rate"]) for r in readings)
+    if inserted == len(readings):
+        rollups.add_minute_samples(db, user_id, samples)
+    else:
+        # Hubo repetidas: recalcular el rango desde las lecturas guardadas
+        recorded = [r["recorded_at"] for r in readings]
+        rollups.refresh_heart_rate_rollups(db, user_id, min(recorded), max(recorded))
+    db.commit()
+    dashboard_cache.invalidate(user_id)
+    return max(inserted, 0)
+
 def get_heart_rate_history(db: Session, user_id: int, days: int = 7):
     """Obtener historial de ritmo cardíaco"""
     start_date = datetime.utcnow() - timedelta(days=days)
@@ -94,23 +176,42 @@ def get_heart_rate_history(db: Session, user_id: int, days: int = 7):
         models.HeartRateData.recorded_at >= start_date
     ).order_by(desc(models.HeartRateData.recorded_at)).all()
 
+def get_heart_rate_page(db: Session, user_id: int, days: int, limit: int, before: tuple = None):
+    """Hasta limit + 1 lecturas anteriores al cursor (recorded_at, id), más recientes primero"""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    query = db.query(models.HeartRateData).filter(
+        models.HeartRateData.user_id == user_id,
+        models.HeartRateData.recorded_at >= start_date
+    )
+    query = keyset_filter(query, models.HeartRateData.recorded_at, models.HeartRateData.id, before)
+    return query.order_by(desc(models.HeartRateData.recorded_at), desc(models.HeartRateData.id)).limit(limit + 1).all()
+
 def get_heart_rate_stats(db: Session, user_id: int, days: int = 7):
-    """Obtener estadísticas de ritmo cardíaco"""
-    heart_rates = get_heart_rate_history(db, user_id, days)
+    """Obtener estadísticas de ritmo cardíaco (desde los agregados de rollups.py)"""
+    end = datetime.utcnow()
+    stats = rollups.heart_rate_window_stats(db, user_id, end - timedelta(days=days), end)
     
-    if not heart_rates:
+    if not stats:
         return None
     
-    hr_values = [hr.heart_rate for hr in heart_rates]
+    latest = db.query(models.HeartRateData.heart_rate).filter(
+        models.HeartRateData.user_id == user_id
+    ).order_by(desc(models.HeartRateData.recorded_at)).limit(1).scalar()
     
     return {
-        "average": round(sum(hr_values) / len(hr_values), 1),
-        "min": min(hr_values),
-        "max": max(hr_values),
-        "current": hr_values[0] if hr_values else None,
-        "total_readings": len(hr_values)
+        "average": round(stats["average"], 1),
+        "stddev": round(stats["stddev"], 1),
+        "min": stats["min"],
+        "max": stats["max"],
+        "current": latest,
+        "total_readings": stats["readings"]
     }
 
+def get_heart_rate_chart(db: Session, user_id: int, days: float = 7):
+    """Serie para gráficos con la resolución de agregados que corresponde a la ventana"""
+    end = datetime.utcnow()
+    return rollups.heart_rate_series(db, user_id, end - timedelta(days=days), end)
+
 # ============= APP EVENTS CRUD =============
 
 def create_app_event(db: Session, user_id: int, event_type: str, event_name: str, **kwargs):
@@ -122,7 +223,10 @@ def create_app_event(db: Session, user_id: int, event_type: str, event_name: str
         **kwargs
     )
     db.add(db_event)
+    db.flush()
+    dashboard.add_app_event(db, user_id, event_type, db_event.created_at, db_event.duration_minutes)
     db.commit()
+    dashboard_cache.invalidate(user_id)
     db.refresh(db_event)
     return db_event
 
@@ -139,25 +243,30 @@ def get_app_events_history(db: Session, user_id: int, days: int = 30, event_type
     
     return query.order_by(desc(models.AppEvent.created_at)).all()
 
+def get_app_events_page(db: Session, user_id: int, days: int, limit: int, before: tuple = None, event_type: str = None):
+    """Hasta limit + 1 eventos anteriores al cursor (created_at, id), más recientes primero"""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    query = db.query(models.AppEvent).filter(
+        models.AppEvent.user_id == user_id,
+        models.AppEvent.created_at >= start_date
+    )
+    if event_type:
+        query = query.filter(models.AppEvent.event_type == event_type)
+    query = keyset_filter(query, models.AppEvent.created_at, models.AppEvent.id, before)
+    return query.order_by(desc(models.AppEvent.created_at), desc(models.AppEvent.id)).limit(limit + 1).all()
+
 def get_dashboard_stats(db: Session, user_id: int, days: int = 7):
-    """Obtener estadísticas del dashboard"""
-    events = get_app_events_history(db, user_id, days)
+    """Obtener estadísticas del dashboard (días UTC completos, desde user_daily_stats y los agregados de ritmo)"""
+    since = (datetime.utcnow() - timedelta(days=days)).date()
+    totals = dashboard.event_totals(db, user_id, since)
     hr_stats = get_heart_rate_stats(db, user_id, days)
     
-    # Contar eventos por tipo
-    event_counts = {}
-    total_meditation_time = 0
-    
-    for event in events:
-        event_type = event.event_type
-        event_counts[event_type] = event_counts.get(event_type, 0) + 1
-        
-        if event_type == "meditation_session" and event.duration_minutes:
-            total_meditation_time += event.duration_minutes
+    event_counts = {event_type: events for event_type, (events, _) in totals.items()}
+    total_meditation_time = totals.get("meditation_session", (0, 0.0))[1]
     
     return {
         "period_days": days,
-        "total_events": len(events),
+        "total_events": sum(event_counts.values()),
         "event_counts": event_counts,
         "total_meditation_minutes": round(total_meditation_time, 1),
         "heart_rate_stats": hr_stats,
@@ -169,7 +278,7 @@ def get_dashboard_stats(db: Session, user_id: int, days: int = 7):
 def simulate_heart_rate_data(db: Session, user_id: int, days: int = 7):
     """Simular datos de ritmo cardíaco para testing"""
     base_hr = random.randint(60, 80)  # BPM base
-    created_count = 0
+    readings = []
     
     for i in range(days * 24):  # Una lectura por hora
         timestamp = datetime.utcnow() - timedelta(hours=i)
@@ -182,15 +291,14 @@ def simulate_heart_rate_data(db: Session, user_id: int, days: int = 7):
             hr = base_hr + random.randint(-10, 0)
             activity = "sleep"
         
-        create_heart_rate_data(
-            db, user_id, hr,
-            activity_type=activity,
-            stress_level=random.randint(1, 5),
-            recorded_at=timestamp
-        )
-        created_count += 1
+        readings.append({
+            "heart_rate": hr,
+            "activity_type": activity,
+            "stress_level": random.randint(1, 5),
+            "recorded_at": timestamp
+        })
     
-    return created_count
+    return create_heart_rate_readings(db, user_id, readings)
 
 def simulate_app_events(db: Session, user_id: int, days: int = 30):
     """Simular eventos de la app para testing"""
@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+
+from AIAPI import metrics, models
+
+# --- Agregados y caché de /profile/dashboard ---
+# create_app_event suma cada evento a user_daily_stats (usuario, día UTC, tipo),
+# así el dashboard agrega con GROUP BY sobre a lo sumo días x tipos filas en lugar
+# de cargar todos los eventos. El resultado se guarda por (usuario, días) hasta
+# DASHBOARD_TTL segundos; escribir eventos o lecturas de ritmo cardíaco del usuario
+# lo invalida en este proceso y el TTL acota lo que tarda en verse en los demás.
+DASHBOARD_TTL = float(os.getenv("MILO_DASHBOARD_TTL", "60"))
+DASHBOARD_CACHE_SIZE = int(os.getenv("MILO_DASHBOARD_CACHE_SIZE", "10000"))
+
+
+def _upsert(dialect, table):
+    if dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    return dialect_insert(table)
+
+
+def add_app_event(db, user_id: int, event_type: str, created_at, duration_minutes=None):
+    """Sumar un evento a su día en user_daily_stats; sin commit"""
+    table = models.UserDailyStats.__table__
+    stmt = _upsert(db.get_bind().dialect, table).values(
+        user_id=user_id, day=created_at.date(), event_type=event_type or "",
+        events=1, minutes=duration_minutes or 0.0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day, table.c.event_type],
+        set_={"events": table.c.events + stmt.excluded.events, "minutes": table.c.minutes + stmt.excluded.minutes},
+    )
+    db.execute(stmt)
+
+
+def rebuild_daily_stats(db, user_id: int = None):
+    """Reconstruir user_daily_stats desde app_events (todos los usuarios o uno)"""
+    stats, events = models.UserDailyStats.__table__, models.AppEvent.__table__
+    day = func.date(events.c.created_at) if db.get_bind().dialect.name == "sqlite" else cast(events.c.created_at, Date)
+    event_type = func.coalesce(events.c.event_type, "")
+    source = select(
+        events.c.user_id, day, event_type, func.count(), func.coalesce(func.sum(events.c.duration_minutes), 0.0)
+    ).where(events.c.created_at.isnot(None)).group_by(events.c.user_id, day, event_type)
+    if user_id is not None:
+        source = source.where(events.c.user_id == user_id)
+        db.execute(delete(stats).where(stats.c.user_id == user_id))
+    else:
+        db.execute(delete(stats))
+    db.execute(insert(stats).from_select(["user_id", "day", "event_type", "events", "minutes"], source))
+    db.commit()
+
+
+def event_totals(db, user_id: int, since: date) -> dict:
+    """{tipo: (eventos, minutos)} desde el día `since` (incluido)"""
+    stats = models.UserDailyStats.__table__
+    rows = db.execute(
+        select(stats.c.event_type, func.sum(stats.c.events), func.sum(stats.c.minutes))
+        .where(stats.c.user_id == user_id, stats.c.day >= since)
+        .group_by(stats.c.event_type)
+    )
+    return {event_type: (events, minutes or 0.0) for event_type, events, minutes in rows}
+
+
+class DashboardCache:
+    """
+    (usuario, días) -> estadísticas con TTL. Cada usuario tiene una generación que
+    sube al invalidar: un cálculo que empezó antes de una escritura no se guarda.
+
+    Las generaciones salen de un contador global y se guardan solo para los
+    max_users invalidados más recientes; los demás usuarios comparten `_floor`, la
+    mayor generación expulsada, que nunca coincide con la de un cálculo anterior.
+    """
+
+    def __init__(self, ttl: float = DASHBOARD_TTL, max_users: int = DASHBOARD_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = {}  # user_id -> {days: (expira, stats)}
+        self._generations = OrderedDict()  # user_id -> int, LRU por invalidación
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def get(self, user_id: int, days: int):
+        with self._lock:
+            entry = self._entries.get(user_id, {}).get(days)
+            if entry is not None and entry[0] > time.monotonic():
+                metrics.DASHBOARD_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry[1]
+        metrics.DASHBOARD_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    def put(self, user_id: int, days: int, stats: dict, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if self._generations.get(user_id, self._floor) != generation:
+                return
+            if user_id not in self._entries and len(self._entries) >= self.max_users:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries.setdefault(user_id, {})[days] = (time.monotonic() + self.ttl, stats)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._counter += 1
+            self._generations[user_id] = self._counter
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_users:
+                _, evicted = self._generations.popitem(last=False)
+                self._floor = max(self._floor, evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dashboard_cache = DashboardCache()
@@ -3,16 +3,106 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from AIAPI.metrics import instrument_engine
+from AIAPI.sqlite_profile import RoutingSession, create_engines, is_sqlite_file
+
 # URL of the SQLite database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./milo.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SQLite en archivo: perfil de producción (WAL, PRAGMAs) con un escritor único y
+# un pool de lectura; `engine` es el escritor (create_all, migraciones, scripts)
+if is_sqlite_file(DATABASE_URL):
+    engine, read_engine = create_engines(create_engine, DATABASE_URL, connect_args={"check_same_thread": False})
+    instrument_engine(read_engine)
+    SessionLocal = sessionmaker(class_=RoutingSession, writer=engine, reader=read_engine,
+                                autocommit=False, autoflush=False)
+else:
+    engine = read_engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False}
+    )
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_engine(engine)
 Base = declarative_base()
 
+
+# --- Ruta async (handlers de FastAPI) ---
+# Mismo esquema y misma URL con driver async: aiosqlite para SQLite, asyncpg para
+# PostgreSQL. El engine se crea al primer uso para que los scripts síncronos
+# (insert.py, update_database.py) no necesiten los drivers async instalados.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+class AsyncDatabase:
+    """
+    Engines async de una URL, creados al primer uso e instrumentados como los síncronos.
+    `engine_kwargs` llega a create_async_engine (p.ej. el pool de PostgreSQL en producción).
+    """
+
+    def __init__(self, url: str, **engine_kwargs):
+        self.url = url
+        self.engine_kwargs = engine_kwargs
+        self._engine = None
+        self._read_engine = None
+        self._sessionmaker = None
+
+    def engine(self):
+        """Engine async (el escritor si es SQLite en archivo)"""
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            if is_sqlite_file(self.url):
+                self._engine, self._read_engine = create_engines(
+                    create_async_engine, to_async_url(self.url), **self.engine_kwargs)
+                instrument_engine(self._read_engine.sync_engine)
+            else:
+                self._engine = self._read_engine = create_async_engine(to_async_url(self.url), **self.engine_kwargs)
+            instrument_engine(self._engine.sync_engine)
+        return self._engine
+
+    def session(self):
+        """Nueva AsyncSession; expire_on_commit=False porque acceder a atributos expirados requeriría IO implícito"""
+        if self._sessionmaker is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            writer = self.engine()
+            if self._read_engine is not writer:
+                self._sessionmaker = async_sessionmaker(
+                    sync_session_class=RoutingSession, writer=writer.sync_engine, reader=self._read_engine.sync_engine,
+                    autoflush=False, expire_on_commit=False,
+                )
+            else:
+                self._sessionmaker = async_sessionmaker(writer, autoflush=False, expire_on_commit=False)
+        return self._sessionmaker()
+
+    async def dispose(self):
+        for async_engine in {self._engine, self._read_engine} - {None}:
+            await async_engine.dispose()
+        self._engine = self._read_engine = self._sessionmaker = None
+
+
+async_database = AsyncDatabase(DATABASE_URL)
+
+
+def get_async_engine():
+    return async_database.engine()
+
+
+def AsyncSessionLocal():
+    return async_database.session()
+
+
+async def dispose_async_engine():
+    await async_database.dispose()
+
 # Test connection function
 def test_connection():
     """Test database connection"""
@@ -3,11 +3,24 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from AIAPI.database import AsyncDatabase
+from AIAPI.metrics import instrument_engine
+from AIAPI.sqlite_profile import RoutingSession, create_engines, is_sqlite_file
+
 # URL of the database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./milo.db")
 
 # Configuración específica según el tipo de BD
-if DATABASE_URL.startswith("sqlite"):
+read_engine = None
+if is_sqlite_file(DATABASE_URL):
+    # SQLite en archivo: WAL + PRAGMAs, un escritor y un pool de lectura (sqlite_profile.py)
+    engine, read_engine = create_engines(
+        create_engine,
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        echo=False
+    )
+elif DATABASE_URL.startswith("sqlite"):
     # SQLite configuration
     engine = create_engine(
         DATABASE_URL,
@@ -30,9 +43,31 @@ else:
         echo=False
     )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if read_engine is not None:
+    SessionLocal = sessionmaker(class_=RoutingSession, writer=engine, reader=read_engine, autocommit=False, autoflush=False)
+    instrument_engine(read_engine)
+else:
+    read_engine = engine
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_engine(engine)
 Base = declarative_base()
 
+# Ruta async: la misma fábrica que database.py (drivers async, instrumentación y
+# dispose), con el pool de producción cuando es PostgreSQL
+if DATABASE_URL.startswith("postgres"):
+    async_database = AsyncDatabase(DATABASE_URL, pool_size=20, max_overflow=0, pool_pre_ping=True, echo=False)
+else:
+    async_database = AsyncDatabase(DATABASE_URL, echo=False)
+
+def get_async_engine():
+    return async_database.engine()
+
+def AsyncSessionLocal():
+    return async_database.session()
+
+async def dispose_async_engine():
+    await async_database.dispose()
+
 # Test connection
 def test_connection():
     try:
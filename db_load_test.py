@@ -0,0 +1,128 @@
+"""
+Benchmark de concurrencia BD + LLM: ruta síncrona frente a la ruta async.
+
+Cada "petición" imita /dialogo_conmigo/message: guarda el mensaje del usuario,
+lee el historial reciente, espera al upstream simulado y guarda la respuesta.
+
+- "sync": crud.py con SessionLocal dentro de la corrutina (bloquea el event loop
+  en cada consulta y commit, el estado previo de los handlers). La sesión se
+  cierra antes de esperar al upstream: si se retiene durante la espera, como hacía
+  get_db, con más peticiones concurrentes que conexiones en el pool el checkout
+  bloquea el loop y nadie puede devolver la suya.
+- "async": crud_async.py con AsyncSessionLocal (aiosqlite / asyncpg).
+
+Reporta throughput, p50/p95 por petición y el retraso máximo del event loop.
+
+Uso:
+    python db_load_test.py --requests 400 --concurrency 1 10 50 --llm-latency 0.05
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "sk-db-load-test")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'milo_db_load_test.db')}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AIAPI.crud as crud
+import AIAPI.crud_async as crud_async
+from AIAPI.migrations import upgrade
+from AIAPI.database import SessionLocal, AsyncSessionLocal, dispose_async_engine, engine
+from AIAPI.load_harness import percentile
+
+
+async def request_sync(user_id: int, i: int, llm_latency: float):
+    db = SessionLocal()
+    try:
+        crud.create_message(db, user_id, "user", f"Me siento inquieto ({i})")
+        crud.get_messages(db, user_id, 2)
+    finally:
+        db.close()
+    await asyncio.sleep(llm_latency)
+    db = SessionLocal()
+    try:
+        crud.create_message(db, user_id, "ai", "Respira. Estás aquí.")
+    finally:
+        db.close()
+
+
+async def request_async(user_id: int, i: int, llm_latency: float):
+    async with AsyncSessionLocal() as db:
+        await crud_async.create_message(db, user_id, "user", f"Me siento inquieto ({i})")
+        await crud_async.get_messages(db, user_id, 2)
+        await asyncio.sleep(llm_latency)
+        await crud_async.create_message(db, user_id, "ai", "Respira. Estás aquí.")
+
+
+async def run_level(handler, user_ids: list, concurrency: int, total: int, llm_latency: float) -> dict:
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+    latencies, lags = [], []
+    done = asyncio.Event()
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            await handler(user_ids[i % len(user_ids)], i, llm_latency)
+            latencies.append(time.perf_counter() - start)
+
+    async def lag_probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    probe = asyncio.ensure_future(lag_probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe
+    return {
+        "rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "max_loop_lag_ms": max(lags or [0.0]) * 1000,
+    }
+
+
+def prepare_users(count: int) -> list:
+    upgrade(engine)
+    db = SessionLocal()
+    try:
+        ids = []
+        for n in range(count):
+            username = f"dbload-{n}"
+            user = crud.get_user(db, username) or crud.create_user(db, username, "DB Load", "x", hashed_password="-")
+            ids.append(user.id)
+        return ids
+    finally:
+        db.close()
+
+
+async def main(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    user_ids = prepare_users(args.users)
+    for label, handler in (("sync (antes)", request_sync), ("async (después)", request_async)):
+        print(f"\n== ruta {label}, upstream {args.llm_latency}s ==")
+        for concurrency in args.concurrency:
+            result = await run_level(handler, user_ids, concurrency, max(args.requests, concurrency), args.llm_latency)
+            print(f"  concurrencia={concurrency:>4}  rps={result['rps']:>7.1f}  p50={result['p50_ms']:>7.1f}ms  "
+                  f"p95={result['p95_ms']:>7.1f}ms  retraso máx. del loop={result['max_loop_lag_ms']:>6.1f}ms")
+    await dispose_async_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrencia BD + LLM: crud síncrono vs crud_async")
+    parser.add_argument("--requests", type=int, default=400, help="peticiones por nivel de concurrencia")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="latencia simulada del upstream en segundos")
+    asyncio.run(main(parser.parse_args()))
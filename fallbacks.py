@@ -0,0 +1,58 @@
+import random
+
+from AIAPI import metrics
+
+# --- Corpus local de respuestas de respaldo por modo ---
+# Se usan cuando el upstream no responde a tiempo o el circuit breaker está
+# abierto. Textos curados a mano, en el mismo tono que los PROMPTS.
+FALLBACKS = {
+    "dialogo_sagrado": [
+        "Como el río que no se detiene ante la piedra, tu voz encuentra su cauce. Aquí estoy, escuchando el rumor de tu alma.",
+        "Una llama pequeña también ilumina la noche entera. Lo que traes ya está siendo sostenido.",
+        "El viento no pregunta hacia dónde va; solo sopla. Deja que tus palabras descansen un momento en este silencio.",
+    ],
+    "diario_vivo": [
+        "¿Qué semilla pequeña sembraste hoy sin darte cuenta?",
+        "Si tu corazón fuera un paisaje esta mañana, ¿qué estación sería?",
+        "¿Qué parte de ti pidió hoy un poco más de ternura?",
+    ],
+    "medita_conmigo": [
+        "Cierra los ojos. Inhala lentamente contando hasta cuatro, sostén el aire un instante y exhala contando hasta seis. "
+        "Repite tres veces. Imagina una luz cálida en el centro de tu pecho que se expande con cada respiración, "
+        "suave como el amanecer sobre el agua. Deja que esa luz recorra tus hombros, tus brazos, tus manos. "
+        "Quédate aquí, respirando, el tiempo que necesites. Al volver, lleva contigo esta frase: "
+        "\"Habito la calma que ya vive en mí.\"",
+    ],
+    "mensaje_diario": [
+        "Hoy no tienes que llegar a ningún lugar.\nBasta con estar.\nEl sol sale igual para la flor que aún no abre.",
+        "Lo que buscas afuera\nya late en tu respiración.\nVuelve a casa, despacio.",
+        "Eres el cauce y también el agua.\nConfía en tu curso.\nLa orilla te espera.",
+    ],
+    "ritual_diario": [
+        "Coloca una mano sobre tu corazón. Respira tres veces profundo. En la última exhalación, di en voz baja: \"Estoy aquí\".",
+        "Enciende una vela o imagina una llama. Mírala durante diez respiraciones y ofrécele algo que quieras soltar hoy.",
+        "Toma un vaso de agua despacio, sintiendo cada sorbo. Con el último, agradece algo pequeño de este día.",
+    ],
+    "mapa_interior": [
+        "Un sendero de niebla que se aclara con cada paso.",
+        "La marea baja, y en la arena aparecen conchas que no sabías guardar.",
+        "Raíces firmes bajo un cielo que cambia de color.",
+    ],
+    "silencio_sagrado": [
+        "En el hueco del silencio, todo respira.",
+        "Quietud: la puerta ya está abierta.",
+        "Escucha lo que queda cuando todo calla.",
+    ],
+    "text": [
+        "En este momento no puedo responder con claridad. Respira, y vuelve a intentarlo en un instante.",
+    ],
+}
+
+
+def get_fallback(mode: str, reason: str = "error") -> str:
+    """
+    Retorna una respuesta de respaldo para el modo (o la genérica de 'text').
+    :param reason: motivo del respaldo (circuit_open, deadline, error) para las métricas
+    """
+    metrics.LLM_FALLBACKS.labels(mode=mode, reason=reason).inc()
+    return random.choice(FALLBACKS.get(mode) or FALLBACKS["text"])
@@ -0,0 +1,188 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+
+from AIAPI import metrics
+
+# --- Gobernador de concurrencia hacia el upstream ---
+# Limita las llamadas en curso por proceso y ordena la espera con weighted fair
+# queuing por flujo (usuario o sesión de onboarding): un usuario con muchas
+# peticiones en cola no retrasa a los demás.
+UPSTREAM_CONCURRENCY = int(os.getenv("MILO_UPSTREAM_CONCURRENCY", "32"))
+UPSTREAM_QUEUE = int(os.getenv("MILO_UPSTREAM_QUEUE", "200"))
+UPSTREAM_QUEUE_PER_FLOW = int(os.getenv("MILO_UPSTREAM_QUEUE_PER_FLOW", "8"))
+UPSTREAM_MAX_WAIT = float(os.getenv("MILO_UPSTREAM_MAX_WAIT", "10"))
+
+# Peso por modo: más peso = más parte del upstream cuando hay cola
+MODE_WEIGHTS = {
+    "welcome": 4.0,
+    "silencio_sagrado": 2.0,
+    "mapa_interior": 2.0,
+    "dialogo_sagrado": 1.0,
+    "medita_conmigo": 1.0,
+    "audio": 1.0,
+}
+
+# Flujo (quién hace la llamada) para la petición en curso; lo fijan los handlers
+current_flow = contextvars.ContextVar("upstream_flow", default="anonymous")
+
+
+def set_flow(flow: str):
+    """Asociar las llamadas al upstream de la petición actual a un flujo (p.ej. 'user:42')"""
+    current_flow.set(flow)
+
+
+class Overloaded(HTTPException):
+    """Rechazo rápido por cola llena o espera excesiva, con Retry-After"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(
+            status_code=status_code,
+            detail="Demasiadas solicitudes en curso. Intenta de nuevo en unos segundos.",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("future", "flow", "start_tag", "abandoned")
+
+    def __init__(self, future: asyncio.Future, flow: str, start_tag: float):
+        self.future = future
+        self.flow = flow
+        self.start_tag = start_tag
+        self.abandoned = False
+
+
+class UpstreamGovernor:
+    """
+    Semáforo con cola acotada y orden WFQ. Cada petición en espera recibe una
+    etiqueta de finalización virtual = max(tiempo virtual, última del flujo) + 1/peso,
+    y se despacha la menor.
+    """
+
+    def __init__(self, max_concurrency: int = UPSTREAM_CONCURRENCY, max_queue: int = UPSTREAM_QUEUE,
+                 max_queue_per_flow: int = UPSTREAM_QUEUE_PER_FLOW, max_wait: float = UPSTREAM_MAX_WAIT,
+                 weights: dict = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_flow = max_queue_per_flow
+        self.max_wait = max_wait
+        self.weights = MODE_WEIGHTS if weights is None else weights
+        self.active = 0
+        self.queued = 0
+        self._heap = []  # (finish_tag, seq, waiter)
+        self._per_flow = {}  # flow -> peticiones en cola
+        self._last_finish = {}  # flow -> última etiqueta de finalización
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._service_time = 1.0  # media móvil de la duración de una llamada
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._service_time * (self.queued + 1) / self.max_concurrency))
+
+    def admission_error(self, flow: str) -> Optional[Overloaded]:
+        """Rechazo que recibiría ahora una petición del flujo, o None si sería admitida"""
+        if self.active < self.max_concurrency and not self.queued:
+            return None
+        if self._per_flow.get(flow, 0) >= self.max_queue_per_flow:
+            return Overloaded(429, "flow_queue_full", self.retry_after())
+        if self.queued >= self.max_queue:
+            return Overloaded(503, "queue_full", self.retry_after())
+        return None
+
+    @asynccontextmanager
+    async def slot(self, mode: str = "text", flow: str = None):
+        """Ocupar un lugar de concurrencia hacia el upstream durante el bloque"""
+        flow = flow or current_flow.get()
+        start = time.monotonic()
+        await self._acquire(flow, mode)
+        granted = time.monotonic()
+        metrics.GOVERNOR_WAIT_SECONDS.labels(mode=mode).observe(granted - start)
+        try:
+            yield
+        finally:
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - granted)
+            self._release()
+
+    async def _acquire(self, flow: str, mode: str):
+        if self.active < self.max_concurrency and not self.queued:
+            self._grant_now()
+            return
+        error = self.admission_error(flow)
+        if error is not None:
+            metrics.GOVERNOR_REJECTIONS.labels(reason=error.reason).inc()
+            raise error
+
+        start_tag = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish_tag = start_tag + 1.0 / self.weights.get(mode, 1.0)
+        self._last_finish[flow] = finish_tag
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), flow, start_tag)
+        heapq.heappush(self._heap, (finish_tag, next(self._seq), waiter))
+        self.queued += 1
+        self._per_flow[flow] = self._per_flow.get(flow, 0) + 1
+        metrics.GOVERNOR_QUEUE_DEPTH.set(self.queued)
+
+        try:
+            done, _ = await asyncio.wait({waiter.future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self._release()  # el lugar llegó justo al cancelar
+            else:
+                self._abandon(waiter)
+            raise
+        if not done:
+            self._abandon(waiter)
+            metrics.GOVERNOR_REJECTIONS.labels(reason="wait_timeout").inc()
+            raise Overloaded(503, "wait_timeout", self.retry_after())
+
+    def _grant_now(self):
+        self.active += 1
+        metrics.GOVERNOR_IN_FLIGHT.set(self.active)
+
+    def _dequeued(self, waiter: _Waiter):
+        self.queued -= 1
+        remaining = self._per_flow[waiter.flow] - 1
+        if remaining:
+            self._per_flow[waiter.flow] = remaining
+        else:
+            del self._per_flow[waiter.flow]
+        if not self.queued:
+            # Cola vacía: reiniciar el reloj virtual para no acumular estado por flujo
+            self._last_finish.clear()
+            self._heap.clear()  # solo quedan esperas abandonadas
+            self._virtual_time = 0.0
+        metrics.GOVERNOR_QUEUE_DEPTH.set(self.queued)
+
+    def _abandon(self, waiter: _Waiter):
+        waiter.abandoned = True
+        waiter.future.cancel()
+        self._dequeued(waiter)
+
+    def _release(self):
+        self.active -= 1
+        while self._heap:
+            _finish, _seq, waiter = heapq.heappop(self._heap)
+            if waiter.abandoned:
+                continue
+            self._virtual_time = waiter.start_tag
+            self._dequeued(waiter)
+            self.active += 1
+            waiter.future.set_result(True)
+            break
+        metrics.GOVERNOR_IN_FLIGHT.set(self.active)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.active, "queued": self.queued, "flows_waiting": len(self._per_flow)}
+
+
+upstream_governor = UpstreamGovernor()
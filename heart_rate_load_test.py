@@ -0,0 +1,108 @@
+"""
+Benchmark de ingesta de ritmo cardíaco: una lectura por commit frente al lote.
+
+- "por lectura": crud_profile.create_heart_rate_data (add + commit + refresh por
+  lectura, el camino previo de simulate_heart_rate_data).
+- "lote (crud)": crud_profile.create_heart_rate_readings, INSERT multi-VALUES por
+  bloques en una transacción.
+- "lote (HTTP)": POST /profile/heart-rate/batch contra la app en proceso, con
+  parseo y validación del JSON incluidos.
+
+Uso:
+    python heart_rate_load_test.py --readings 100000 --batch 50000 --per-row 2000
+"""
+import os
+import sys
+import time
+import json
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "sk-heart-rate-load")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'milo_heart_rate_load.db')}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import AIAPI.crud as crud
+import AIAPI.crud_profile as crud_profile
+from AIAPI.main import app
+from AIAPI.database import SessionLocal
+
+
+def make_readings(count: int, start: datetime) -> list:
+    return [
+        {"recorded_at": start + timedelta(seconds=i), "heart_rate": random.randint(55, 110),
+         "activity_type": "rest", "stress_level": random.randint(1, 5)}
+        for i in range(count)
+    ]
+
+
+def new_user(db) -> int:
+    return crud.create_user(db, f"hrload-{uuid.uuid4().hex[:8]}", "HR Load", "x", hashed_password="-").id
+
+
+def per_row(count: int) -> float:
+    db = SessionLocal()
+    try:
+        user_id = new_user(db)
+        readings = make_readings(count, datetime(2026, 1, 1))
+        start = time.perf_counter()
+        for r in readings:
+            crud_profile.create_heart_rate_data(db, user_id, r.pop("heart_rate"), **r)
+        return count / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+
+def batched(count: int, batch: int) -> float:
+    db = SessionLocal()
+    try:
+        user_id = new_user(db)
+        readings = make_readings(count, datetime(2026, 1, 1))
+        start = time.perf_counter()
+        for i in range(0, count, batch):
+            crud_profile.create_heart_rate_readings(db, user_id, readings[i:i + batch])
+        return count / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+
+async def over_http(count: int, batch: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://hrload", timeout=None) as ac:
+        username = f"hrload-{uuid.uuid4().hex[:8]}"
+        await ac.post("/register", json={"username": username, "full_name": "HR Load", "password": "hrload123"})
+        token = (await ac.post("/token", data={"username": username, "password": "hrload123"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        headers = {**headers, "Content-Type": "application/json"}
+        readings = [{**r, "recorded_at": r["recorded_at"].isoformat()} for r in make_readings(count, datetime(2026, 1, 1))]
+        # Cuerpos serializados antes de medir: solo cuenta el trabajo del servidor
+        bodies = [json.dumps({"readings": readings[i:i + batch]}) for i in range(0, count, batch)]
+        start = time.perf_counter()
+        for body in bodies:
+            response = await ac.post("/profile/heart-rate/batch", content=body, headers=headers)
+            response.raise_for_status()
+        return count / (time.perf_counter() - start)
+
+
+def main(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"== ingesta de ritmo cardíaco ({os.environ['DATABASE_URL']}) ==")
+    print(f"  por lectura   lecturas={args.per_row:>7}  lecturas/s={per_row(args.per_row):>9.0f}")
+    print(f"  lote (crud)   lecturas={args.readings:>7}  lecturas/s={batched(args.readings, args.batch):>9.0f}")
+    print(f"  lote (HTTP)   lecturas={args.readings:>7}  lecturas/s={asyncio.run(over_http(args.readings, args.batch)):>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta de ritmo cardíaco: una lectura por commit vs lotes")
+    parser.add_argument("--readings", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=50000, help="lecturas por lote")
+    parser.add_argument("--per-row", type=int, default=2000, help="lecturas para el camino por lectura (lento)")
+    main(parser.parse_args())
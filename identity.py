@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import date, time as dt_time
+from typing import Optional
+
+from AIAPI import metrics
+
+# --- Caché de identidad autenticada ---
+# get_current_user resuelve el `sub` del JWT a una instantánea inmutable del
+# usuario sin abrir sesión de BD mientras la entrada esté vigente. Las escrituras
+# sobre el usuario la invalidan en este proceso; el TTL acota lo que tarda en
+# verse el cambio en los demás workers.
+IDENTITY_TTL = float(os.getenv("MILO_IDENTITY_TTL", "60"))
+IDENTITY_CACHE_SIZE = int(os.getenv("MILO_IDENTITY_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Datos del usuario que usan los handlers; sin hash de contraseña ni relaciones"""
+    id: int
+    username: str
+    full_name: Optional[str] = None
+    disabled: bool = False
+    birth_date: Optional[date] = None
+    birth_place: Optional[str] = None
+    birth_time: Optional[dt_time] = None
+    temple_name: Optional[str] = None
+    emotional_state: Optional[str] = None
+    intention: Optional[str] = None
+    onboarding_completed: bool = False
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(**{f.name: getattr(user, f.name) for f in fields(cls)})
+
+
+class IdentityCache:
+    """LRU con TTL de username -> UserSnapshot"""
+
+    def __init__(self, ttl: float = IDENTITY_TTL, max_entries: int = IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # username -> (expira, snapshot)
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(username)
+                metrics.IDENTITY_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry[1]
+            if entry is not None:
+                del self._entries[username]
+        metrics.IDENTITY_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    def put(self, snapshot: UserSnapshot):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[snapshot.username] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(snapshot.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
@@ -1,8 +1,9 @@
 from database import SessionLocal, engine
-import models, crud
+import crud
+from AIAPI.migrations import upgrade
 
 # Ensure tables exist
-models.Base.metadata.create_all(bind=engine)
+upgrade(engine)
 
 db = SessionLocal()
 try:
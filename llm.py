@@ -0,0 +1,172 @@
+import os
+import time
+from typing import AsyncIterator
+
+import httpx
+from openai import AsyncOpenAI
+
+from AIAPI import metrics, resilience
+from AIAPI.governor import upstream_governor
+from AIAPI.prompts import get_generation_profile
+
+# --- Cliente OpenAI compartido ---
+# Un único AsyncOpenAI por proceso: todas las rutas de generación (main.py y
+# crud.py) reutilizan el mismo pool de conexiones HTTP en lugar de abrir uno
+# por llamada o por módulo.
+MILO_MODEL_ID = os.getenv("MILO_MODEL_ID", "gpt-3.5-turbo")
+
+# --- Enrutado de modelos por perfil ---
+# Los perfiles "fast" (modos cortos) van a un modelo más rápido y barato.
+MILO_FAST_MODEL_ID = os.getenv("MILO_FAST_MODEL_ID", "gpt-4o-mini")
+TIER_MODELS = {"fast": MILO_FAST_MODEL_ID, "standard": MILO_MODEL_ID}
+
+# Forzar un modelo por modo: MILO_MODEL_ROUTES="medita_conmigo=gpt-4o,text=gpt-4o-mini"
+MODEL_ROUTES = {}
+for _item in os.getenv("MILO_MODEL_ROUTES", "").split(","):
+    if "=" in _item:
+        _mode, _model = _item.split("=", 1)
+        MODEL_ROUTES[_mode.strip()] = _model.strip()
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_client = None
+
+
+def get_client() -> AsyncOpenAI:
+    """Obtener (o crear) el cliente AsyncOpenAI compartido"""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        )
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+
+def set_client(client: AsyncOpenAI):
+    """Reemplazar el cliente compartido (pruebas, benchmarks o stubs locales)"""
+    global _client
+    _client = client
+
+
+async def close_client():
+    """Cerrar el cliente compartido y liberar su pool de conexiones"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def route_model(mode: str) -> str:
+    """Modelo para un modo: ruta explícita, si no el del tier de su perfil"""
+    if mode in MODEL_ROUTES:
+        return MODEL_ROUTES[mode]
+    return TIER_MODELS.get(get_generation_profile(mode).tier, MILO_MODEL_ID)
+
+
+def _request_params(mode: str, model, temperature, max_tokens) -> dict:
+    """Parámetros de la chat completion a partir del perfil del modo (los argumentos explícitos mandan)"""
+    profile = get_generation_profile(mode)
+    params = {
+        "model": model or route_model(mode),
+        "temperature": profile.temperature if temperature is None else temperature,
+        "max_tokens": profile.max_tokens if max_tokens is None else max_tokens,
+    }
+    if profile.stop:
+        params["stop"] = list(profile.stop)
+    return params
+
+
+def _record_usage(mode: str, model: str, usage):
+    if usage is None:
+        return
+    metrics.LLM_TOKENS.labels(profile=mode, model=model, kind="prompt").inc(usage.prompt_tokens or 0)
+    metrics.LLM_TOKENS.labels(profile=mode, model=model, kind="completion").inc(usage.completion_tokens or 0)
+
+
+async def chat(messages: list, model: str = None, temperature: float = None, max_tokens: int = None,
+               mode: str = "text") -> str:
+    """
+    Ejecuta una chat completion sin bloquear el event loop y retorna el texto.
+    Modelo, temperatura, max_tokens y stop salen del perfil del modo
+    (prompts.GENERATION_PROFILES) salvo que se indiquen explícitamente.
+    La llamada pasa por el circuit breaker y el plazo del modo (resilience.py);
+    si el upstream no está disponible se lanza resilience.UpstreamUnavailable.
+    :param messages: lista de mensajes en formato OpenAI
+    :param model: modelo a usar (por defecto el que asigna route_model)
+    :param mode: modo de generación, define el perfil y etiqueta las métricas
+    """
+    params = _request_params(mode, model, temperature, max_tokens)
+
+    async def create():
+        return await get_client().chat.completions.create(messages=messages, **params)
+
+    async with upstream_governor.slot(mode):
+        start = time.perf_counter()
+        completion = await resilience.call_upstream(mode, create)
+    metrics.LLM_REQUEST_LATENCY.labels(profile=mode, model=params["model"]).observe(time.perf_counter() - start)
+    _record_usage(mode, params["model"], getattr(completion, "usage", None))
+    return completion.choices[0].message.content.strip()
+
+
+async def _deltas(stream, usage: list) -> AsyncIterator[str]:
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage.append(chunk.usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+async def stream_chat(messages: list, model: str = None, temperature: float = None,
+                      max_tokens: int = None, mode: str = "text") -> AsyncIterator[str]:
+    """
+    Igual que chat() pero entrega los tokens a medida que llegan del upstream.
+    El plazo del modo y el circuit breaker se aplican hasta el primer token: un
+    fallo antes de ese punto lanza UpstreamUnavailable; después, el error se propaga tal cual.
+    Registra el tiempo hasta el primer token en metrics.LLM_TIME_TO_FIRST_TOKEN.
+    :param mode: modo de generación, define el perfil y etiqueta las métricas
+    """
+    params = _request_params(mode, model, temperature, max_tokens)
+    usage = []
+
+    async def first_token():
+        stream = await get_client().chat.completions.create(
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params
+        )
+        deltas = _deltas(stream, usage)
+        try:
+            return deltas, await deltas.__anext__()
+        except StopAsyncIteration:
+            return deltas, ""
+
+    # El lugar en el gobernador se mantiene hasta el final del stream
+    async with upstream_governor.slot(mode):
+        start = time.perf_counter()
+        deltas, first = await resilience.call_upstream(mode, first_token)
+        metrics.LLM_TIME_TO_FIRST_TOKEN.labels(mode=mode).observe(time.perf_counter() - start)
+        if first:
+            yield first
+        async for delta in deltas:
+            yield delta
+    metrics.LLM_REQUEST_LATENCY.labels(profile=mode, model=params["model"]).observe(time.perf_counter() - start)
+    _record_usage(mode, params["model"], usage[-1] if usage else None)
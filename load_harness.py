@@ -0,0 +1,237 @@
+"""
+Harness de carga de extremo a extremo contra la app ASGI en proceso, con el
+upstream servido por openai_stub.py (sin red ni claves reales).
+
+Escenarios:
+- token: login (POST /token)
+- generate_text / generate_silencio: POST /v1/generate
+- dialogo: POST /dialogo_conmigo/message
+- onboarding: start -> temple -> emotional-state -> intention -> personal-data
+  -> generate-welcome -> complete-registration
+
+Reporta p50/p95/p99, peticiones por segundo y errores por endpoint, y escribe
+un baseline JSON para comparar entre commits.
+
+Uso:
+    python load_harness.py --requests 200 --concurrency 20 --output baseline.json
+    python load_harness.py --compare baseline.json --output current.json
+    python load_harness.py --scenarios generate_text dialogo --stub-latency lognormal:0.3,0.4
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-harness")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'milo_load_harness.db')}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from AIAPI import llm
+from AIAPI.main import app
+from AIAPI.ratelimit import rate_limiter
+from AIAPI.openai_stub import StubConfig, stub_client
+
+PASSWORD = "harness-pass-123"
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    """Latencias y errores por endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, endpoint: str, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.samples.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+            }
+        return endpoints
+
+
+async def create_user(ac: httpx.AsyncClient, username: str) -> str:
+    await ac.post("/register", json={"username": username, "full_name": "Harness", "password": PASSWORD})
+    response = await ac.post("/token", data={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def scenario_token(username: str):
+    async def run(ac, recorder, token, i):
+        await recorder.call("POST /token", ac.post("/token", data={"username": username, "password": PASSWORD}))
+    return run
+
+
+def scenario_generate(mode: str, prompt: str):
+    async def run(ac, recorder, token, i):
+        headers = {"Authorization": f"Bearer {token}"}
+        await recorder.call(f"POST /v1/generate [{mode}]",
+                            ac.post("/v1/generate", headers=headers, json={"prompt": prompt, "mode": mode}))
+    return run
+
+
+async def scenario_dialogo(ac, recorder, token, i):
+    headers = {"Authorization": f"Bearer {token}"}
+    await recorder.call("POST /dialogo_conmigo/message", ac.post(
+        "/dialogo_conmigo/message", headers=headers,
+        json={"prompt": f"Me siento inquieto hoy ({i})", "mode": "dialogo_sagrado"}
+    ))
+
+
+async def scenario_onboarding(ac, recorder, token, i):
+    response = await recorder.call("POST /onboarding/start", ac.post("/onboarding/start"))
+    if response is None or response.status_code != 200:
+        return
+    session_id = response.json()["session_id"]
+    steps = [
+        ("/onboarding/temple", {"temple_name": "Templo del Alba"}),
+        ("/onboarding/emotional-state", {"emotional_state": "En paz"}),
+        ("/onboarding/intention", {"intention": "Silencio"}),
+        ("/onboarding/personal-data", {"full_name": "Ana Harness", "birth_date": "1990-05-17",
+                                       "birth_place": "Oaxaca", "birth_time": "07:30"}),
+        ("/onboarding/generate-welcome", {}),
+        ("/onboarding/complete-registration", {"email": f"harness-{uuid.uuid4().hex[:10]}@milo.test",
+                                               "password": PASSWORD}),
+    ]
+    for path, payload in steps:
+        await recorder.call(f"POST {path}", ac.post(path, json={"session_id": session_id, **payload}))
+
+
+async def run_harness(args) -> dict:
+    rate_limiter.enabled = False
+    llm.set_client(stub_client(StubConfig(
+        latency=args.stub_latency, error_rate=args.stub_error_rate,
+        tokens_per_second=args.stub_tokens_per_second
+    )))
+    transport = httpx.ASGITransport(app=app)
+    username = f"harness-{uuid.uuid4().hex[:8]}"
+    scenarios = {
+        "token": scenario_token(username),
+        "generate_text": scenario_generate("text", "Dame un consejo de vida"),
+        "generate_silencio": scenario_generate("silencio_sagrado", "calma"),
+        "dialogo": scenario_dialogo,
+        "onboarding": scenario_onboarding,
+    }
+    selected = [scenarios[name] for name in args.scenarios]
+    recorder = Recorder()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://harness", timeout=120) as ac:
+            token = await create_user(ac, username)
+            queue = asyncio.Queue()
+            for i in range(args.requests):
+                queue.put_nowait(i)
+
+            async def worker():
+                while not queue.empty():
+                    i = queue.get_nowait()
+                    await selected[i % len(selected)](ac, recorder, token, i)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await llm.close_client()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "scenarios": args.scenarios,
+            "stub_latency": args.stub_latency,
+            "stub_error_rate": args.stub_error_rate,
+            "stub_tokens_per_second": args.stub_tokens_per_second,
+        },
+        "seconds": round(elapsed, 2),
+        "endpoints": recorder.report(elapsed),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return ""
+
+
+def print_report(result: dict, baseline: dict = None):
+    previous = (baseline or {}).get("endpoints", {})
+    header = f"{'endpoint':<42}{'reqs':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in result["endpoints"].items():
+        line = (f"{endpoint:<42}{stats['requests']:>6}{stats['errors']:>5}{stats['rps']:>9.1f}"
+                f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        old = previous.get(endpoint)
+        if old and old.get("p95_ms"):
+            change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            line += f"   p95 {change:+.0f}% vs {baseline.get('commit') or 'baseline'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harness de carga de la API con upstream simulado")
+    parser.add_argument("--requests", type=int, default=200, help="iteraciones de escenario en total")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", default=["token", "generate_text", "generate_silencio",
+                                                            "dialogo", "onboarding"])
+    parser.add_argument("--stub-latency", default="lognormal:0.3,0.4")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--output", help="escribir el resultado como baseline JSON")
+    parser.add_argument("--compare", help="baseline JSON anterior para comparar")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    result = asyncio.run(run_harness(args))
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
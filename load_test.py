@@ -0,0 +1,116 @@
+"""
+Prueba de carga de /v1/generate contra la app ASGI en proceso.
+
+Mide cómo escala el throughput de peticiones concurrentes en un solo worker
+con un upstream simulado de latencia fija:
+
+- "blocking": el upstream bloquea el event loop (equivalente al cliente
+  síncrono `OpenAI` llamado dentro de un handler `async def`, el estado previo).
+- "async": el upstream se espera con `await` (cliente `AsyncOpenAI` compartido).
+
+Uso:
+    python load_test.py --latency 0.2 --concurrency 1 5 20 50
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'milo_load_test.db')}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from AIAPI import llm
+from AIAPI.main import app
+from AIAPI.ratelimit import rate_limiter
+
+
+class FakeCompletions:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="Respira. Estás aquí.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeClient:
+    def __init__(self, latency: float, blocking: bool):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency, blocking))
+
+    async def close(self):
+        pass
+
+
+async def get_token(ac: httpx.AsyncClient) -> str:
+    await ac.post("/register", json={"username": "loadtest", "full_name": "Load Test", "password": "loadtest123"})
+    response = await ac.post("/token", data={"username": "loadtest", "password": "loadtest123"})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run_level(ac: httpx.AsyncClient, token: str, concurrency: int, requests_per_level: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    queue = asyncio.Queue()
+    for i in range(requests_per_level):
+        queue.put_nowait(i)
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            # Un prompt distinto por petición: generate_flight fusiona las idénticas en curso
+            # y la medición contaría una llamada al upstream por ráfaga, no por petición
+            response = await ac.post("/v1/generate", headers=headers,
+                                     json={"prompt": f"Dame un consejo ({concurrency}-{i})", "mode": "text"})
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "requests": requests_per_level, "errors": errors,
+            "seconds": round(elapsed, 3), "rps": round(requests_per_level / elapsed, 1)}
+
+
+async def main(args):
+    rate_limiter.enabled = False  # el límite por usuario falsearía la medición
+    logging.getLogger().setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as ac:
+        token = await get_token(ac)
+        for label, blocking in (("blocking (antes)", True), ("async (después)", False)):
+            client = FakeClient(args.latency, blocking)
+            llm.set_client(client)
+            print(f"\n== upstream {label}, latencia {args.latency}s ==")
+            for concurrency in args.concurrency:
+                total = max(args.requests, concurrency)
+                calls_before = client.chat.completions.calls
+                result = await run_level(ac, token, concurrency, total)
+                upstream_calls = client.chat.completions.calls - calls_before
+                print(f"  concurrencia={result['concurrency']:>4}  peticiones={result['requests']:>4}  "
+                      f"upstream={upstream_calls:>4}  errores={result['errors']}  "
+                      f"tiempo={result['seconds']:>7}s  rps={result['rps']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de /v1/generate (antes/después de AsyncOpenAI)")
+    parser.add_argument("--latency", type=float, default=0.2, help="latencia simulada del upstream en segundos")
+    parser.add_argument("--requests", type=int, default=50, help="peticiones por nivel de concurrencia")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 20, 50])
+    asyncio.run(main(parser.parse_args()))
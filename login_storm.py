@@ -0,0 +1,101 @@
+"""
+Benchmark de tormenta de logins contra la app ASGI en proceso.
+
+Lanza POST /token concurrentes y, a la vez, sondea GET /health para medir si el
+resto de endpoints sigue respondiendo mientras se calcula bcrypt:
+
+- "inline": bcrypt dentro del handler (MILO_HASH_WORKERS=0, el estado previo).
+- "ejecutor": bcrypt en el pool acotado de passwords.py.
+
+Uso:
+    python login_storm.py --logins 100 --concurrency 20 --workers 4
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "sk-login-storm")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'milo_login_storm.db')}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from AIAPI.main import app
+from AIAPI.passwords import PasswordHasher
+from AIAPI.load_harness import percentile
+import AIAPI.crud as crud
+
+USERNAME = "loginstorm"
+PASSWORD = "loginstorm123"
+
+
+async def storm(ac: httpx.AsyncClient, logins: int, concurrency: int) -> dict:
+    queue = asyncio.Queue()
+    for _ in range(logins):
+        queue.put_nowait(None)
+    login_times, probe_times, errors = [], [], 0
+    done = asyncio.Event()
+
+    async def login_worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await ac.post("/token", data={"username": USERNAME, "password": PASSWORD})
+            login_times.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    async def prober():
+        # Latencia medida desde el instante programado: incluye lo que el loop tarda en atender
+        scheduled = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            await ac.get("/health")
+            probe_times.append(time.perf_counter() - scheduled)
+            scheduled = max(scheduled + 0.02, time.perf_counter())
+
+    probe = asyncio.ensure_future(prober())
+    start = time.perf_counter()
+    await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe
+    return {
+        "seconds": elapsed,
+        "logins_per_second": logins / elapsed,
+        "errors": errors,
+        "login_p50_ms": percentile(login_times, 50) * 1000,
+        "health_p50_ms": percentile(probe_times, 50) * 1000,
+        "health_p99_ms": percentile(probe_times, 99) * 1000,
+        "health_max_ms": max(probe_times or [0.0]) * 1000,
+    }
+
+
+async def main(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://storm", timeout=None) as ac:
+        await ac.post("/register", json={"username": USERNAME, "full_name": "Login Storm", "password": PASSWORD})
+        for label, workers in (("inline (antes)", 0), (f"ejecutor x{args.workers} (después)", args.workers)):
+            crud.password_hasher = PasswordHasher(workers=workers, max_pending=args.logins)
+            result = await storm(ac, args.logins, args.concurrency)
+            crud.password_hasher.shutdown()
+            print(f"== bcrypt {label} ==")
+            print(f"  logins={args.logins}  errores={result['errors']}  tiempo={result['seconds']:.2f}s  "
+                  f"logins/s={result['logins_per_second']:.1f}  login p50={result['login_p50_ms']:.0f}ms")
+            print(f"  /health durante la tormenta: p50={result['health_p50_ms']:.1f}ms  "
+                  f"p99={result['health_p99_ms']:.1f}ms  max={result['health_max_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tormenta de logins: responsividad con bcrypt inline vs ejecutor")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    asyncio.run(main(parser.parse_args()))
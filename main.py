@@ -1,37 +1,54 @@
 import os
+import json
+import inspect
 import logging
 from AIAPI.prompts import get_prompt_by_mode, PROMPTS
 
-from datetime import datetime, timedelta
-from typing import Optional, Generator, List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Generator, AsyncGenerator, List, Any
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from openai import OpenAI
-from fastapi import FastAPI, Depends, HTTPException, status, Request, APIRouter, Security
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, APIRouter, Security, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from prometheus_fastapi_instrumentator import Instrumentator
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, AfterValidator
+from typing_extensions import Annotated, NotRequired, TypedDict
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, time
 import uuid
 
 import AIAPI.models as models
 import AIAPI.crud as crud
-import AIAPI.crud_profile as crud_profile
-from AIAPI.database import SessionLocal, engine
+import AIAPI.crud_async as crud_async
+import AIAPI.llm as llm
+from AIAPI.cache import get_response_cache, normalize_prompt, BYPASS_HEADER
+from AIAPI.singleflight import SingleFlight
+from AIAPI.content_pool import content_pool, POOL_MODES
+from AIAPI.resilience import UpstreamUnavailable, upstream_breaker
+from AIAPI.fallbacks import get_fallback
+from AIAPI.context import context_builder
+from AIAPI.governor import Overloaded, upstream_governor, set_flow, current_flow
+from AIAPI.ratelimit import rate_limiter
+from AIAPI.metrics import setup_metrics
+from AIAPI.passwords import password_hasher
+from AIAPI.identity import UserSnapshot, identity_cache
+from AIAPI.dashboard import dashboard_cache
+from AIAPI.pagination import page_size, decode_cursor, paginate
+from AIAPI.tts import split_script, synthesize_segments
+from AIAPI.audio_cache import get_audio_cache, synthesize, parse_range, iter_file, RangeNotSatisfiable, TTS_VOICES, DEFAULT_VOICE
+from AIAPI.database import SessionLocal, AsyncSessionLocal, dispose_async_engine, engine
 from AIAPI.models import AdminUser
+from AIAPI.migrations import ensure_schema
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Solo comprobar la versión del esquema; las migraciones se aplican con `python migrations.py`
+ensure_schema(engine)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
@@ -42,10 +59,8 @@ if not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY no encontrada en variables de entorno")
     raise ValueError("OPENAI_API_KEY es requerida")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 # Configuración con validación
-MILO_MODEL_ID = os.getenv("MILO_MODEL_ID", "gpt-3.5-turbo")
+MILO_MODEL_ID = llm.MILO_MODEL_ID
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 if SECRET_KEY == "supersecretkey":
     logger.warning("⚠️ Usando SECRET_KEY por defecto. Cambia esto en producción!")
@@ -56,9 +71,25 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 security = HTTPBearer()
 
-limiter = Limiter(key_func=get_remote_address)
 app = FastAPI(title="Milo API", version="1.0")
 
+@app.on_event("startup")
+async def startup_llm_client():
+    # Crear el cliente OpenAI compartido antes de la primera petición
+    llm.get_client()
+
+@app.on_event("startup")
+async def startup_content_pool():
+    # Reposición en segundo plano del pool de contenido de los modos cortos
+    content_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await content_pool.stop()
+    await llm.close_client()
+    password_hasher.shutdown()
+    await dispose_async_engine()
+
 # Configuración CORS mejorada para producción
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "").split(",") if os.getenv("ALLOWED_ORIGINS") else []
@@ -85,12 +116,9 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# Instrumentación opcional en producción
-if ENVIRONMENT == "development":
-    Instrumentator().instrument(app).expose(app)
+# Métricas siempre activas; /metrics exige MILO_METRICS_TOKEN (o usar MILO_METRICS_PORT)
+setup_metrics(app)
 
 # Servir archivos estáticos de forma segura
 try:
@@ -141,6 +169,10 @@ async def onboarding_summary(request: Request):
 async def onboarding_welcome_message(request: Request):
     return templates.TemplateResponse("onboarding/welcome-message.html", {"request": request})
 
+# Coalescencia de generaciones idénticas en curso (doble clic, reintentos)
+generate_flight = SingleFlight("generate")
+welcome_flight = SingleFlight("welcome_message")
+
 # Model classes
 class Token(BaseModel):
     access_token: str
@@ -154,6 +186,12 @@ class UserCreate(BaseModel):
 class GenerateRequest(BaseModel):
     prompt: str
     mode: str  # text | audio | links
+    stream: bool = False  # True: respuesta como server-sent events
+    voice: Optional[str] = None  # voz TTS para mode=audio
+
+class MeditationAudioRequest(BaseModel):
+    text: str  # guion de la meditación
+    voice: Optional[str] = None
 
 # Onboarding Models
 class OnboardingStartResponse(BaseModel):
@@ -226,7 +264,15 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> UserSnapshot:
+    """
+    Usuario del token como instantánea inmutable. Solo consulta la BD si el
+    `sub` no está en la caché de identidad (o su entrada venció).
+    """
     exc = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -235,19 +281,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise exc
     except JWTError:
         raise exc
-    user = crud.get_user(db, username)
-    if not user:
+    user = identity_cache.get(username)
+    if user is None:
+        db = SessionLocal()
+        try:
+            db_user = crud.get_user(db, username)
+            if not db_user:
+                raise exc
+            user = UserSnapshot.from_user(db_user)
+        finally:
+            db.close()
+        identity_cache.put(user)
+    if user.disabled:
         raise exc
     return user
 
 # Helper para verificar admin
-async def get_current_admin(token: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def get_current_admin(token: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_async_db)):
     try:
         payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: Optional[str] = payload.get("sub")
         if not username:
             raise HTTPException(status_code=401, detail="No autorizado")
-        user = crud.get_user(db, username)
+        user = await crud_async.get_user(db, username)
         if not user or not getattr(user, "is_admin", False):
             raise HTTPException(status_code=403, detail="Solo administradores")
         return user
@@ -264,6 +320,8 @@ async def health():
         "status": "running", 
         "message": "Milo API is operational",
         "environment": ENVIRONMENT,
+        "upstream_breaker": upstream_breaker.state,
+        "upstream_queue": upstream_governor.stats(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -283,48 +341,153 @@ async def dialogo_sagrado(request: Request):
         return templates.TemplateResponse("dialogo_sagrado.html", {"request": request})
     return HTMLResponse("<h1>Dialogo Sagrado not available</h1>")
 
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Serializar un evento server-sent events"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def fallback_text(mode: str, error: UpstreamUnavailable, response: Optional[Response] = None) -> str:
+    """Texto de respaldo del corpus local cuando el upstream no está disponible"""
+    logger.warning(f"Upstream no disponible ({mode}): {error}. Sirviendo respaldo local")
+    if response is not None:
+        response.headers["X-Fallback"] = error.reason
+    return get_fallback(mode, error.reason)
+
+def stream_generation(messages: list, mode: str, on_complete=None, complete_on_fallback: bool = False,
+                      **llm_kwargs) -> StreamingResponse:
+    """
+    Respuesta SSE que reenvía cada token del upstream como evento `data: {"delta": ...}`
+    y cierra con `event: done` y el texto completo.
+    Si el upstream no está disponible antes del primer token se envía un texto de
+    respaldo y el evento `done` incluye `"fallback": <motivo>`.
+    :param on_complete: callback opcional (función o corrutina) que recibe el texto final ensamblado
+    :param complete_on_fallback: llamar también on_complete con el texto de respaldo
+    """
+    # Rechazar con 429/503 antes de abrir el stream si el gobernador no admitiría la llamada
+    overloaded = upstream_governor.admission_error(current_flow.get())
+    if overloaded is not None:
+        raise overloaded
+
+    async def event_source():
+        parts = []
+        fallback = None
+        try:
+            async for delta in llm.stream_chat(messages, mode=mode, **llm_kwargs):
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+        except UpstreamUnavailable as e:
+            fallback = e.reason
+            parts = [fallback_text(mode, e)]
+            yield sse_event({"delta": parts[0]})
+        except Exception as e:
+            logger.error(f"Error en streaming ({mode}): {e}")
+            yield sse_event({"detail": "Error interno del servidor"}, event="error")
+            return
+        text = "".join(parts).strip()
+        if on_complete and (fallback is None or complete_on_fallback):
+            try:
+                if inspect.iscoroutinefunction(on_complete):
+                    await on_complete(text)
+                else:
+                    await run_in_threadpool(on_complete, text)
+            except Exception as e:
+                logger.error(f"Error guardando respuesta en streaming ({mode}): {e}")
+        done = {"text": text}
+        if fallback is not None:
+            done["fallback"] = fallback
+        yield sse_event(done, event="done")
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def stream_cached_text(text: str, headers: Optional[dict] = None) -> StreamingResponse:
+    """Respuesta SSE con el mismo formato de stream_generation para un texto ya disponible"""
+    async def event_source():
+        yield sse_event({"delta": text})
+        yield sse_event({"text": text}, event="done")
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})}
+    )
+
 @app.get("/dialogo_conmigo/history")
-async def history(days: int = 2, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    msgs = crud.get_messages(db, current_user.id, days)
+async def history(
+    request: Request,
+    response: Response,
+    days: int = Query(2, ge=1, le=3660),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Mensajes más recientes primero, por páginas; la siguiente en el header Link (rel="next")"""
+    size = page_size(limit)
+    msgs = await crud_async.get_messages_page(db, current_user.id, days, size, decode_cursor(cursor))
+    msgs = paginate(msgs, size, "timestamp", request, response)
     return [{"role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()} for m in msgs]
 
 @app.post("/dialogo_conmigo/message")
 async def save_and_generate(
     req: GenerateRequest,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user)
 ):
+    rate_limiter.hit(user.id, "dialogo", stream=req.stream)
+    set_flow(f"user:{user.id}")
     try:
         # Guarda el mensaje del usuario
-        crud.create_message(db, user.id, 'user', req.prompt)
+        user_message = await crud_async.create_message(db, user.id, 'user', req.prompt)
 
         # Usa la lógica de generación de AIAPI
         prompt_to_use = req.prompt
-        if req.mode in PROMPTS:
-            user_vars = {
-                "full_name": user.full_name,
-                "username": user.username
-            }
-            prompt_text = get_prompt_by_mode(req.mode, user_vars, prompt_to_use)
-            resp = client.chat.completions.create(
-                model=MILO_MODEL_ID,
-                messages=[{"role": "user", "content": prompt_text}],
-                temperature=0.7,
-                max_tokens=250
+        user_vars = {
+            "full_name": user.full_name,
+            "username": user.username
+        }
+        if req.mode in PROMPTS and context_builder.uses_history(req.mode):
+            # Template como mensaje de sistema + turnos recientes dentro del presupuesto de tokens
+            messages = await crud_async.run_sync(
+                db, context_builder.build_messages, user.id, req.mode,
+                system_prompt=get_prompt_by_mode(req.mode, user_vars),
+                prompt=prompt_to_use,
+                exclude_id=user_message.id
             )
-            resp_text = resp.choices[0].message.content.strip()
         else:
-            resp = client.chat.completions.create(
-                model=MILO_MODEL_ID,
-                messages=[{"role": "user", "content": prompt_to_use}],
-                temperature=0.7,
-                max_tokens=250
-            )
-            resp_text = resp.choices[0].message.content.strip()
+            if req.mode in PROMPTS:
+                prompt_text = get_prompt_by_mode(req.mode, user_vars, prompt_to_use)
+            else:
+                prompt_text = prompt_to_use
+            messages = [{"role": "user", "content": prompt_text}]
+
+        if req.stream:
+            user_id = user.id
+
+            def save_ai_reply(text: str):
+                # La sesión de la dependencia puede estar cerrada cuando termina el stream
+                stream_db = SessionLocal()
+                try:
+                    crud.create_message(stream_db, user_id, 'ai', text)
+                finally:
+                    stream_db.close()
+
+            return stream_generation(messages, req.mode, on_complete=save_ai_reply, complete_on_fallback=True)
+
+        try:
+            resp_text = await llm.chat(messages, mode=req.mode)
+        except UpstreamUnavailable as e:
+            resp_text = fallback_text(req.mode, e, response)
 
         # Guarda la respuesta de la IA
-        crud.create_message(db, user.id, 'ai', resp_text)
+        await crud_async.create_message(db, user.id, 'ai', resp_text)
         return {"text": resp_text}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en dialogo_conmigo/message: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
@@ -366,11 +529,12 @@ async def silencio_sagrado(request: Request):
     return HTMLResponse("<h1>Silencio Sagrado not available</h1>")
 
 @app.post("/register", status_code=201)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        if crud.get_user(db, user.username):
+        if await crud_async.get_user(db, user.username):
             raise HTTPException(status_code=400, detail="Username already registered")
-        crud.create_user(db, user.username, user.full_name or "", user.password)
+        hashed_password = await password_hasher.hash(user.password)
+        await crud_async.create_user(db, user.username, user.full_name or "", user.password, hashed_password=hashed_password)
         return {"msg": f"User {user.username} created"}
     except HTTPException:
         raise
@@ -379,9 +543,9 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @app.post("/token", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     try:
-        user = crud.authenticate_user(db, form_data.username, form_data.password)
+        user = await crud_async.authenticate_user(db, form_data.username, form_data.password)
         if not user:
             logger.warning(f"Authentication failed for user {form_data.username}")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect credentials")
@@ -439,14 +603,14 @@ def create_onboarding_session_fixed(db: Session):
     return session
 
 @app.post("/onboarding/start", response_model=OnboardingStartResponse, tags=["onboarding"])
-async def start_onboarding(db: Session = Depends(get_db)):
+async def start_onboarding(db: AsyncSession = Depends(get_async_db)):
     """Iniciar nueva sesión de onboarding"""
     try:
         logger.info("Limpiando sesiones expiradas...")
-        crud.cleanup_expired_sessions(db)
+        await crud_async.cleanup_expired_sessions(db)
         logger.info("Creando nueva sesión de onboarding...")
         # Usa la función corregida
-        session = create_onboarding_session_fixed(db)
+        session = await crud_async.run_sync(db, create_onboarding_session_fixed)
         logger.info(f"Sesión creada: {session.session_id}")
         return OnboardingStartResponse(
             session_id=session.session_id,
@@ -459,11 +623,11 @@ async def start_onboarding(db: Session = Depends(get_db)):
 @app.post("/onboarding/temple", tags=["onboarding"])
 async def save_temple_name(
     request: OnboardingTempleRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Guardar nombre del templo interior"""
     try:
-        session = crud.update_onboarding_session(
+        session = await crud_async.update_onboarding_session(
             db, 
             request.session_id, 
             temple_name=request.temple_name
@@ -472,6 +636,7 @@ async def save_temple_name(
         if not session:
             raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
         
+        prefetch_welcome_message(session)
         return {"message": f"Templo '{request.temple_name}' guardado exitosamente"}
     except HTTPException:
         raise
@@ -482,7 +647,7 @@ async def save_temple_name(
 @app.post("/onboarding/emotional-state", tags=["onboarding"])
 async def save_emotional_state(
     request: OnboardingEmotionalStateRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Guardar estado emocional actual"""
     try:
@@ -492,7 +657,7 @@ async def save_emotional_state(
                 detail=f"Estado emocional inválido. Opciones: {EMOTIONAL_STATES}"
             )
         
-        session = crud.update_onboarding_session(
+        session = await crud_async.update_onboarding_session(
             db,
             request.session_id,
             emotional_state=request.emotional_state
@@ -501,6 +666,7 @@ async def save_emotional_state(
         if not session:
             raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
         
+        prefetch_welcome_message(session)
         return {"message": f"Estado emocional '{request.emotional_state}' guardado exitosamente"}
     except HTTPException:
         raise
@@ -511,7 +677,7 @@ async def save_emotional_state(
 @app.post("/onboarding/intention", tags=["onboarding"])
 async def save_intention(
     request: OnboardingIntentionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Guardar intención de uso de la app"""
     try:
@@ -521,7 +687,7 @@ async def save_intention(
                 detail=f"Intención inválida. Opciones: {INTENTIONS}"
             )
         
-        session = crud.update_onboarding_session(
+        session = await crud_async.update_onboarding_session(
             db,
             request.session_id,
             intention=request.intention
@@ -530,6 +696,7 @@ async def save_intention(
         if not session:
             raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
         
+        prefetch_welcome_message(session)
         return {"message": f"Intención '{request.intention}' guardada exitosamente"}
     except HTTPException:
         raise
@@ -540,7 +707,7 @@ async def save_intention(
 @app.post("/onboarding/personal-data", tags=["onboarding"])
 async def save_personal_data(
     request: OnboardingPersonalDataRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Guardar datos personales"""
     try:
@@ -558,7 +725,7 @@ async def save_personal_data(
             except ValueError:
                 raise HTTPException(status_code=400, detail="Formato de hora inválido. Use HH:MM")
         
-        session = crud.update_onboarding_session(
+        session = await crud_async.update_onboarding_session(
             db,
             request.session_id,
             full_name=request.full_name,
@@ -570,6 +737,7 @@ async def save_personal_data(
         if not session:
             raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
         
+        prefetch_welcome_message(session)
         return {"message": "Datos personales guardados exitosamente"}
     except HTTPException:
         raise
@@ -578,10 +746,10 @@ async def save_personal_data(
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @app.get("/onboarding/status/{session_id}", response_model=OnboardingStatusResponse, tags=["onboarding"])
-async def get_onboarding_status(session_id: str, db: Session = Depends(get_db)):
+async def get_onboarding_status(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Verificar estado del onboarding"""
     try:
-        session = crud.get_onboarding_session(db, session_id)
+        session = await crud_async.get_onboarding_session(db, session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
@@ -615,10 +783,49 @@ async def get_onboarding_status(session_id: str, db: Session = Depends(get_db)):
         logger.error(f"Error verificando estado: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+async def generate_and_store_welcome_message(session: models.UserOnboardingSession) -> Optional[str]:
+    """
+    Generar el mensaje de bienvenida y guardarlo en la sesión de onboarding.
+    Si el upstream no está disponible o el gobernador descarta la llamada retorna None
+    sin guardar nada, para que la siguiente petición vuelva a intentarlo.
+    """
+    try:
+        welcome_message = await crud.generate_welcome_message(session, fallback=False)
+    except (UpstreamUnavailable, Overloaded) as e:
+        logger.warning(f"No se pudo generar la bienvenida ahora: {e}")
+        return None
+    if not welcome_message:
+        return None
+
+    def store():
+        store_db = SessionLocal()
+        try:
+            crud.update_onboarding_session(store_db, session.session_id, welcome_message=welcome_message)
+        finally:
+            store_db.close()
+
+    logger.info(f"Mensaje generado. Actualizando la sesión en la BD.")
+    await run_in_threadpool(store)
+    return welcome_message
+
+def prefetch_welcome_message(session: models.UserOnboardingSession):
+    """
+    En cuanto la sesión tiene todos los datos, generar la bienvenida en segundo plano
+    para que /onboarding/generate-welcome sea una simple lectura. Si la página llega
+    antes de que termine, se une a esta misma llamada por welcome_flight.
+    """
+    if session.welcome_message or welcome_flight.in_flight(session.session_id):
+        return
+    if not crud.is_onboarding_complete(session)[0]:
+        return
+    logger.info(f"Datos de onboarding completos. Pre-generando la bienvenida.")
+    set_flow(f"onboarding:{session.session_id}")
+    welcome_flight.start(session.session_id, lambda: generate_and_store_welcome_message(session))
+
 @app.post("/onboarding/generate-welcome", tags=["onboarding"])
 async def get_or_generate_welcome_message(
     request: WelcomeMessageRequest, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene o genera un mensaje de bienvenida personalizado con IA para la sesión de onboarding.
@@ -630,7 +837,7 @@ async def get_or_generate_welcome_message(
         raise HTTPException(status_code=400, detail="session_id es requerido.")
 
     try:
-        session = crud.get_onboarding_session(db, request.session_id)
+        session = await crud_async.get_onboarding_session(db, request.session_id)
         if not session:
             logger.warning(f"No se encontró sesión para el id: {request.session_id}")
             raise HTTPException(status_code=404, detail="Sesión de onboarding no encontrada o expirada.")
@@ -639,21 +846,22 @@ async def get_or_generate_welcome_message(
             logger.info(f"Devolviendo mensaje existente para la sesión.")
             return {"welcome_message": session.welcome_message}
 
-        logger.info(f"Llamando a la función de IA para generar nuevo mensaje...")
-        
-        # --- CORRECCIÓN CLAVE: Se elimina 'await' ---
-        welcome_message = crud.generate_welcome_message(session)
-        
-        if not welcome_message:
-            logger.error(f"La función de IA no pudo generar un mensaje.")
-            raise HTTPException(status_code=500, detail="No se pudo generar el mensaje de bienvenida desde el servicio de IA.")
+        if welcome_flight.in_flight(request.session_id):
+            logger.info(f"Uniéndose a la generación en curso para la sesión.")
+        else:
+            logger.info(f"Llamando a la función de IA para generar nuevo mensaje...")
 
-        logger.info(f"Mensaje generado. Actualizando la sesión en la BD.")
-        crud.update_onboarding_session(
-            db, 
-            session_id=request.session_id, 
-            welcome_message=welcome_message
+        # Peticiones concurrentes de la misma sesión comparten una sola llamada y una sola escritura
+        set_flow(f"onboarding:{request.session_id}")
+        welcome_message = await welcome_flight.do(
+            request.session_id,
+            lambda: generate_and_store_welcome_message(session)
         )
+        
+        if not welcome_message:
+            # Texto genérico solo para esta respuesta: la próxima petición vuelve a generar
+            logger.warning(f"Bienvenida no disponible; sirviendo el texto genérico sin guardarlo.")
+            return {"welcome_message": crud.welcome_fallback(session)}
 
         return {"welcome_message": welcome_message}
 
@@ -666,11 +874,11 @@ async def get_or_generate_welcome_message(
 @app.post("/onboarding/complete-registration", status_code=201, tags=["onboarding"])
 async def complete_registration(
     request: OnboardingCompleteRegistrationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Completar registro con email y contraseña"""
     try:
-        session = crud.get_onboarding_session(db, request.session_id)
+        session = await crud_async.get_onboarding_session(db, request.session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
@@ -683,11 +891,12 @@ async def complete_registration(
             )
         
         # Crear usuario final
-        user = crud.transfer_onboarding_to_user(
+        user = await crud_async.transfer_onboarding_to_user(
             db,
             request.session_id,
             request.email,
-            request.password
+            request.password,
+            hashed_password=await password_hasher.hash(request.password)
         )
         
         if not user:
@@ -716,7 +925,7 @@ async def get_onboarding_options():
 
 @app.get("/user/onboarding-status", tags=["user"])
 async def get_user_onboarding_status(
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """Verificar estado de onboarding de usuario autenticado"""
     return {
@@ -732,8 +941,10 @@ async def get_user_onboarding_status(
 @app.post("/meditation/music")
 async def get_meditation_music(
     req: GenerateRequest,
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
+    rate_limiter.hit(current_user.id, "music")
+    set_flow(f"user:{current_user.id}")
     try:
         # Usar el endpoint de Playlist que ya tienes
         if req.mode == "Playlist":
@@ -755,19 +966,19 @@ async def get_meditation_music(
         else:
             # Generar recomendaciones con IA
             prompt_text = f"Recomienda 5 canciones instrumentales relajantes para meditación de {req.prompt}. Lista solo los nombres."
-            resp = client.chat.completions.create(
-                model=MILO_MODEL_ID,
-                messages=[{"role": "user", "content": prompt_text}],
-                temperature=0.7,
-                max_tokens=200
+            response_text = await llm.chat(
+                [{"role": "user", "content": prompt_text}],
+                mode="music"
             )
             
             # Parsear la respuesta en una lista
-            response_text = resp.choices[0].message.content.strip()
             tracks = [track.strip() for track in response_text.split('\n') if track.strip()]
             
             return {"tracks": tracks[:5]}  # Máximo 5 canciones
             
+    except HTTPException:
+        # Overloaded del gobernador: 429/503 con Retry-After, no la lista de respaldo
+        raise
     except Exception as e:
         logger.error(f"Error en meditation/music: {e}")
         # Fallback con canciones predefinidas
@@ -780,14 +991,57 @@ async def get_meditation_music(
         ]
         return {"tracks": fallback_tracks}
 
+@app.post("/meditation/audio")
+async def get_meditation_audio(
+    req: MeditationAudioRequest,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Convierte un guion largo en audio por segmentos sintetizados en paralelo.
+    Responde SSE: un evento `data: {"index", "audio_url", "cache"}` por segmento, en orden,
+    en cuanto está listo, y `event: done` al final. El cliente reproduce los segmentos en cola.
+    """
+    voice = req.voice or DEFAULT_VOICE
+    if voice not in TTS_VOICES:
+        raise HTTPException(status_code=400, detail="Voz no soportada")
+    segments = split_script(req.text)
+    if not segments:
+        raise HTTPException(status_code=400, detail="Guion vacío")
+    rate_limiter.hit(current_user.id, "meditation_audio")
+    set_flow(f"user:{current_user.id}")
+
+    async def event_source():
+        try:
+            async for index, key, hit in synthesize_segments(segments, voice):
+                yield sse_event({
+                    "index": index,
+                    "text": segments[index],
+                    "audio_url": f"/v1/audio/{key}",
+                    "cache": "HIT" if hit else "MISS"
+                })
+        except Exception as e:
+            logger.error(f"Error en meditation/audio: {e}")
+            yield sse_event({"detail": "Audio no disponible en este momento"}, event="error")
+            return
+        yield sse_event({"segments": len(segments)}, event="done")
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/v1/generate")
-@limiter.limit("5/minute")
 async def generate(
     request: Request,
+    response: Response,
     req: GenerateRequest,
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     promptstr: Optional[str] = None
 ):
+    # El TTS cuesta más fichas que el texto; el streaming suma un recargo
+    rate_limiter.hit(current_user.id, "audio" if req.mode == "audio" else "generate", stream=req.stream)
+    set_flow(f"user:{current_user.id}")
     try:
         logger.info(f"User {current_user.username} requested mode={req.mode}")
         prompt_to_use = promptstr if promptstr is not None else req.prompt
@@ -798,25 +1052,77 @@ async def generate(
                 "username": current_user.username
             }
             prompt_text = get_prompt_by_mode(req.mode, user_vars, prompt_to_use)
-            resp = client.chat.completions.create(
-                model=MILO_MODEL_ID,
-                messages=[{"role": "user", "content": prompt_text}],
-                temperature=0.7,
-                max_tokens=250
-            )
-            return {"text": resp.choices[0].message.content.strip()}
+            messages = [{"role": "user", "content": prompt_text}]
+
+            # Modos cortos sin texto del usuario: servir desde el pool pre-generado
+            if req.mode in POOL_MODES and not prompt_to_use.strip():
+                pooled_text = content_pool.serve(req.mode, current_user.id)
+                content_pool.trigger_refill(req.mode)
+                if pooled_text is not None:
+                    if req.stream:
+                        return stream_cached_text(pooled_text, headers={"X-Content-Pool": "HIT"})
+                    response.headers["X-Content-Pool"] = "HIT"
+                    return {"text": pooled_text}
+
+            # Caché de respuestas para los modos sin estado
+            response_cache = get_response_cache()
+            cacheable = response_cache.is_cacheable(req.mode)
+            bypass = request.headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes")
+            if cacheable and not bypass:
+                cached_text = await response_cache.get(req.mode, prompt_text, llm.route_model(req.mode))
+                if cached_text is not None:
+                    if req.stream:
+                        return stream_cached_text(cached_text, headers={"X-Cache": "HIT"})
+                    response.headers["X-Cache"] = "HIT"
+                    return {"text": cached_text}
+
+            async def store_in_cache(text: str):
+                if cacheable:
+                    await response_cache.set(req.mode, prompt_text, llm.route_model(req.mode), text)
+
+            cache_status = "BYPASS" if bypass else "MISS"
+            if req.stream:
+                streaming = stream_generation(messages, req.mode, on_complete=store_in_cache)
+                if cacheable:
+                    streaming.headers["X-Cache"] = cache_status
+                return streaming
+            async def generate_and_store():
+                text = await llm.chat(messages, mode=req.mode)
+                await store_in_cache(text)
+                return text
+
+            # Los modos cacheables comparten respuesta entre usuarios; el resto solo por usuario
+            flight_key = (None if cacheable else current_user.id, req.mode, normalize_prompt(prompt_text), llm.route_model(req.mode))
+            try:
+                text = await generate_flight.do(flight_key, generate_and_store)
+            except UpstreamUnavailable as e:
+                # El respaldo nunca se guarda en la caché
+                return {"text": fallback_text(req.mode, e, response)}
+            if cacheable:
+                response.headers["X-Cache"] = cache_status
+            return {"text": text}
 
         if req.mode == "text":
-            resp = client.chat.completions.create(
-                model=MILO_MODEL_ID,
-                messages=[{"role": "user", "content": prompt_to_use}],
-                temperature=0.7,
-                max_tokens=250
-            )
-            return {"text": resp.choices[0].message.content.strip()}
+            messages = [{"role": "user", "content": prompt_to_use}]
+            if req.stream:
+                return stream_generation(messages, req.mode)
+            flight_key = (current_user.id, req.mode, normalize_prompt(prompt_to_use), llm.route_model(req.mode))
+            try:
+                return {"text": await generate_flight.do(flight_key, lambda: llm.chat(messages, mode=req.mode))}
+            except UpstreamUnavailable as e:
+                return {"text": fallback_text(req.mode, e, response)}
         elif req.mode == "audio":
-            audio_resp = client.audio.speech.create(model="tts-1", input=prompt_to_use, voice="alloy", format="mp3")
-            return {"audio_base64": audio_resp.audio}
+            voice = req.voice or DEFAULT_VOICE
+            if voice not in TTS_VOICES:
+                raise HTTPException(status_code=400, detail="Voz no soportada")
+            try:
+                key, hit = await synthesize(prompt_to_use, voice)
+            except UpstreamUnavailable as e:
+                logger.warning(f"TTS no disponible: {e}")
+                raise HTTPException(status_code=503, detail="Audio no disponible en este momento",
+                                    headers={"Retry-After": "30"})
+            response.headers["X-Cache"] = "HIT" if hit else "MISS"
+            return {"audio_url": f"/v1/audio/{key}"}
         elif req.mode == "Playlist":
             tracks = []
             playlist_file = "lista.txt"
@@ -835,6 +1141,40 @@ async def generate(
         logger.error(f"Error en v1/generate: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@app.get("/v1/audio/{key}")
+async def get_audio(key: str, request: Request):
+    """
+    Sirve un audio de la caché TTS como audio/mpeg con ETag y soporte de Range.
+    La clave es el hash del contenido, así que el recurso es inmutable.
+    """
+    path = await run_in_threadpool(get_audio_cache().get, key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Audio no encontrado")
+    size = os.path.getsize(path)
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file(path), media_type="audio/mpeg", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file(path, start, end - start + 1), status_code=206,
+                             media_type="audio/mpeg", headers=headers)
+
 # Agregar después de los modelos Pydantic existentes
 
 class UserProfileResponse(BaseModel):
@@ -872,6 +1212,30 @@ class PasswordChangeRequest(BaseModel):
     current_password: str
     new_password: str
 
+# Ingesta por lotes: TypedDict para que pydantic-core valide la lista completa en una
+# sola pasada, sin crear un modelo por lectura
+HEART_RATE_BATCH_MAX = int(os.getenv("MILO_HR_BATCH_MAX", "50000"))
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+class HeartRateReading(TypedDict):
+    recorded_at: Annotated[datetime, AfterValidator(to_naive_utc)]
+    heart_rate: Annotated[int, Field(ge=20, le=250)]
+    device_type: NotRequired[Annotated[str, Field(max_length=50)]]
+    activity_type: NotRequired[Optional[Annotated[str, Field(max_length=50)]]]
+    stress_level: NotRequired[Optional[Annotated[int, Field(ge=1, le=10)]]]
+
+class HeartRateBatchRequest(BaseModel):
+    readings: List[HeartRateReading] = Field(max_length=HEART_RATE_BATCH_MAX)
+
+class HeartRateBatchResponse(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+
 class HeartRateDataResponse(BaseModel):
     id: int
     heart_rate: int
@@ -880,6 +1244,17 @@ class HeartRateDataResponse(BaseModel):
     activity_type: Optional[str]
     stress_level: Optional[int]
 
+class HeartRateChartPoint(BaseModel):
+    bucket: datetime
+    readings: int
+    average: float
+    min: int
+    max: int
+
+class HeartRateChartResponse(BaseModel):
+    resolution: str  # minute, hour o day
+    points: List[HeartRateChartPoint]
+
 class DashboardStatsResponse(BaseModel):
     period_days: int
     total_events: int
@@ -901,14 +1276,14 @@ class AppEventResponse(BaseModel):
 # ================= PROFILE ENDPOINTS =================
 
 @app.get("/profile", response_model=UserProfileResponse, tags=["profile"])
-async def get_profile(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_profile(current_user: UserSnapshot = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Obtener perfil del usuario"""
     try:
-        profile = crud_profile.get_user_profile(db, current_user.id)
+        profile = await crud_async.get_user_profile(db, current_user.id)
         
         if not profile:
             # Crear perfil por defecto si no existe
-            profile = crud_profile.create_user_profile(db, current_user.id)
+            profile = await crud_async.create_user_profile(db, current_user.id)
         
         return profile
     except Exception as e:
@@ -918,13 +1293,13 @@ async def get_profile(current_user: models.User = Depends(get_current_user), db:
 @app.put("/profile", response_model=UserProfileResponse, tags=["profile"])
 async def update_profile(
     profile_update: UserProfileUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Actualizar perfil del usuario"""
     try:
         update_data = profile_update.dict(exclude_unset=True)
-        profile = crud_profile.update_user_profile(db, current_user.id, **update_data)
+        profile = await crud_async.update_user_profile(db, current_user.id, **update_data)
         return profile
     except Exception as e:
         logger.error(f"Error actualizando perfil: {e}")
@@ -933,8 +1308,8 @@ async def update_profile(
 @app.put("/profile/onboarding", tags=["profile"])
 async def update_onboarding_data(
     onboarding_update: UserOnboardingUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Actualizar datos del onboarding"""
     try:
@@ -953,7 +1328,7 @@ async def update_onboarding_data(
             except ValueError:
                 raise HTTPException(status_code=400, detail="Formato de hora inválido. Use HH:MM")
         
-        user = crud_profile.update_user_onboarding_data(db, current_user.id, **update_data)
+        user = await crud_async.update_user_onboarding_data(db, current_user.id, **update_data)
         
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -968,17 +1343,21 @@ async def update_onboarding_data(
 @app.post("/profile/change-password", tags=["profile"])
 async def change_password(
     password_request: PasswordChangeRequest,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cambiar contraseña del usuario"""
     try:
-        # Verificar contraseña actual
-        if not crud.authenticate_user(db, current_user.username, password_request.current_password):
+        # Verificar contraseña actual (la instantánea de identidad no lleva el hash)
+        db_user = await crud_async.get_user(db, current_user.username)
+        if not db_user or not await password_hasher.verify(password_request.current_password, db_user.hashed_password):
             raise HTTPException(status_code=400, detail="Contraseña actual incorrecta")
         
         # Cambiar contraseña
-        user = crud_profile.change_user_password(db, current_user.id, password_request.new_password)
+        user = await crud_async.change_user_password(
+            db, current_user.id, password_request.new_password,
+            hashed_password=await password_hasher.hash(password_request.new_password)
+        )
         
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -992,27 +1371,78 @@ async def change_password(
 
 @app.get("/profile/heart-rate", response_model=List[HeartRateDataResponse], tags=["profile", "dashboard"])
 async def get_heart_rate_history(
-    days: int = 7,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    days: int = Query(7, ge=1, le=3660),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Obtener historial de ritmo cardíaco"""
+    """Obtener historial de ritmo cardíaco por páginas (siguiente en el header Link)"""
+    size = page_size(limit)
+    before = decode_cursor(cursor)
     try:
-        heart_rate_data = crud_profile.get_heart_rate_history(db, current_user.id, days)
-        return heart_rate_data
+        heart_rate_data = await crud_async.get_heart_rate_page(db, current_user.id, days, size, before)
+        return paginate(heart_rate_data, size, "recorded_at", request, response)
     except Exception as e:
         logger.error(f"Error obteniendo datos de ritmo cardíaco: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@app.get("/profile/heart-rate/stats", tags=["profile", "dashboard"])
+async def get_heart_rate_stats_endpoint(
+    days: int = Query(7, ge=1, le=3660),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Media, desviación, mínimo, máximo y lecturas del periodo (desde los agregados)"""
+    try:
+        return await crud_async.get_heart_rate_stats(db, current_user.id, days)
+    except Exception as e:
+        logger.error(f"Error obteniendo estadísticas de ritmo cardíaco: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.get("/profile/heart-rate/chart", response_model=HeartRateChartResponse, tags=["profile", "dashboard"])
+async def get_heart_rate_chart(
+    days: float = Query(7, gt=0, le=3660),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Serie para gráficos: por minuto, hora o día según la ventana (como máximo MILO_HR_CHART_POINTS puntos)"""
+    try:
+        return await crud_async.get_heart_rate_chart(db, current_user.id, days)
+    except Exception as e:
+        logger.error(f"Error obteniendo gráfico de ritmo cardíaco: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.post("/profile/heart-rate/batch", response_model=HeartRateBatchResponse, tags=["profile", "dashboard"])
+async def ingest_heart_rate_batch(
+    batch: HeartRateBatchRequest,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Guardar un lote de lecturas de ritmo cardíaco (p.ej. la sincronización de un reloj); ignora las repetidas"""
+    try:
+        inserted = await crud_async.create_heart_rate_readings(db, current_user.id, batch.readings)
+    except Exception as e:
+        logger.error(f"Error guardando lote de ritmo cardíaco: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+    received = len(batch.readings)
+    return {"received": received, "inserted": inserted, "duplicates": received - inserted}
+
 @app.get("/profile/dashboard", response_model=DashboardStatsResponse, tags=["profile", "dashboard"])
 async def get_dashboard_stats_endpoint(
-    days: int = 7,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    days: int = Query(7, ge=1, le=3660),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Obtener estadísticas del dashboard"""
+    """Obtener estadísticas del dashboard (en caché por usuario y días hasta que cambien sus datos)"""
     try:
-        stats = crud_profile.get_dashboard_stats(db, current_user.id, days)
+        stats = dashboard_cache.get(current_user.id, days)
+        if stats is None:
+            generation = dashboard_cache.generation(current_user.id)
+            stats = await crud_async.get_dashboard_stats(db, current_user.id, days)
+            dashboard_cache.put(current_user.id, days, stats, generation)
         return stats
     except Exception as e:
         logger.error(f"Error obteniendo estadísticas del dashboard: {e}")
@@ -1020,23 +1450,29 @@ async def get_dashboard_stats_endpoint(
 
 @app.get("/profile/events", response_model=List[AppEventResponse], tags=["profile", "dashboard"])
 async def get_app_events(
-    days: int = 30,
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=3660),
     event_type: Optional[str] = None,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Obtener historial de eventos de la app"""
+    """Obtener historial de eventos de la app por páginas (siguiente en el header Link)"""
+    size = page_size(limit)
+    before = decode_cursor(cursor)
     try:
-        events = crud_profile.get_app_events_history(db, current_user.id, days, event_type)
-        return events
+        events = await crud_async.get_app_events_page(db, current_user.id, days, size, before, event_type)
+        return paginate(events, size, "created_at", request, response)
     except Exception as e:
         logger.error(f"Error obteniendo eventos: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @app.post("/profile/simulate-data", tags=["profile", "testing"])
 async def simulate_user_data(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Simular datos para testing (solo en desarrollo)"""
     if ENVIRONMENT != "development":
@@ -1044,10 +1480,10 @@ async def simulate_user_data(
     
     try:
         # Simular datos de ritmo cardíaco (últimos 7 días)
-        hr_count = crud_profile.simulate_heart_rate_data(db, current_user.id, 7)
+        hr_count = await crud_async.simulate_heart_rate_data(db, current_user.id, 7)
         
         # Simular eventos de la app (últimos 30 días)
-        events_count = crud_profile.simulate_app_events(db, current_user.id, 30)
+        events_count = await crud_async.simulate_app_events(db, current_user.id, 30)
         
         return {
             "message": "Datos simulados creados exitosamente",
@@ -1058,12 +1494,12 @@ async def simulate_user_data(
         logger.error(f"Error simulando datos: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
-@app.get("/admin/dashboard", tags=["admin"])
-async def admin_dashboard(db: Session = Depends(get_db), admin=Depends(get_current_admin)):
-    # Estadísticas globales
+def admin_overview(db: Session) -> dict:
+    """Estadísticas globales del panel de administración"""
     total_users = db.query(models.User).count()
     total_onboarding = db.query(models.UserOnboardingSession).count()
-    recent_users = db.query(models.User).order_by(models.User.created_at.desc()).limit(10).all()
+    # users no tiene created_at: el id autoincremental da el orden de alta
+    recent_users = db.query(models.User).order_by(models.User.id.desc()).limit(10).all()
     recent_onboarding = db.query(models.UserOnboardingSession).order_by(models.UserOnboardingSession.created_at.desc()).limit(10).all()
     return {
         "total_users": total_users,
@@ -1072,6 +1508,10 @@ async def admin_dashboard(db: Session = Depends(get_db), admin=Depends(get_curre
         "recent_onboarding": [s.session_id for s in recent_onboarding]
     }
 
+@app.get("/admin/dashboard", tags=["admin"])
+async def admin_dashboard(db: AsyncSession = Depends(get_async_db), admin=Depends(get_current_admin)):
+    return await crud_async.run_sync(db, admin_overview)
+
 @app.get("/admin/dashboard-view", include_in_schema=False)
 async def admin_dashboard_view(request: Request):
     return templates.TemplateResponse("dashboard.html", {"request": request})
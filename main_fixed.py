@@ -26,9 +26,10 @@ import models
 import crud
 from database import SessionLocal, engine
 from models import AdminUser
+from AIAPI.migrations import ensure_schema
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Solo comprobar la versión del esquema; las migraciones se aplican con `python migrations.py`
+ensure_schema(engine)
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
@@ -17,7 +17,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from prometheus_fastapi_instrumentator import Instrumentator
 from pydantic import BaseModel
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
@@ -26,9 +25,11 @@ import models
 import crud
 from database import SessionLocal, engine
 from models import AdminUser
+from AIAPI.migrations import ensure_schema
+from AIAPI.metrics import setup_metrics
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Solo comprobar la versión del esquema; las migraciones se aplican con `python migrations.py`
+ensure_schema(engine)
 
 # Configuración de OpenAI con validación
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -84,9 +85,8 @@ app.add_middleware(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# Instrumentación opcional en producción
-if ENVIRONMENT == "development":
-    Instrumentator().instrument(app).expose(app)
+# Métricas siempre activas; /metrics exige MILO_METRICS_TOKEN (o usar MILO_METRICS_PORT)
+setup_metrics(app)
 
 # Servir archivos estáticos de forma segura
 try:
@@ -0,0 +1,266 @@
+import os
+import time
+import logging
+import secrets
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    generate_latest, multiprocess, start_http_server,
+)
+from prometheus_fastapi_instrumentator import Instrumentator
+from sqlalchemy import event
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# --- Métricas propias de Milo ---
+# Se registran en el registro por defecto de prometheus_client y se exponen
+# siempre: en /metrics protegido por token y/o en un puerto aparte (setup_metrics).
+METRICS_TOKEN = os.getenv("MILO_METRICS_TOKEN", "")
+# /metrics sin token solo si se pide explícitamente (p.ej. en local); nunca por ENVIRONMENT
+METRICS_PUBLIC = os.getenv("MILO_METRICS_PUBLIC", "0") == "1"
+METRICS_PORT = int(os.getenv("MILO_METRICS_PORT", "0"))
+METRICS_ADDR = os.getenv("MILO_METRICS_ADDR", "127.0.0.1")
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "milo_llm_time_to_first_token_seconds",
+    "Tiempo desde la petición al upstream hasta el primer token en modo streaming",
+    ["mode"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+)
+
+RESPONSE_CACHE_REQUESTS = Counter(
+    "milo_response_cache_requests_total",
+    "Consultas a la caché de respuestas por modo y resultado (hit/miss)",
+    ["mode", "result"]
+)
+
+SINGLEFLIGHT_CALLS = Counter(
+    "milo_singleflight_calls_total",
+    "Generaciones por grupo de coalescencia: leader (llamada real) o coalesced (resultado compartido)",
+    ["flight", "result"]
+)
+
+CONTENT_POOL_REQUESTS = Counter(
+    "milo_content_pool_requests_total",
+    "Peticiones servidas desde el pool de contenido por modo y resultado (hit/empty/exhausted)",
+    ["mode", "result"]
+)
+
+CONTENT_POOL_SIZE = Gauge(
+    "milo_content_pool_size",
+    "Textos aprobados disponibles en el pool por modo",
+    ["mode"]
+)
+
+CONTENT_POOL_GENERATED = Counter(
+    "milo_content_pool_generated_total",
+    "Textos generados y aprobados para el pool por modo",
+    ["mode"]
+)
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "milo_circuit_breaker_state",
+    "Estado del circuit breaker del upstream (0 closed, 1 half_open, 2 open)",
+    ["breaker"]
+)
+
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "milo_circuit_breaker_transitions_total",
+    "Cambios de estado del circuit breaker",
+    ["breaker", "state"]
+)
+
+LLM_FALLBACKS = Counter(
+    "milo_llm_fallbacks_total",
+    "Respuestas servidas desde el corpus local de respaldo por modo y motivo",
+    ["mode", "reason"]
+)
+
+LLM_DEADLINE_EXCEEDED = Counter(
+    "milo_llm_deadline_exceeded_total",
+    "Llamadas al upstream que superaron el plazo de su modo",
+    ["mode"]
+)
+
+LLM_HEDGED_CALLS = Counter(
+    "milo_llm_hedged_calls_total",
+    "Llamadas al upstream que lanzaron una segunda petición (hedging)",
+    ["mode"]
+)
+
+CONVERSATION_WINDOW_CACHE = Counter(
+    "milo_conversation_window_cache_total",
+    "Lecturas de la ventana de conversación por usuario (hit = solo mensajes nuevos)",
+    ["result"]
+)
+
+CONVERSATION_CONTEXT_TOKENS = Histogram(
+    "milo_conversation_context_tokens",
+    "Tokens estimados del prompt enviado con historial de conversación",
+    ["mode"],
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000)
+)
+
+AUDIO_CACHE_REQUESTS = Counter(
+    "milo_audio_cache_requests_total",
+    "Búsquedas en la caché de audio TTS",
+    ["result"]
+)
+
+AUDIO_CACHE_EVICTIONS = Counter(
+    "milo_audio_cache_evictions_total",
+    "Archivos de audio expulsados por el tope de tamaño de la caché"
+)
+
+LLM_REQUEST_LATENCY = Histogram(
+    "milo_llm_request_latency_seconds",
+    "Duración de las chat completions por perfil de generación y modelo",
+    ["profile", "model"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 20.0, 30.0, 45.0)
+)
+
+LLM_TOKENS = Counter(
+    "milo_llm_tokens_total",
+    "Tokens consumidos por perfil de generación, modelo y tipo (prompt | completion)",
+    ["profile", "model", "kind"]
+)
+
+GOVERNOR_IN_FLIGHT = Gauge(
+    "milo_upstream_in_flight",
+    "Llamadas al upstream en curso en este proceso"
+)
+
+GOVERNOR_QUEUE_DEPTH = Gauge(
+    "milo_upstream_queue_depth",
+    "Peticiones esperando un lugar de concurrencia hacia el upstream"
+)
+
+GOVERNOR_WAIT_SECONDS = Histogram(
+    "milo_upstream_queue_wait_seconds",
+    "Espera en la cola del gobernador antes de llamar al upstream",
+    ["mode"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+)
+
+GOVERNOR_REJECTIONS = Counter(
+    "milo_upstream_rejections_total",
+    "Peticiones rechazadas por el gobernador (flow_queue_full, queue_full, wait_timeout)",
+    ["reason"]
+)
+
+RATE_LIMIT_REJECTIONS = Counter(
+    "milo_rate_limit_rejections_total",
+    "Peticiones rechazadas por el límite de fichas por usuario",
+    ["route"]
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "milo_db_query_seconds",
+    "Duración de las sentencias SQL por operación (select, insert, update, delete, other)",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "milo_password_hash_seconds",
+    "Duración de bcrypt por operación (hash | verify)",
+    ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+)
+
+PASSWORD_HASH_PENDING = Gauge(
+    "milo_password_hash_pending",
+    "Operaciones bcrypt en cola o en curso en el ejecutor de hash"
+)
+
+PASSWORD_HASH_WAIT_SECONDS = Histogram(
+    "milo_password_hash_queue_wait_seconds",
+    "Espera en la cola del ejecutor de hash antes de empezar bcrypt",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+PASSWORD_HASH_REJECTIONS = Counter(
+    "milo_password_hash_rejections_total",
+    "Operaciones bcrypt rechazadas por cola llena"
+)
+
+IDENTITY_CACHE_REQUESTS = Counter(
+    "milo_identity_cache_requests_total",
+    "Resoluciones del usuario autenticado por resultado (hit/miss)",
+    ["result"]
+)
+
+DASHBOARD_CACHE_REQUESTS = Counter(
+    "milo_dashboard_cache_requests_total",
+    "Consultas de /profile/dashboard por resultado de la caché (hit/miss)",
+    ["result"]
+)
+
+SQL_OPERATIONS = {"select", "insert", "update", "delete"}
+
+
+def instrument_engine(engine):
+    """Medir cada sentencia SQL del engine con los eventos de cursor de SQLAlchemy"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("milo_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("milo_query_start")
+        if not starts:
+            return
+        operation = statement.lstrip()[:6].lower()
+        DB_QUERY_SECONDS.labels(
+            operation=operation if operation in SQL_OPERATIONS else "other"
+        ).observe(time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("milo_query_start"):
+            conn.info["milo_query_start"].pop()
+
+
+def render_metrics() -> bytes:
+    # Con varios workers y PROMETHEUS_MULTIPROC_DIR se agregan los de todos los procesos
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if METRICS_TOKEN:
+        expected = f"Bearer {METRICS_TOKEN}"
+        if not secrets.compare_digest(request.headers.get("authorization", ""), expected):
+            return Response("No autorizado", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    elif not METRICS_PUBLIC:
+        return Response("Not Found", status_code=404)
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app):
+    """
+    Instrumentación HTTP siempre activa. Exposición:
+    - /metrics si hay MILO_METRICS_TOKEN (exige `Authorization: Bearer <token>`) o con
+      MILO_METRICS_PUBLIC=1 (abierto); si no, responde 404
+    - servidor aparte en MILO_METRICS_ADDR:MILO_METRICS_PORT si se define el puerto
+    """
+    Instrumentator(excluded_handlers=["/metrics"]).instrument(app)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    if not (METRICS_TOKEN or METRICS_PUBLIC or METRICS_PORT):
+        logger.warning("⚠️ Métricas sin exponer: define MILO_METRICS_TOKEN o MILO_METRICS_PORT")
+
+    if METRICS_PORT:
+        @app.on_event("startup")
+        async def start_metrics_server():
+            try:
+                start_http_server(METRICS_PORT, addr=METRICS_ADDR)
+            except OSError:
+                # Otro worker ya sirve el puerto
+                logger.info(f"Puerto de métricas {METRICS_PORT} ya en uso")
@@ -0,0 +1,369 @@
+"""
+Migraciones versionadas del esquema, sin recrear tablas (la 3 borra lecturas de
+ritmo cardíaco duplicadas antes de crear su índice único).
+
+Cada migración tiene un número de versión y se aplica una sola vez; la tabla
+`schema_version` registra las aplicadas. Todas son idempotentes (checkfirst /
+columnas que faltan) para que dos procesos que migran a la vez no fallen.
+
+El arranque de la app solo comprueba la versión (ensure_schema); las migraciones
+se aplican antes del despliegue:
+
+    python migrations.py            # aplicar las pendientes
+    python migrations.py --status   # versión actual y pendientes
+
+En desarrollo (ENVIRONMENT=development o MILO_AUTO_MIGRATE=1) ensure_schema
+aplica las pendientes al arrancar.
+"""
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text, Time,
+    inspect, insert, select, func,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv(
+    "MILO_AUTO_MIGRATE",
+    "1" if os.getenv("ENVIRONMENT", "development") == "development" else "0",
+) == "1"
+
+schema_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+# --- Tablas tal como las crea cada migración ---
+# Copia fija, no los modelos: cambiar models.py no altera lo que crea una versión
+# ya publicada; las tablas y columnas nuevas van en una migración nueva.
+migration_schema = MetaData()
+
+Table(
+    "users", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False),
+    Column("full_name", String),
+    Column("hashed_password", String, nullable=False),
+    Column("disabled", Boolean),
+    Column("birth_date", Date),
+    Column("birth_place", String),
+    Column("birth_time", Time),
+    Column("temple_name", String),
+    Column("emotional_state", String),
+    Column("intention", String),
+    Column("onboarding_completed", Boolean),
+)
+Table(
+    "admin_users", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False),
+    Column("full_name", String),
+    Column("hashed_password", String, nullable=False),
+    Column("is_active", Boolean),
+)
+Table(
+    "messages", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("role", String),
+    Column("content", Text),
+    Column("timestamp", DateTime),
+)
+Table(
+    "user_onboarding_sessions", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("session_id", String, unique=True, index=True, nullable=False),
+    Column("temple_name", String),
+    Column("emotional_state", String),
+    Column("intention", String),
+    Column("full_name", String),
+    Column("birth_date", Date),
+    Column("birth_place", String),
+    Column("birth_time", Time),
+    Column("welcome_message", Text),
+    Column("created_at", DateTime),
+    Column("expires_at", DateTime),
+    Column("is_completed", Boolean),
+)
+Table(
+    "user_profiles", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), unique=True),
+    Column("avatar_url", String),
+    Column("bio", Text),
+    Column("phone", String),
+    Column("timezone", String),
+    Column("email_notifications", Boolean),
+    Column("push_notifications", Boolean),
+    Column("meditation_reminders", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+Table(
+    "heart_rate_data", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("heart_rate", Integer),
+    Column("recorded_at", DateTime),
+    Column("device_type", String),
+    Column("activity_type", String),
+    Column("stress_level", Integer),
+)
+Table(
+    "app_events", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("event_type", String),
+    Column("event_name", String),
+    Column("duration_minutes", Float),
+    Column("details", Text),
+    Column("created_at", DateTime),
+)
+Table(
+    "content_pool_items", migration_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("mode", String, index=True, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("approved", Boolean),
+    Column("created_at", DateTime, index=True),
+)
+
+
+# Versión 1: lo que creaba create_all antes de las migraciones
+BASE_TABLES = [
+    "users", "admin_users", "messages", "user_onboarding_sessions", "user_profiles",
+    "heart_rate_data", "app_events", "content_pool_items",
+]
+
+# Versión 4
+for _name in ("heart_rate_minute", "heart_rate_hour", "heart_rate_day"):
+    Table(
+        _name, migration_schema,
+        Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+        Column("bucket", DateTime, primary_key=True),
+        Column("readings", Integer, nullable=False),
+        Column("bpm_sum", Integer, nullable=False),
+        Column("bpm_sum_sq", Integer, nullable=False),
+        Column("bpm_min", Integer, nullable=False),
+        Column("bpm_max", Integer, nullable=False),
+    )
+
+# Versión 5
+Table(
+    "user_daily_stats", migration_schema,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("event_type", String, primary_key=True),
+    Column("events", Integer, nullable=False),
+    Column("minutes", Float, nullable=False),
+)
+
+
+def create_tables(conn, names: list):
+    migration_schema.create_all(bind=conn, tables=[migration_schema.tables[name] for name in names], checkfirst=True)
+
+
+def add_missing_columns(conn, names: list):
+    """ALTER TABLE ADD COLUMN de las columnas de las tablas `names` que falten en la BD"""
+    inspector = inspect(conn)
+    for name in names:
+        existing = {column["name"] for column in inspector.get_columns(name)}
+        for column in migration_schema.tables[name].columns:
+            if column.name not in existing:
+                logger.info("Añadiendo columna %s.%s", name, column.name)
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN {ddl}")
+
+
+def create_base_schema(conn):
+    """Esquema base: tablas que falten y columnas añadidas antes de existir las migraciones"""
+    create_tables(conn, BASE_TABLES)
+    add_missing_columns(conn, BASE_TABLES)
+
+
+def create_index(conn, name: str, table: str, columns: tuple, unique: bool = False):
+    # DDL explícito (no los Index de models.py): una migración describe el esquema de su versión
+    conn.exec_driver_sql(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def create_per_user_indexes(conn):
+    """Índices compuestos de las consultas por usuario y rango de fechas"""
+    create_index(conn, "ix_messages_user_timestamp", "messages", ("user_id", "timestamp"))
+    create_index(conn, "ix_heart_rate_user_recorded", "heart_rate_data", ("user_id", "recorded_at"))
+    create_index(conn, "ix_app_events_user_type_created", "app_events", ("user_id", "event_type", "created_at"))
+    create_index(conn, "ix_onboarding_expires_at", "user_onboarding_sessions", ("expires_at",))
+
+
+def unique_heart_rate_readings(conn):
+    """
+    Lecturas únicas por (user_id, recorded_at, device_type) para la ingesta por lotes.
+    Borra las repetidas (conserva la de menor id). Solo compara filas con las tres
+    columnas informadas: el índice único trata los NULL como distintos.
+    """
+    keyed = "user_id IS NOT NULL AND recorded_at IS NOT NULL AND device_type IS NOT NULL"
+    removed = conn.exec_driver_sql(
+        f"DELETE FROM heart_rate_data WHERE {keyed} AND id NOT IN "
+        f"(SELECT MIN(id) FROM heart_rate_data WHERE {keyed} GROUP BY user_id, recorded_at, device_type)"
+    ).rowcount
+    if removed:
+        logger.warning("Migración 3: %s lecturas de ritmo cardíaco repetidas eliminadas", removed)
+    create_index(conn, "ux_heart_rate_reading", "heart_rate_data", ("user_id", "recorded_at", "device_type"), unique=True)
+    # El índice único empieza por (user_id, recorded_at): el anterior sobra y encarece cada insert
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_heart_rate_user_recorded")
+
+
+# Formato con el que el tipo DateTime guarda en SQLite, fijado al escribir la versión 4
+SQLITE_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00.000000",
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+}
+
+
+def truncate_sql(conn, resolution: str, column: str) -> str:
+    if conn.dialect.name == "sqlite":
+        return f"strftime('{SQLITE_BUCKET_FORMATS[resolution]}', {column})"
+    return f"date_trunc('{resolution}', {column})"
+
+
+def heart_rate_rollups(conn):
+    """
+    Tablas de agregados por minuto, hora y día, rellenadas desde las lecturas existentes.
+    SQL propio sobre las tablas de esta versión, no rollups.py: cambiar los agregados
+    de la app no altera lo que hace esta migración.
+    """
+    create_tables(conn, ["heart_rate_minute", "heart_rate_hour", "heart_rate_day"])
+    columns = "user_id, bucket, readings, bpm_sum, bpm_sum_sq, bpm_min, bpm_max"
+    for table in ("heart_rate_minute", "heart_rate_hour", "heart_rate_day"):
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+    bucket = truncate_sql(conn, "minute", "recorded_at")
+    conn.exec_driver_sql(
+        f"INSERT INTO heart_rate_minute ({columns}) "
+        f"SELECT user_id, {bucket}, COUNT(heart_rate), SUM(heart_rate), SUM(heart_rate * heart_rate), "
+        f"MIN(heart_rate), MAX(heart_rate) FROM heart_rate_data "
+        f"WHERE heart_rate IS NOT NULL AND user_id IS NOT NULL AND recorded_at IS NOT NULL "
+        f"GROUP BY user_id, {bucket}"
+    )
+    # Horas desde los minutos y días desde las horas
+    for table, source, resolution in (("heart_rate_hour", "heart_rate_minute", "hour"),
+                                      ("heart_rate_day", "heart_rate_hour", "day")):
+        bucket = truncate_sql(conn, resolution, "bucket")
+        conn.exec_driver_sql(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT user_id, {bucket}, SUM(readings), SUM(bpm_sum), SUM(bpm_sum_sq), MIN(bpm_min), MAX(bpm_max) "
+            f"FROM {source} GROUP BY user_id, {bucket}"
+        )
+
+
+def user_daily_stats(conn):
+    """
+    Estadísticas diarias por usuario y tipo de evento para el dashboard, rellenadas
+    desde app_events con SQL propio de esta versión (no dashboard.py)
+    """
+    create_tables(conn, ["user_daily_stats"])
+    day = "date(created_at)" if conn.dialect.name == "sqlite" else "CAST(created_at AS DATE)"
+    conn.exec_driver_sql("DELETE FROM user_daily_stats")
+    conn.exec_driver_sql(
+        "INSERT INTO user_daily_stats (user_id, day, event_type, events, minutes) "
+        f"SELECT user_id, {day}, COALESCE(event_type, ''), COUNT(*), COALESCE(SUM(duration_minutes), 0.0) "
+        "FROM app_events WHERE user_id IS NOT NULL AND created_at IS NOT NULL "
+        f"GROUP BY user_id, {day}, COALESCE(event_type, '')"
+    )
+
+
+def app_events_by_date(conn):
+    """Índice (user_id, created_at) para paginar /profile/events sin filtro de tipo"""
+    create_index(conn, "ix_app_events_user_created", "app_events", ("user_id", "created_at"))
+
+
+# (versión, nombre, función(conn)); añadir siempre al final con la versión siguiente
+MIGRATIONS = [
+    (1, "esquema_base", create_base_schema),
+    (2, "indices_por_usuario", create_per_user_indexes),
+    (3, "ritmo_cardiaco_sin_duplicados", unique_heart_rate_readings),
+    (4, "agregados_ritmo_cardiaco", heart_rate_rollups),
+    (5, "estadisticas_diarias", user_daily_stats),
+    (6, "eventos_por_fecha", app_events_by_date),
+]
+HEAD = MIGRATIONS[-1][0]
+
+
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(schema_version.name):
+            return 0
+        return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade(engine) -> list:
+    """Aplicar las migraciones pendientes, cada una en su transacción; devuelve las aplicadas"""
+    schema_metadata.create_all(bind=engine, checkfirst=True)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version <= current_version(engine):
+            continue
+        try:
+            with engine.begin() as conn:
+                migrate(conn)
+                conn.execute(insert(schema_version).values(version=version, name=name, applied_at=datetime.utcnow()))
+        except IntegrityError:
+            continue  # otro proceso la registró primero
+        logger.info("Migración %s (%s) aplicada", version, name)
+        applied.append(version)
+    return applied
+
+
+def ensure_schema(engine, auto_migrate: bool = None):
+    """Comprobación de arranque: una consulta si el esquema está al día"""
+    auto_migrate = AUTO_MIGRATE if auto_migrate is None else auto_migrate
+    version = current_version(engine)
+    if version >= HEAD:
+        return version
+    if not auto_migrate:
+        raise SchemaOutdated(
+            f"Esquema en la versión {version}, se requiere {HEAD}: ejecuta `python migrations.py` antes de arrancar"
+        )
+    upgrade(engine)
+    return HEAD
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones versionadas del esquema de Milo")
+    parser.add_argument("--status", action="store_true", help="mostrar la versión actual y las pendientes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    from AIAPI.database import engine
+
+    version = current_version(engine)
+    pending = [f"{v} {name}" for v, name, _ in MIGRATIONS if v > version]
+    if args.status:
+        print(f"Versión actual: {version} (última: {HEAD})")
+        for line in pending:
+            print(f"  pendiente: {line}")
+        return
+    applied = upgrade(engine)
+    print(f"✅ Esquema en la versión {HEAD} ({len(applied)} migraciones aplicadas)")
+
+
+if __name__ == "__main__":
+    main()
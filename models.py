@@ -1,8 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Time, Text, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Time, Text, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
-import uuid
 
 Base = declarative_base()
 
@@ -72,6 +71,10 @@ class UserOnboardingSession(Base):
     expires_at = Column(DateTime)
     is_completed = Column(Boolean, default=False)
 
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at < datetime.utcnow()
+
 class UserProfile(Base):
     __tablename__ = "user_profiles"
     
@@ -114,6 +117,25 @@ class HeartRateData(Base):
     # Relación
     user = relationship("User")
 
+class HeartRateRollup:
+    """Agregados de ritmo cardíaco por usuario y cubo (inicio del minuto, hora o día UTC); ver rollups.py"""
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    readings = Column(Integer, nullable=False)
+    bpm_sum = Column(Integer, nullable=False)
+    bpm_sum_sq = Column(Integer, nullable=False)  # para la desviación estándar
+    bpm_min = Column(Integer, nullable=False)
+    bpm_max = Column(Integer, nullable=False)
+
+class HeartRateMinute(HeartRateRollup, Base):
+    __tablename__ = "heart_rate_minute"
+
+class HeartRateHour(HeartRateRollup, Base):
+    __tablename__ = "heart_rate_hour"
+
+class HeartRateDay(HeartRateRollup, Base):
+    __tablename__ = "heart_rate_day"
+
 class AppEvent(Base):
     __tablename__ = "app_events"
     
@@ -133,3 +155,36 @@ class AppEvent(Base):
     user = relationship("User")
 
 
+class UserDailyStats(Base):
+    """Eventos y minutos por usuario, día UTC y tipo de evento; ver dashboard.py"""
+    __tablename__ = "user_daily_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+    minutes = Column(Float, nullable=False, default=0.0)
+
+
+class ContentPoolItem(Base):
+    __tablename__ = "content_pool_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mode = Column(String, index=True, nullable=False)  # silencio_sagrado, mensaje_diario, ritual_diario
+    content = Column(Text, nullable=False)
+    approved = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# Índices de las consultas por usuario y rango de fechas (migración 2 en migrations.py)
+ix_messages_user_timestamp = Index("ix_messages_user_timestamp", Message.user_id, Message.timestamp)
+# Único: deduplica las lecturas de la ingesta por lotes (migración 3) y cubre las consultas por (user_id, recorded_at)
+ux_heart_rate_reading = Index(
+    "ux_heart_rate_reading", HeartRateData.user_id, HeartRateData.recorded_at, HeartRateData.device_type, unique=True
+)
+ix_app_events_user_type_created = Index(
+    "ix_app_events_user_type_created", AppEvent.user_id, AppEvent.event_type, AppEvent.created_at
+)
+# Páginas de /profile/events sin filtro de tipo en orden de created_at (migración 6)
+ix_app_events_user_created = Index("ix_app_events_user_created", AppEvent.user_id, AppEvent.created_at)
+ix_onboarding_expires_at = Index("ix_onboarding_expires_at", UserOnboardingSession.expires_at)
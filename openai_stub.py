@@ -0,0 +1,198 @@
+"""
+Servidor local compatible con la API de OpenAI para pruebas y benchmarks sin red.
+
+Implementa:
+- POST /v1/chat/completions (con y sin stream, incluido stream_options.include_usage)
+- POST /v1/audio/speech (bytes MP3 simulados, proporcionales al texto)
+
+Latencia, tasa de errores y velocidad de tokens son configurables.
+
+Como servidor (apuntar la API con OPENAI_BASE_URL=http://localhost:8001/v1):
+    python openai_stub.py --port 8001 --latency lognormal:0.4,0.5 --error-rate 0.02 --tokens-per-second 40
+
+En proceso (pruebas y load_harness.py):
+    from AIAPI.openai_stub import StubConfig, stub_client
+    llm.set_client(stub_client(StubConfig(latency="fixed:0.05")))
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from openai import AsyncOpenAI
+
+STUB_WORDS = (
+    "Respira despacio y deja que la luz de este instante te sostenga como el agua sostiene "
+    "a la hoja que cae en calma sobre el río del alma"
+).split()
+
+
+def parse_latency(spec: str):
+    """
+    Distribución de latencia (segundos) a partir de un texto:
+    fixed:0.2 | uniform:0.1,0.5 | normal:0.3,0.1 | lognormal:<mediana>,<sigma>
+    """
+    kind, _, raw = spec.partition(":")
+    values = [float(v) for v in raw.split(",") if v] or [0.0]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Distribución de latencia desconocida: {spec}")
+
+
+@dataclass
+class StubConfig:
+    latency: str = os.getenv("STUB_LATENCY", "fixed:0.05")  # hasta el primer token
+    error_rate: float = float(os.getenv("STUB_ERROR_RATE", "0"))
+    error_status: int = int(os.getenv("STUB_ERROR_STATUS", "500"))
+    tokens_per_second: float = float(os.getenv("STUB_TOKENS_PER_SECOND", "0"))  # 0 = instantáneo
+    reply_tokens: int = int(os.getenv("STUB_REPLY_TOKENS", "40"))
+    audio_bytes_per_char: int = int(os.getenv("STUB_AUDIO_BYTES_PER_CHAR", "200"))
+
+
+def reply_words(max_tokens: int, reply_tokens: int) -> list:
+    count = max(1, min(max_tokens or reply_tokens, reply_tokens))
+    return [STUB_WORDS[i % len(STUB_WORDS)] for i in range(count)]
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    return sum(len(str(m.get("content", "")).split()) for m in messages)
+
+
+def create_stub_app(config: StubConfig = None) -> FastAPI:
+    config = config or StubConfig()
+    sample_latency = parse_latency(config.latency)
+    stub = FastAPI(title="OpenAI stub")
+    stub.state.config = config
+    stub.state.requests = 0
+
+    def maybe_error():
+        if config.error_rate and random.random() < config.error_rate:
+            return JSONResponse(
+                {"error": {"message": "Error simulado del stub", "type": "server_error", "code": None}},
+                status_code=config.error_status
+            )
+        return None
+
+    async def token_delay():
+        if config.tokens_per_second > 0:
+            await asyncio.sleep(1 / config.tokens_per_second)
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        stub.state.requests += 1
+        body = await request.json()
+        await asyncio.sleep(sample_latency())
+        error = maybe_error()
+        if error:
+            return error
+        words = reply_words(body.get("max_tokens"), config.reply_tokens)
+        usage = {
+            "prompt_tokens": estimate_prompt_tokens(body.get("messages", [])),
+            "completion_tokens": len(words),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+
+        if not body.get("stream"):
+            if config.tokens_per_second > 0:
+                await asyncio.sleep(len(words) / config.tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        def chunk(delta: dict, finish_reason=None, usage_data=None, choices=True) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+            }
+            if usage_data is not None:
+                payload["usage"] = usage_data
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                if i:
+                    await token_delay()
+                yield chunk({"content": word if i == 0 else f" {word}"})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk({}, usage_data=usage, choices=False)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @stub.post("/v1/audio/speech")
+    async def audio_speech(request: Request):
+        stub.state.requests += 1
+        body = await request.json()
+        await asyncio.sleep(sample_latency())
+        error = maybe_error()
+        if error:
+            return error
+        size = max(1, len(body.get("input", ""))) * config.audio_bytes_per_char
+        # Cabecera ID3 mínima seguida de relleno: suficiente para cachear y servir por rangos
+        data = b"ID3\x04\x00\x00\x00\x00\x00\x00" + bytes(size)
+        return Response(content=data, media_type="audio/mpeg")
+
+    return stub
+
+
+def stub_client(config: StubConfig = None, max_retries: int = 0) -> AsyncOpenAI:
+    """Cliente AsyncOpenAI real que habla con el stub dentro del proceso (sin sockets)"""
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_stub_app(config)))
+    return AsyncOpenAI(api_key="sk-stub", base_url="http://openai-stub/v1",
+                       http_client=http_client, max_retries=max_retries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatible con OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default=StubConfig.latency)
+    parser.add_argument("--error-rate", type=float, default=StubConfig.error_rate)
+    parser.add_argument("--error-status", type=int, default=StubConfig.error_status)
+    parser.add_argument("--tokens-per-second", type=float, default=StubConfig.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=StubConfig.reply_tokens)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = StubConfig(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+                        tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens)
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import os
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import or_
+
+# --- Paginación por cursor (keyset) de los historiales ---
+# Las páginas se piden del más reciente al más antiguo con WHERE (t, id) < cursor
+# ORDER BY t DESC, id DESC LIMIT n+1 sobre los índices (user_id, t): el coste y la
+# memoria por petición dependen del tamaño de página, no del historial. El cursor
+# es opaco para el cliente, que solo sigue el Link rel="next" (o X-Next-Cursor).
+PAGE_SIZE_DEFAULT = int(os.getenv("MILO_PAGE_SIZE", "100"))
+PAGE_SIZE_MAX = int(os.getenv("MILO_PAGE_SIZE_MAX", "500"))
+
+
+class InvalidCursor(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="invalid_cursor")
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Tamaño de página pedido, acotado por el servidor"""
+    return max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: Optional[str]) -> Optional[tuple]:
+    """(timestamp, id) del último elemento de la página anterior, o None para la primera"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor()
+
+
+def keyset_filter(query, time_column, id_column, before: Optional[tuple]):
+    """Filas anteriores al cursor en el orden (time_column DESC, id_column DESC)"""
+    if before is None:
+        return query
+    timestamp, row_id = before
+    # `time_column <= t` primero para que el índice (user_id, t) acote el rango
+    return query.filter(time_column <= timestamp, or_(time_column < timestamp, id_column < row_id))
+
+
+def paginate(rows: list, limit: int, time_attr: str, request: Request, response: Response) -> list:
+    """Recortar a `limit` filas (se piden limit + 1) y anunciar la página siguiente si la hay"""
+    page = rows[:limit]
+    if len(rows) > limit:
+        last = page[-1]
+        cursor = encode_cursor(getattr(last, time_attr), last.id)
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+        response.headers["X-Next-Cursor"] = cursor
+    return page
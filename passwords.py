@@ -0,0 +1,78 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from AIAPI import metrics
+from AIAPI.governor import Overloaded
+
+# --- Hash de contraseñas fuera del event loop ---
+# Un único CryptContext para toda la app. bcrypt libera el GIL mientras calcula,
+# así que un pool de hilos acotado reparte el trabajo entre núcleos sin bloquear
+# el loop. MILO_HASH_WORKERS=0 hashea en línea (solo para comparar en benchmarks).
+HASH_WORKERS = int(os.getenv("MILO_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("MILO_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    with metrics.PASSWORD_HASH_SECONDS.labels(operation="hash").time():
+        return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    with metrics.PASSWORD_HASH_SECONDS.labels(operation="verify").time():
+        return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """Ejecutor acotado para bcrypt: como máximo `workers` en paralelo y `max_pending` en cola"""
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if self.pending >= self.max_pending:
+            metrics.PASSWORD_HASH_REJECTIONS.inc()
+            raise Overloaded(503, "hash_queue_full", 1)
+        self.pending += 1
+        metrics.PASSWORD_HASH_PENDING.set(self.pending)
+        submitted = time.perf_counter()
+
+        def job():
+            metrics.PASSWORD_HASH_WAIT_SECONDS.observe(time.perf_counter() - submitted)
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+        finally:
+            self.pending -= 1
+            metrics.PASSWORD_HASH_PENDING.set(self.pending)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
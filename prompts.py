@@ -1,3 +1,7 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
 PROMPTS = {
     "dialogo_sagrado": """
 Actúa como una guía espiritual simbólica, amorosa y presente. Estás dentro de la sección "Diálogo Sagrado" de la app BeCalm. Responde desde el alma con símbolos y metáforas, sin preguntas ni explicaciones. Canaliza la vibración del usuario.
@@ -23,6 +27,38 @@ Actúa como un guardián del vacío fértil. Estás en la sección "Silencio Sag
 }
 
 
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Parámetros de generación de un modo. tier elige el modelo (ver llm.route_model)"""
+    tier: str = "standard"  # fast | standard
+    max_tokens: int = 250
+    temperature: float = 0.7
+    stop: Optional[Tuple[str, ...]] = None
+    timeout: float = 10.0  # plazo de la llamada completa al upstream, en segundos
+
+
+# --- Perfiles de generación por modo (PROMPTS y los demás usos del LLM) ---
+GENERATION_PROFILES = {
+    "silencio_sagrado": GenerationProfile(tier="fast", max_tokens=40, stop=("\n",), timeout=4.0),
+    "mapa_interior": GenerationProfile(tier="fast", max_tokens=80, stop=("\n\n",), timeout=5.0),
+    "diario_vivo": GenerationProfile(tier="fast", max_tokens=80, timeout=6.0),
+    "mensaje_diario": GenerationProfile(tier="fast", max_tokens=150, timeout=6.0),
+    "ritual_diario": GenerationProfile(tier="fast", max_tokens=200, timeout=6.0),
+    "dialogo_sagrado": GenerationProfile(max_tokens=300, timeout=10.0),
+    "medita_conmigo": GenerationProfile(max_tokens=1500, timeout=45.0),
+    "text": GenerationProfile(max_tokens=250, timeout=10.0),
+    "welcome": GenerationProfile(tier="fast", max_tokens=100, timeout=8.0),
+    "music": GenerationProfile(tier="fast", max_tokens=200, timeout=6.0),
+}
+DEFAULT_PROFILE = GenerationProfile()
+
+
+def get_generation_profile(mode: str) -> GenerationProfile:
+    """Retorna el perfil de generación del modo (o el perfil por defecto)"""
+    return GENERATION_PROFILES.get(mode, DEFAULT_PROFILE)
+
+
 def get_prompt_by_mode(mode: str, user_vars: dict = None, extra: str = None) -> str:
     """
     Retorna el prompt final para el modo dado, formateando con variables del usuario y texto extra.
@@ -43,3 +79,12 @@ def get_prompt_by_mode(mode: str, user_vars: dict = None, extra: str = None) ->
     if extra:
         template += f"\n\nUsuario dice: {extra}"
     return template
+
+
+def get_prompt_version(mode: str) -> str:
+    """
+    Retorna una versión corta del template del modo (hash de su texto).
+    Cambia automáticamente cuando se edita el prompt, invalidando cachés.
+    """
+    template = PROMPTS.get(mode, "")
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,252 @@
+"""
+Límite de peticiones por usuario autenticado con token bucket.
+
+Cada usuario tiene un cubo de RATE_LIMIT_CAPACITY fichas que se rellena a
+RATE_LIMIT_PER_MINUTE fichas por minuto; cada ruta consume según ROUTE_COSTS
+(el streaming y el TTS cuestan más). El estado vive en un archivo compartido
+mapeado en memoria (mmap + flock), así todos los workers de uvicorn/gunicorn del
+despliegue ven el mismo cubo. Por defecto el archivo va junto a la BD SQLite (o en
+el directorio de la app): otro despliegue u otra copia del repo en la misma máquina
+no comparte cubos. Sin fcntl (Windows) se usa un cubo en memoria.
+
+Microbenchmark del coste por petición:
+    python ratelimit.py --iterations 100000
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from fastapi import HTTPException
+from sqlalchemy.engine import make_url
+
+from AIAPI import metrics
+
+
+def default_path() -> str:
+    """<bd>-ratelimit junto a la BD SQLite; si no es SQLite, milo_ratelimit.bin en el directorio de la app"""
+    url = make_url(os.getenv("DATABASE_URL", "sqlite:///./milo.db"))
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return os.path.abspath(url.database) + "-ratelimit"
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "milo_ratelimit.bin")
+
+
+RATE_LIMIT_CAPACITY = float(os.getenv("MILO_RATELIMIT_CAPACITY", "20"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("MILO_RATELIMIT_PER_MINUTE", "10"))
+RATE_LIMIT_BACKEND = os.getenv("MILO_RATELIMIT_BACKEND", "shared" if fcntl else "memory")
+RATE_LIMIT_PATH = os.getenv("MILO_RATELIMIT_PATH") or default_path()
+RATE_LIMIT_SLOTS = int(os.getenv("MILO_RATELIMIT_SLOTS", "65536"))
+
+# Fichas por petición; el streaming suma STREAM_SURCHARGE
+ROUTE_COSTS = {
+    "generate": 1.0,
+    "dialogo": 1.0,
+    "music": 1.0,
+    "audio": 4.0,
+    "meditation_audio": 8.0,
+}
+ROUTE_COSTS.update({k: float(v) for k, v in json.loads(os.getenv("MILO_RATELIMIT_COSTS", "{}")).items()})
+STREAM_SURCHARGE = float(os.getenv("MILO_RATELIMIT_STREAM_SURCHARGE", "1"))
+
+
+class RateLimited(HTTPException):
+    """Cubo del usuario sin fichas suficientes, con Retry-After"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail="Has superado el límite de solicitudes. Intenta de nuevo en unos segundos.",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.retry_after = retry_after
+
+
+def route_cost(route: str, stream: bool = False) -> float:
+    return ROUTE_COSTS.get(route, 1.0) + (STREAM_SURCHARGE if stream else 0.0)
+
+
+def _refill(tokens: float, last: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - last) * rate)
+
+
+class MemoryBuckets:
+    """Cubos en el proceso actual (LRU acotado); no se comparten entre workers"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_SLOTS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # clave -> (fichas, último relleno)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, last, now, capacity, rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, tokens
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SharedBuckets:
+    """
+    Tabla hash de tamaño fijo en un archivo mapeado en memoria, compartida por
+    todos los procesos que abren la misma ruta. Cada slot guarda
+    (hash de la clave, fichas, último relleno); las colisiones se resuelven con
+    sondeo lineal corto y, si todos los slots están ocupados, se reutiliza el
+    que lleva más tiempo sin usarse. Un flock exclusivo serializa cada operación.
+    """
+
+    MAGIC = b"MILORL01"
+    HEADER = struct.Struct("<8sQ")
+    SLOT = struct.Struct("<Qdd")
+    PROBES = 8
+
+    def __init__(self, path: str = RATE_LIMIT_PATH, slots: int = RATE_LIMIT_SLOTS):
+        self.path = path
+        self._lock = threading.Lock()  # flock no excluye hilos del mismo proceso
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.HEADER.size + slots * self.SLOT.size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self.HEADER.size:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, slots), 0)
+            magic, existing = self.HEADER.unpack(os.pread(self._fd, self.HEADER.size, 0))
+            if magic != self.MAGIC:
+                raise ValueError(f"{path} no es un archivo de límites de Milo")
+            # El primer worker fija el número de slots; los demás lo respetan
+            self.slots = existing
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, self.HEADER.size + self.slots * self.SLOT.size)
+
+    def _hash(self, key: str) -> int:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") | 1  # 0 marca un slot vacío
+
+    def take(self, key: str, cost: float, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        h = self._hash(key)
+        base = h % self.slots
+        unpack_from, pack_into, size = self.SLOT.unpack_from, self.SLOT.pack_into, self.SLOT.size
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                target, tokens, last, oldest = None, capacity, now, math.inf
+                for i in range(self.PROBES):
+                    offset = self.HEADER.size + ((base + i) % self.slots) * size
+                    slot_hash, slot_tokens, slot_last = unpack_from(self._map, offset)
+                    if slot_hash == h:
+                        target, tokens, last = offset, slot_tokens, slot_last
+                        break
+                    if slot_hash == 0:
+                        target = offset  # sin borrados: la clave no puede estar más adelante
+                        break
+                    if slot_last < oldest:
+                        target, oldest = offset, slot_last
+                tokens = _refill(tokens, last, now, capacity, rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                pack_into(self._map, target, h, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, tokens
+
+    def reset(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._map[self.HEADER.size:] = bytes(len(self._map) - self.HEADER.size)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class RateLimiter:
+    """Token bucket por usuario sobre un almacén de cubos (compartido o en memoria)"""
+
+    def __init__(self, store=None, capacity: float = RATE_LIMIT_CAPACITY, per_minute: float = RATE_LIMIT_PER_MINUTE):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.enabled = True
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = create_store()
+        return self._store
+
+    def hit(self, user_id, route: str, stream: bool = False):
+        """Consumir las fichas de la ruta o lanzar RateLimited (429) con Retry-After"""
+        if not self.enabled:
+            return
+        cost = route_cost(route, stream)
+        allowed, tokens = self.store.take(f"user:{user_id}", cost, self.capacity, self.rate, time.time())
+        if not allowed:
+            metrics.RATE_LIMIT_REJECTIONS.labels(route=route).inc()
+            missing = min(cost, self.capacity) - tokens
+            raise RateLimited(max(1, math.ceil(missing / self.rate)) if self.rate > 0 else 60)
+
+    def reset(self):
+        self.store.reset()
+
+
+def create_store():
+    if RATE_LIMIT_BACKEND == "shared" and fcntl is not None:
+        return SharedBuckets()
+    return MemoryBuckets()
+
+
+rate_limiter = RateLimiter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark del limitador por usuario")
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), f"milo_ratelimit_bench_{os.getpid()}.bin")
+    stores = [("memory", MemoryBuckets())]
+    if fcntl is not None:
+        stores.append(("shared", SharedBuckets(path)))
+    try:
+        for name, store in stores:
+            limiter = RateLimiter(store, capacity=1e9, per_minute=1e9)
+            start = time.perf_counter()
+            for i in range(args.iterations):
+                limiter.hit(i % args.users, "generate")
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8}{elapsed / args.iterations * 1e6:>8.2f} µs por petición")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from AIAPI import metrics
+from AIAPI.prompts import GENERATION_PROFILES
+
+logger = logging.getLogger(__name__)
+
+# --- Plazos por modo (segundos) para una llamada completa al upstream ---
+# Los modos de chat toman el plazo de su perfil (prompts.GENERATION_PROFILES);
+# aquí solo van los demás usos del upstream y los ajustes por entorno.
+MODE_DEADLINES = {
+    "audio": 30.0,
+}
+DEFAULT_DEADLINE = float(os.getenv("MILO_DEFAULT_DEADLINE", "10"))
+
+# Sobrescribir por entorno: MILO_DEADLINES="silencio_sagrado=3,medita_conmigo=30"
+for _item in os.getenv("MILO_DEADLINES", "").split(","):
+    if "=" in _item:
+        _mode, _seconds = _item.split("=", 1)
+        MODE_DEADLINES[_mode.strip()] = float(_seconds)
+
+# Hedging: si la primera llamada no respondió tras este retraso se lanza una segunda
+# y se usa la que termine antes. 0 lo desactiva.
+HEDGE_DELAY = float(os.getenv("MILO_HEDGE_DELAY", "0"))
+HEDGE_MODES = {m.strip() for m in os.getenv("MILO_HEDGE_MODES", "").split(",") if m.strip()}
+
+BREAKER_WINDOW = int(os.getenv("MILO_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("MILO_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("MILO_BREAKER_ERROR_RATE", "0.5"))
+# Una llamada es lenta si consume esta fracción de su propio plazo (get_deadline):
+# 20 s es normal para medita_conmigo (45 s) y lento para un modo de 5 s.
+BREAKER_SLOW_FRACTION = float(os.getenv("MILO_BREAKER_SLOW_FRACTION", "0.8"))
+BREAKER_SLOW_RATE = float(os.getenv("MILO_BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("MILO_BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class UpstreamUnavailable(Exception):
+    """El upstream no está disponible: circuito abierto, plazo vencido o error"""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+
+def get_deadline(mode: str) -> float:
+    if mode in MODE_DEADLINES:
+        return MODE_DEADLINES[mode]
+    if mode in GENERATION_PROFILES:
+        return GENERATION_PROFILES[mode].timeout
+    return DEFAULT_DEADLINE
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker sobre una ventana de las últimas llamadas. Se abre si la
+    tasa de errores o de llamadas lentas (respecto al plazo de cada una) supera
+    su umbral; tras open_seconds deja pasar una llamada de prueba (half-open).
+    """
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_fraction: float = BREAKER_SLOW_FRACTION,
+                 slow_rate: float = BREAKER_SLOW_RATE, open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_fraction = slow_fraction
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window)  # (ok, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        metrics.CIRCUIT_BREAKER_STATE.labels(breaker=name).set(0)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Indicar si se puede llamar al upstream ahora"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, ok: bool, latency: float, deadline: float):
+        """Registrar una llamada terminada; `deadline` es el plazo con el que se hizo"""
+        slow = latency >= self.slow_fraction * deadline
+        if self._state == HALF_OPEN:
+            self._probe_in_flight = False
+            # Una prueba exitosa cierra aunque sea lenta: la lentitud se mide en la ventana
+            if ok:
+                self._outcomes.clear()
+                self._transition(CLOSED)
+            else:
+                self._trip()
+            return
+        self._outcomes.append((ok, slow))
+        if len(self._outcomes) < self.min_calls:
+            return
+        total = len(self._outcomes)
+        errors = sum(1 for o, _ in self._outcomes if not o)
+        slows = sum(1 for _, s in self._outcomes if s)
+        if errors / total >= self.error_rate or slows / total >= self.slow_rate:
+            self._trip()
+
+    def release_probe(self):
+        """Liberar la llamada de prueba si se canceló sin resultado"""
+        self._probe_in_flight = False
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state != self._state:
+            logger.warning(f"Circuit breaker '{self.name}': {self._state} -> {state}")
+            metrics.CIRCUIT_BREAKER_TRANSITIONS.labels(breaker=self.name, state=state).inc()
+        self._state = state
+        metrics.CIRCUIT_BREAKER_STATE.labels(breaker=self.name).set(_STATE_VALUES[state])
+
+
+upstream_breaker = CircuitBreaker("openai")
+
+
+async def _hedged(fn: Callable[[], Awaitable[Any]], mode: str) -> Any:
+    """Lanzar una segunda llamada si la primera tarda más que HEDGE_DELAY; gana la primera exitosa"""
+    first = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({first}, timeout=HEDGE_DELAY)
+    if done:
+        return first.result()
+    metrics.LLM_HEDGED_CALLS.labels(mode=mode).inc()
+    pending = {first, asyncio.ensure_future(fn())}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_upstream(mode: str, fn: Callable[[], Awaitable[Any]], breaker: CircuitBreaker = None) -> Any:
+    """
+    Ejecuta fn() con el plazo del modo, protegida por el circuit breaker y con
+    hedging opcional. Cualquier fallo se traduce en UpstreamUnavailable.
+    """
+    breaker = breaker or upstream_breaker
+    if not breaker.allow():
+        raise UpstreamUnavailable("circuit_open", breaker.name)
+    deadline = get_deadline(mode)
+    hedge = HEDGE_DELAY > 0 and (not HEDGE_MODES or mode in HEDGE_MODES)
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(_hedged(fn, mode) if hedge else fn(), timeout=deadline)
+    except asyncio.TimeoutError:
+        breaker.record(False, time.perf_counter() - start, deadline)
+        metrics.LLM_DEADLINE_EXCEEDED.labels(mode=mode).inc()
+        raise UpstreamUnavailable("deadline", f"{mode} > {deadline}s")
+    except asyncio.CancelledError:
+        # Cancelación del llamador (p.ej. cliente desconectado): no cuenta contra el upstream
+        breaker.release_probe()
+        raise
+    except Exception as e:
+        breaker.record(False, time.perf_counter() - start, deadline)
+        raise UpstreamUnavailable("error", str(e)) from e
+    breaker.record(True, time.perf_counter() - start, deadline)
+    return result
@@ -0,0 +1,270 @@
+"""
+Agregados de ritmo cardíaco por minuto, hora y día (UTC).
+
+Cada tabla guarda por usuario y cubo: lecturas, suma, suma de cuadrados, mínimo y
+máximo, que se combinan sin volver a leer las lecturas crudas.
+
+- Al guardar lecturas nuevas, add_heart_rate_readings (o add_minute_samples) suma el lote a sus minutos
+  (upsert) y recalcula las horas y días que tocan desde los minutos.
+- Si la ingesta ignoró lecturas repetidas no se sabe cuáles entraron:
+  refresh_heart_rate_rollups recalcula los cubos del rango desde heart_rate_data.
+- rebuild_heart_rate_rollups los reconstruye desde cero:
+
+    python rollups.py --rebuild [--user-id 42]
+
+- heart_rate_window_stats compone la ventana con días completos, horas y minutos
+  de los bordes (a lo sumo ~170 filas leídas, sea cual sea el historial).
+- heart_rate_series lee la resolución más gruesa que da al menos el detalle
+  pedido para un gráfico.
+"""
+import os
+import sys
+import math
+import argparse
+from datetime import datetime, timedelta
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select, union_all
+
+from AIAPI import models
+
+RESOLUTIONS = ("minute", "hour", "day")
+STEPS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+TABLES = {
+    "minute": models.HeartRateMinute.__table__,
+    "hour": models.HeartRateHour.__table__,
+    "day": models.HeartRateDay.__table__,
+}
+# Mismo formato con el que el tipo DateTime de SQLAlchemy guarda en SQLite
+SQLITE_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00.000000",
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+}
+CHART_MAX_POINTS = int(os.getenv("MILO_HR_CHART_POINTS", "500"))
+
+
+def floor_bucket(value: datetime, resolution: str) -> datetime:
+    value = value.replace(second=0, microsecond=0)
+    if resolution in ("hour", "day"):
+        value = value.replace(minute=0)
+    if resolution == "day":
+        value = value.replace(hour=0)
+    return value
+
+
+def ceil_bucket(value: datetime, resolution: str) -> datetime:
+    floored = floor_bucket(value, resolution)
+    return floored if floored == value else floored + STEPS[resolution]
+
+
+def truncate(dialect, column, resolution: str):
+    """Expresión SQL que lleva `column` al inicio de su cubo"""
+    if dialect.name == "sqlite":
+        return func.strftime(SQLITE_BUCKET_FORMATS[resolution], column)
+    return func.date_trunc(resolution, column)
+
+
+def _aggregate_select(dialect, resolution: str, user_id=None, start=None, end=None):
+    """SELECT de los cubos de `resolution`: desde las lecturas crudas o desde el nivel inferior"""
+    if resolution == "minute":
+        source = models.HeartRateData.__table__
+        time_column, value = source.c.recorded_at, source.c.heart_rate
+        columns = [func.count(value), func.sum(value), func.sum(value * value), func.min(value), func.max(value)]
+        conditions = [value.isnot(None)]
+    else:
+        source = TABLES[RESOLUTIONS[RESOLUTIONS.index(resolution) - 1]]
+        time_column = source.c.bucket
+        columns = [func.sum(source.c.readings), func.sum(source.c.bpm_sum), func.sum(source.c.bpm_sum_sq),
+                   func.min(source.c.bpm_min), func.max(source.c.bpm_max)]
+        conditions = []
+    bucket = truncate(dialect, time_column, resolution)
+    if user_id is not None:
+        conditions.append(source.c.user_id == user_id)
+    if start is not None:
+        conditions += [time_column >= start, time_column < end]
+    return select(source.c.user_id, bucket, *columns).where(*conditions).group_by(source.c.user_id, bucket)
+
+
+def _replace_buckets(db, resolution: str, user_id=None, start=None, end=None):
+    table = TABLES[resolution]
+    conditions = []
+    if user_id is not None:
+        conditions.append(table.c.user_id == user_id)
+    if start is not None:
+        conditions += [table.c.bucket >= start, table.c.bucket < end]
+    db.execute(delete(table).where(*conditions))
+    source = _aggregate_select(db.get_bind().dialect, resolution, user_id, start, end)
+    db.execute(insert(table).from_select(
+        ["user_id", "bucket", "readings", "bpm_sum", "bpm_sum_sq", "bpm_min", "bpm_max"], source
+    ))
+
+
+def refresh_heart_rate_rollups(db, user_id: int, first: datetime, last: datetime, resolutions=RESOLUTIONS):
+    """Recalcular los cubos de las lecturas entre first y last (inclusive); sin commit"""
+    for resolution in resolutions:
+        _replace_buckets(db, resolution, user_id,
+                         floor_bucket(first, resolution), floor_bucket(last, resolution) + STEPS[resolution])
+
+
+def add_heart_rate_readings(db, user_id: int, readings: list):
+    """Sumar lecturas recién insertadas (dicts con recorded_at y heart_rate) a los agregados; sin commit"""
+    add_minute_samples(db, user_id, ((r["recorded_at"].replace(second=0, microsecond=0), r["heart_rate"])
+                                     for r in readings))
+
+
+def add_minute_samples(db, user_id: int, samples):
+    """
+    Sumar pares (minuto, bpm) recién insertados a los agregados; sin commit.
+    El minuto es un datetime truncado o su texto "AAAA-MM-DD HH:MM" (así la ingesta
+    en SQLite agrupa sin crear un datetime por lectura).
+    """
+    minutes = {}
+    for bucket, value in samples:
+        agg = minutes.get(bucket)
+        if agg is None:
+            minutes[bucket] = [1, value, value * value, value, value]
+        else:
+            agg[0] += 1
+            agg[1] += value
+            agg[2] += value * value
+            if value < agg[3]:
+                agg[3] = value
+            elif value > agg[4]:
+                agg[4] = value
+    if not minutes:
+        return
+    minutes = {bucket if isinstance(bucket, datetime) else datetime.fromisoformat(bucket): agg
+               for bucket, agg in minutes.items()}
+    table = TABLES["minute"]
+    dialect = db.get_bind().dialect
+    if dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+        least, greatest = func.min, func.max
+    else:
+        from sqlalchemy.dialects.postgresql import insert as upsert
+        least, greatest = func.least, func.greatest
+    stmt = upsert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.bucket],
+        set_={
+            "readings": table.c.readings + stmt.excluded.readings,
+            "bpm_sum": table.c.bpm_sum + stmt.excluded.bpm_sum,
+            "bpm_sum_sq": table.c.bpm_sum_sq + stmt.excluded.bpm_sum_sq,
+            "bpm_min": least(table.c.bpm_min, stmt.excluded.bpm_min),
+            "bpm_max": greatest(table.c.bpm_max, stmt.excluded.bpm_max),
+        },
+    )
+    db.execute(stmt, [
+        {"user_id": user_id, "bucket": bucket, "readings": n, "bpm_sum": total, "bpm_sum_sq": total_sq,
+         "bpm_min": low, "bpm_max": high}
+        for bucket, (n, total, total_sq, low, high) in minutes.items()
+    ])
+    refresh_heart_rate_rollups(db, user_id, min(minutes), max(minutes), resolutions=("hour", "day"))
+
+
+def rebuild_heart_rate_rollups(db, user_id: int = None):
+    """Reconstruir los agregados desde heart_rate_data (todos los usuarios o uno)"""
+    for resolution in RESOLUTIONS:
+        _replace_buckets(db, resolution, user_id)
+    db.commit()
+
+
+def window_spans(start: datetime, end: datetime) -> list:
+    """Dividir [start, end) en tramos (resolución, desde, hasta) alineados, con los días completos en el centro"""
+    start, end = floor_bucket(start, "minute"), ceil_bucket(end, "minute")
+    first_hour = ceil_bucket(start, "hour")
+    if first_hour >= end:
+        return [("minute", start, end)]
+    last_hour = floor_bucket(end, "hour")
+    first_day, last_day = ceil_bucket(first_hour, "day"), floor_bucket(last_hour, "day")
+    if first_day < last_day:
+        middle = [("hour", first_hour, first_day), ("day", first_day, last_day), ("hour", last_day, last_hour)]
+    else:
+        middle = [("hour", first_hour, last_hour)]
+    spans = [("minute", start, first_hour)] + middle + [("minute", last_hour, end)]
+    return [span for span in spans if span[1] < span[2]]
+
+
+def heart_rate_window_stats(db, user_id: int, start: datetime, end: datetime):
+    """Lecturas, media, desviación, mínimo y máximo entre start y end (precisión de minuto) en una consulta"""
+    parts = []
+    for resolution, span_start, span_end in window_spans(start, end):
+        table = TABLES[resolution]
+        parts.append(select(
+            func.sum(table.c.readings), func.sum(table.c.bpm_sum), func.sum(table.c.bpm_sum_sq),
+            func.min(table.c.bpm_min), func.max(table.c.bpm_max),
+        ).where(table.c.user_id == user_id, table.c.bucket >= span_start, table.c.bucket < span_end))
+    count = total = total_sq = 0
+    low = high = None
+    for readings, bpm_sum, bpm_sum_sq, bpm_min, bpm_max in db.execute(union_all(*parts)):
+        if not readings:
+            continue
+        count, total, total_sq = count + readings, total + bpm_sum, total_sq + bpm_sum_sq
+        low = bpm_min if low is None else min(low, bpm_min)
+        high = bpm_max if high is None else max(high, bpm_max)
+    if not count:
+        return None
+    average = total / count
+    return {
+        "readings": count,
+        "average": average,
+        "stddev": math.sqrt(max(total_sq / count - average * average, 0.0)),
+        "min": low,
+        "max": high,
+    }
+
+
+def chart_resolution(start: datetime, end: datetime, max_points: int = CHART_MAX_POINTS) -> str:
+    """La resolución más fina que no supera max_points cubos en la ventana (si no, la más gruesa)"""
+    for resolution in RESOLUTIONS:
+        if (end - start) / STEPS[resolution] <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def heart_rate_series(db, user_id: int, start: datetime, end: datetime, resolution: str = None) -> dict:
+    resolution = resolution or chart_resolution(start, end)
+    table = TABLES[resolution]
+    rows = db.execute(
+        select(table).where(
+            table.c.user_id == user_id,
+            table.c.bucket >= floor_bucket(start, resolution),
+            table.c.bucket < end,
+        ).order_by(table.c.bucket)
+    )
+    return {
+        "resolution": resolution,
+        "points": [
+            {"bucket": row.bucket, "readings": row.readings, "average": round(row.bpm_sum / row.readings, 1),
+             "min": row.bpm_min, "max": row.bpm_max}
+            for row in rows
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados de ritmo cardíaco por minuto, hora y día")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruir desde heart_rate_data")
+    parser.add_argument("--user-id", type=int, default=None, help="solo este usuario")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    from AIAPI.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rebuild_heart_rate_rollups(db, args.user_id)
+        counts = {resolution: db.execute(select(func.count()).select_from(TABLES[resolution])).scalar()
+                  for resolution in RESOLUTIONS}
+    finally:
+        db.close()
+    print("✅ Agregados reconstruidos: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
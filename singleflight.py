@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from AIAPI import metrics
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas concurrentes idénticas: mientras una generación
+    con la misma clave está en curso, las demás esperan el mismo resultado en
+    lugar de lanzar otra llamada al upstream.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Indicar si hay una llamada en curso para la clave"""
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta fn() una sola vez por clave en curso y comparte su resultado
+        (o su excepción) con todos los llamadores concurrentes.
+        """
+        # shield: si un cliente se desconecta, la llamada compartida sigue para los demás
+        return await asyncio.shield(self.start(key, fn))
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Lanza fn() en segundo plano si no hay una llamada en curso para la clave
+        (o reutiliza la existente) y retorna su tarea sin esperarla.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            metrics.SINGLEFLIGHT_CALLS.labels(flight=self.name, result="leader").inc()
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+            metrics.SINGLEFLIGHT_CALLS.labels(flight=self.name, result="coalesced").inc()
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # evitar "exception was never retrieved" si nadie esperaba ya
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
@@ -0,0 +1,134 @@
+"""
+Benchmark de concurrencia de SQLite: configuración por defecto frente al perfil
+de producción de sqlite_profile.py.
+
+Varios hilos (como el threadpool de FastAPI o varios workers) mezclan lecturas
+del historial y escrituras de mensajes sobre el mismo archivo:
+
+- "por defecto": journal rollback, synchronous=FULL, un solo pool para todo.
+- "producción": WAL, synchronous=NORMAL, caché/mmap, un escritor y pool de lectura.
+
+Reporta operaciones por segundo, p50/p95 de lecturas y escrituras y cuántas
+operaciones fallaron con "database is locked".
+
+Uso:
+    python sqlite_load_test.py --threads 1 8 32 --seconds 5 --write-ratio 0.2
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "sk-sqlite-load-test")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'milo_sqlite_load_app.db')}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import AIAPI.crud as crud
+from AIAPI import models
+from AIAPI.load_harness import percentile
+from AIAPI.sqlite_profile import RoutingSession, create_engines
+
+
+def default_profile(url: str):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine), [engine]
+
+
+def production_profile(url: str):
+    writer, reader = create_engines(create_engine, url, connect_args={"check_same_thread": False})
+    return sessionmaker(class_=RoutingSession, writer=writer, reader=reader, autocommit=False, autoflush=False), [writer, reader]
+
+
+def prepare(session_factory, engines, users: int) -> list:
+    models.Base.metadata.create_all(bind=engines[0])
+    db = session_factory()
+    try:
+        ids = []
+        for n in range(users):
+            user = crud.create_user(db, f"sqliteload-{n}", "SQLite Load", "x", hashed_password="-")
+            for i in range(20):
+                crud.create_message(db, user.id, "user", f"Mensaje previo {i}")
+            ids.append(user.id)
+        return ids
+    finally:
+        db.close()
+
+
+def run_level(session_factory, user_ids: list, threads: int, seconds: float, write_ratio: float) -> dict:
+    reads, writes, locked = [], [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            user_id = rng.choice(user_ids)
+            is_write = rng.random() < write_ratio
+            start = time.perf_counter()
+            db = session_factory()
+            try:
+                if is_write:
+                    crud.create_message(db, user_id, "user", "Me siento inquieto")
+                else:
+                    crud.get_messages(db, user_id, 20)
+            except OperationalError:
+                with lock:
+                    locked[0] += 1
+                continue
+            finally:
+                db.close()
+            with lock:
+                (writes if is_write else reads).append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "ops": (len(reads) + len(writes)) / elapsed,
+        "read_p50_ms": percentile(reads, 50) * 1000,
+        "read_p95_ms": percentile(reads, 95) * 1000,
+        "write_p50_ms": percentile(writes, 50) * 1000,
+        "write_p95_ms": percentile(writes, 95) * 1000,
+        "locked": locked[0],
+    }
+
+
+def main(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    for label, profile in (("por defecto (antes)", default_profile), ("producción (después)", production_profile)):
+        path = os.path.join(tempfile.gettempdir(), f"milo_sqlite_load_{profile.__name__}.db")
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        session_factory, engines = profile(f"sqlite:///{path}")
+        user_ids = prepare(session_factory, engines, args.users)
+        print(f"\n== SQLite {label}, {args.write_ratio:.0%} escrituras ==")
+        for threads in args.threads:
+            r = run_level(session_factory, user_ids, threads, args.seconds, args.write_ratio)
+            print(f"  hilos={threads:>3}  ops/s={r['ops']:>7.0f}  "
+                  f"lectura p50/p95={r['read_p50_ms']:.1f}/{r['read_p95_ms']:.1f}ms  "
+                  f"escritura p50/p95={r['write_p50_ms']:.1f}/{r['write_p95_ms']:.1f}ms  bloqueos={r['locked']}")
+        for engine in engines:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrencia SQLite: configuración por defecto vs perfil de producción")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=5.0, help="duración de cada nivel")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="fracción de operaciones que escriben")
+    parser.add_argument("--users", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,99 @@
+import os
+
+from sqlalchemy import Delete, Insert, Update, event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+# --- Perfil de producción para SQLite ---
+# WAL permite leer mientras se escribe; synchronous=NORMAL es seguro con WAL
+# (solo se puede perder la última transacción ante un corte de luz, nunca
+# corromper). Las escrituras van por una única conexión (SQLite solo admite un
+# escritor: así esperan en la cola del pool en lugar de reintentar con
+# busy_timeout) y las lecturas por un pool aparte.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("MILO_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_KB = int(os.getenv("MILO_SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("MILO_SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_READ_POOL_SIZE = int(os.getenv("MILO_SQLITE_READ_POOL", "8"))
+
+SQLITE_PRAGMAS = {
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,  # primero: el cambio a WAL necesita un lock exclusivo
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -SQLITE_CACHE_KB,  # negativo = KiB
+    "mmap_size": SQLITE_MMAP_BYTES,
+    "temp_store": "MEMORY",
+}
+# Las conexiones de lectura rechazan cualquier escritura: un enrutado incorrecto
+# falla en lugar de competir en silencio con el escritor
+READER_PRAGMAS = {**SQLITE_PRAGMAS, "query_only": 1}
+
+READ_STATEMENTS = ("select", "with", "pragma", "explain")
+
+
+def is_sqlite_file(url: str) -> bool:
+    """URL de SQLite en archivo (WAL y los pools separados no aplican a :memory:)"""
+    scheme, _, rest = url.partition("://")
+    path = rest[1:] if rest.startswith("/") else rest
+    return scheme.startswith("sqlite") and path not in ("", ":memory:") and "mode=memory" not in path
+
+
+def apply_pragmas(engine, pragmas: dict = None):
+    """Fijar los PRAGMA en cada conexión nueva del engine (también con aiosqlite vía sync_engine)"""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_engines(create, url: str, **kwargs):
+    """
+    Engine escritor (una sola conexión) y engine lector (pool) sobre el mismo archivo.
+    `create` es create_engine o create_async_engine.
+    """
+    writer = create(url, pool_size=1, max_overflow=0, pool_timeout=30, **kwargs)
+    reader = create(url, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=SQLITE_READ_POOL_SIZE, pool_timeout=30, **kwargs)
+    apply_pragmas(getattr(writer, "sync_engine", writer), SQLITE_PRAGMAS)
+    apply_pragmas(getattr(reader, "sync_engine", reader), READER_PRAGMAS)
+    return writer, reader
+
+
+class RoutingSession(Session):
+    """
+    Session que manda INSERT/UPDATE/DELETE y los flush al engine escritor y las
+    lecturas al lector. Una vez que la transacción escribió, también lee del
+    escritor para ver sus propios cambios hasta el commit.
+    """
+
+    def __init__(self, writer=None, reader=None, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+        self.reader = reader or writer
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.writer is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.wrote or self._flushing or self._is_write(clause):
+            self.wrote = True
+            return self.writer
+        return self.reader
+
+    @staticmethod
+    def _is_write(clause) -> bool:
+        if isinstance(clause, (Insert, Update, Delete)):
+            return True
+        if isinstance(clause, TextClause):
+            return not clause.text.lstrip().lower().startswith(READ_STATEMENTS)
+        return False
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.wrote = False
@@ -57,5 +57,8 @@ echo "📝 Logs se mostrarán a continuación"
 echo "🛑 Presiona Ctrl+C para detener"
 echo "----------------------------------------"
 
+# Aplicar migraciones pendientes del esquema (no borra datos)
+python migrations.py
+
 # Ejecutar el servidor
 python main_production.py
@@ -79,5 +79,8 @@ Write-Host "📝 Logs se mostrarán a continuación" -ForegroundColor White
 Write-Host "🛑 Presiona Ctrl+C para detener" -ForegroundColor White
 Write-Host "----------------------------------------" -ForegroundColor Gray
 
+# Aplicar migraciones pendientes del esquema (no borra datos)
+python migrations.py
+
 # Ejecutar el servidor
 python main_production.py
@@ -0,0 +1,92 @@
+import os
+import time
+import httpx
+import pytest
+from types import SimpleNamespace
+from AIAPI import audio_cache, llm
+from AIAPI.audio_cache import AudioCache, RangeNotSatisfiable, make_audio_key, parse_range, synthesize
+from main import app
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+    monkeypatch.setattr(audio_cache, "_audio_cache", cache)
+    return cache
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_key_depends_on_text_voice_and_model():
+    assert make_audio_key("Respira", "alloy") == make_audio_key(" Respira ", "alloy")
+    assert make_audio_key("Respira", "alloy") != make_audio_key("Respira", "nova")
+    assert make_audio_key("Respira", "alloy", "tts-1") != make_audio_key("Respira", "alloy", "tts-1-hd")
+
+
+def test_eviction_removes_least_recently_used(cache):
+    old = make_audio_key("uno")
+    recent = make_audio_key("dos")
+    cache.put(old, b"a" * 400)
+    cache.put(recent, b"b" * 400)
+    past = time.time() - 60
+    os.utime(cache.path(old), (past, past))
+    os.utime(cache.path(recent), (past + 1, past + 1))
+    cache.get(old)  # el acceso lo vuelve reciente
+    cache.put(make_audio_key("tres"), b"c" * 400)
+    assert cache.get(old) is not None
+    assert cache.get(recent) is None
+    assert cache.stats()["bytes"] <= 1000
+
+
+@pytest.mark.asyncio
+async def test_synthesize_only_calls_tts_once(cache):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(content=b"ID3audio")
+
+    llm.set_client(SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(create=create))))
+    try:
+        key, hit = await synthesize("Inhala profundo", "alloy")
+        assert not hit
+        assert await synthesize("Inhala profundo", "alloy") == (key, True)
+        assert len(calls) == 1
+    finally:
+        llm.set_client(None)
+
+
+@pytest.mark.asyncio
+async def test_audio_endpoint_supports_etag_and_range(cache):
+    key = make_audio_key("Exhala")
+    cache.put(key, bytes(range(100)))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        full = await ac.get(f"/v1/audio/{key}")
+        assert full.status_code == 200
+        assert full.headers["content-type"] == "audio/mpeg"
+        assert full.content == bytes(range(100))
+        etag = full.headers["etag"]
+
+        partial = await ac.get(f"/v1/audio/{key}", headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206
+        assert partial.headers["content-range"] == "bytes 10-19/100"
+        assert partial.content == bytes(range(10, 20))
+
+        unchanged = await ac.get(f"/v1/audio/{key}", headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304
+
+        outside = await ac.get(f"/v1/audio/{key}", headers={"Range": "bytes=200-"})
+        assert outside.status_code == 416
+
+        missing = await ac.get(f"/v1/audio/{make_audio_key('otro')}")
+        assert missing.status_code == 404
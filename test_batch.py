@@ -0,0 +1,104 @@
+import json
+from types import SimpleNamespace
+import pytest
+from AIAPI import batch, crud
+from AIAPI.database import SessionLocal
+from AIAPI.resilience import UpstreamUnavailable
+
+
+def batch_args(tmp_path, retries: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(
+        checkpoint=str(tmp_path / "jobs.ckpt"), output=str(tmp_path / "results.jsonl"),
+        retries=retries, backoff=0.0, concurrency=2, model=None, report_every=60.0,
+    )
+
+
+def text_jobs(count: int) -> list:
+    return [{"id": f"j{i}", "mode": "text", "prompt": f"consejo {i}"} for i in range(count)]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """llm.chat simulado: `failures` fallos por prompt antes de responder"""
+    state = SimpleNamespace(calls=[], failures={})
+
+    async def chat(messages, **kwargs):
+        prompt = messages[-1]["content"]
+        state.calls.append(prompt)
+        if state.failures.get(prompt, 0) > 0:
+            state.failures[prompt] -= 1
+            raise UpstreamUnavailable("error", "simulado")
+        return f"respuesta a {prompt[:20]}"
+
+    monkeypatch.setattr(batch.llm, "chat", chat)
+    return state
+
+
+def read_checkpoint(args) -> list:
+    with open(args.checkpoint, encoding="utf-8") as f:
+        return f.read().split()
+
+
+@pytest.mark.asyncio
+async def test_skips_ids_already_in_the_checkpoint(tmp_path, upstream):
+    args = batch_args(tmp_path)
+    with open(args.checkpoint, "w", encoding="utf-8") as f:
+        f.write("j0\nj2\n")
+    summary = await batch.run_batch(text_jobs(4), args)
+    assert summary["skipped_from_checkpoint"] == 2
+    assert sorted(upstream.calls) == ["consejo 1", "consejo 3"]
+    assert sorted(read_checkpoint(args)) == ["j0", "j1", "j2", "j3"]
+
+
+@pytest.mark.asyncio
+async def test_retries_a_raised_error(tmp_path, upstream):
+    upstream.failures["consejo 0"] = 2
+    summary = await batch.run_batch(text_jobs(1), batch_args(tmp_path, retries=2))
+    assert summary["ok"] == 1 and summary["failed"] == 0
+    assert upstream.calls == ["consejo 0"] * 3
+
+
+@pytest.mark.asyncio
+async def test_resume_runs_only_the_failed_jobs(tmp_path, upstream):
+    args = batch_args(tmp_path)
+    upstream.failures["consejo 1"] = 1
+    first = await batch.run_batch(text_jobs(3), args)
+    assert first["failed"] == 1
+    # Los fallidos no entran en el checkpoint: la segunda pasada solo los repite a ellos
+    assert sorted(read_checkpoint(args)) == ["j0", "j2"]
+    upstream.calls.clear()
+    second = await batch.run_batch(text_jobs(3), args)
+    assert second["skipped_from_checkpoint"] == 2 and second["ok"] == 1
+    assert upstream.calls == ["consejo 1"]
+    with open(args.output, encoding="utf-8") as f:
+        statuses = [json.loads(line)["status"] for line in f]
+    assert statuses.count("failed") == 1 and statuses.count("ok") == 3
+
+
+@pytest.mark.asyncio
+async def test_welcome_upstream_failure_is_retried_and_not_stored(tmp_path, monkeypatch):
+    db = SessionLocal()
+    try:
+        session_id = crud.create_onboarding_session(db).session_id
+        crud.update_onboarding_session(db, session_id, full_name="Lote")
+    finally:
+        db.close()
+
+    attempts = []
+
+    async def chat(messages, **kwargs):
+        attempts.append(kwargs.get("mode"))
+        raise UpstreamUnavailable("circuit_open", "openai")
+
+    monkeypatch.setattr(batch.llm, "chat", chat)
+    job = {"id": f"welcome-{session_id}", "target": "welcome", "session_id": session_id}
+    summary = await batch.run_batch([job], batch_args(tmp_path, retries=1))
+    assert summary["failed"] == 1
+    assert attempts == ["welcome", "welcome"]
+
+    db = SessionLocal()
+    try:
+        assert crud.get_onboarding_session(db, session_id).welcome_message is None
+    finally:
+        db.close()
+    assert read_checkpoint(batch_args(tmp_path)) == []
@@ -0,0 +1,79 @@
+import time
+import threading
+import pytest
+from AIAPI.cache import MemoryCacheBackend, SQLiteCacheBackend, ResponseCache, make_cache_key
+
+
+def test_memory_backend_lru_eviction():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", "1", ttl=60)
+    backend.set("b", "2", ttl=60)
+    assert backend.get("a") == "1"  # "a" pasa a ser el más reciente
+    backend.set("c", "3", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    assert backend.get("c") == "3"
+
+
+def test_memory_backend_ttl_expiry():
+    backend = MemoryCacheBackend(max_entries=10)
+    backend.set("a", "1", ttl=0)
+    time.sleep(0.01)
+    assert backend.get("a") is None
+
+
+def test_sqlite_backend_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    worker_1 = SQLiteCacheBackend(path, max_entries=2)
+    worker_2 = SQLiteCacheBackend(path, max_entries=2)
+    worker_1.set("a", "1", ttl=60)
+    assert worker_2.get("a") == "1"
+    worker_2.set("b", "2", ttl=60)
+    worker_2.set("c", "3", ttl=60)
+    assert len(worker_1) == 2
+
+
+def test_cache_key_normalizes_prompt_and_includes_model():
+    assert make_cache_key("silencio_sagrado", "  Hola   Mundo", "m1") == make_cache_key("silencio_sagrado", "hola mundo", "m1")
+    assert make_cache_key("silencio_sagrado", "hola", "m1") != make_cache_key("silencio_sagrado", "hola", "m2")
+    assert make_cache_key("silencio_sagrado", "hola", "m1") != make_cache_key("ritual_diario", "hola", "m1")
+
+
+@pytest.mark.asyncio
+async def test_response_cache_counts_hits_and_skips_uncacheable_modes():
+    cache = ResponseCache(MemoryCacheBackend(10), ttls={"silencio_sagrado": 60})
+    assert await cache.get("silencio_sagrado", "p", "m") is None
+    await cache.set("silencio_sagrado", "p", "m", "quietud")
+    await cache.set("dialogo_sagrado", "p", "m", "no se guarda")
+    assert await cache.get("silencio_sagrado", "p", "m") == "quietud"
+    assert await cache.get("dialogo_sagrado", "p", "m") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_sqlite_backend_evicts_on_a_schedule(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=4, evict_every=3)
+    for key in "abcde":
+        backend.set(key, key, ttl=60)
+    assert len(backend) == 5  # la expulsión aún no tocaba
+    backend.set("f", "f", ttl=60)
+    assert len(backend) == 4
+    assert backend.get("a") is None and backend.get("f") == "f"
+
+
+@pytest.mark.asyncio
+async def test_response_cache_runs_sqlite_calls_off_the_event_loop(tmp_path, monkeypatch):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=10)
+    loop_thread = threading.get_ident()
+    threads = []
+    original_get = backend.get
+
+    def get(key):
+        threads.append(threading.get_ident())
+        return original_get(key)
+
+    monkeypatch.setattr(backend, "get", get)
+    cache = ResponseCache(backend, ttls={"silencio_sagrado": 60})
+    await cache.set("silencio_sagrado", "p", "m", "quietud")
+    assert await cache.get("silencio_sagrado", "p", "m") == "quietud"
+    assert threads and loop_thread not in threads
@@ -0,0 +1,69 @@
+import pytest
+from datetime import datetime, timedelta
+from AIAPI.content_pool import ContentPool, approve
+
+MODES = {"silencio_sagrado": {"capacity": 4, "low_watermark": 2, "max_words": 15}}
+
+
+def test_serve_never_repeats_for_same_user():
+    pool = ContentPool(MODES)
+    now = datetime.utcnow()
+    for item_id in range(3):
+        pool.add("silencio_sagrado", item_id, f"línea {item_id}", now)
+
+    served = {pool.serve("silencio_sagrado", user_id=1) for _ in range(3)}
+    assert served == {"línea 0", "línea 1", "línea 2"}
+    assert pool.serve("silencio_sagrado", user_id=1) is None
+    # Otro usuario sigue recibiendo contenido
+    assert pool.serve("silencio_sagrado", user_id=2) is not None
+
+
+def test_retire_expired_and_refill_target():
+    pool = ContentPool(MODES)
+    old = datetime.utcnow() - timedelta(days=2)
+    pool.add("silencio_sagrado", 1, "antigua", old)
+    pool.add("silencio_sagrado", 2, "nueva", datetime.utcnow())
+    pool.retire_expired()
+    assert pool.size("silencio_sagrado") == 1
+
+    peak = datetime(2026, 1, 1, 12)
+    offpeak = datetime(2026, 1, 1, 3)
+    assert pool.refill_target("silencio_sagrado", offpeak) == 3
+    assert pool.refill_target("silencio_sagrado", peak) == 1
+
+
+def test_approve_enforces_word_limit():
+    assert approve('"Respira en el umbral."', max_words=15) == "Respira en el umbral."
+    assert approve("palabra " * 16, max_words=15) is None
+    assert approve("   ") is None
+
+
+@pytest.mark.asyncio
+async def test_refill_counts_and_dedupes_against_the_shared_table(monkeypatch):
+    from AIAPI import content_pool, crud
+    from AIAPI.database import SessionLocal
+
+    mode = "pool_compartido"
+    db = SessionLocal()
+    try:
+        # Lo que ya generó otro worker
+        crud.create_content_pool_items(db, mode, ["texto 0", "texto 1"])
+    finally:
+        db.close()
+
+    replies = iter(["texto 1", "texto 2", "texto 3", "texto 4"])
+
+    async def fake_chat(messages, **kwargs):
+        return next(replies)
+
+    monkeypatch.setattr(content_pool, "is_offpeak", lambda now=None: True)
+    monkeypatch.setattr(content_pool, "get_prompt_by_mode", lambda mode: "prompt")
+    monkeypatch.setattr(content_pool.llm, "chat", fake_chat)
+    pool = ContentPool({mode: {"capacity": 4, "low_watermark": 1, "max_words": 15}})
+
+    # Faltan 2 según la BD (no 4 según este proceso) y "texto 1" ya estaba guardado
+    assert await pool.refill(mode) == 1
+    assert pool.size(mode) == 3
+    assert await pool.refill(mode) == 1
+    assert pool.size(mode) == 4
+    assert await pool.refill(mode) == 0
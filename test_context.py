@@ -0,0 +1,55 @@
+import pytest
+from AIAPI import crud, models
+from AIAPI.database import SessionLocal
+from AIAPI.context import ContextBuilder, estimate_tokens
+
+USER_ID = 910001
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    session.query(models.Message).filter(models.Message.user_id == USER_ID).delete()
+    session.commit()
+    yield session
+    session.query(models.Message).filter(models.Message.user_id == USER_ID).delete()
+    session.commit()
+    session.close()
+
+
+def test_history_fits_budget_and_keeps_most_recent_turns(db):
+    for i in range(10):
+        crud.create_message(db, USER_ID, "user", f"pregunta {i} " + "x" * 80)
+        crud.create_message(db, USER_ID, "ai", f"respuesta {i} " + "y" * 80)
+    current = crud.create_message(db, USER_ID, "user", "¿y ahora?")
+
+    builder = ContextBuilder(budgets={"dialogo_sagrado": 150})
+    messages = builder.build_messages(db, USER_ID, "dialogo_sagrado", "Eres Milo.", "¿y ahora?", exclude_id=current.id)
+
+    assert messages[0] == {"role": "system", "content": "Eres Milo."}
+    assert messages[-1] == {"role": "user", "content": "¿y ahora?"}
+    history = messages[1:-1]
+    assert 0 < len(history) < 20
+    assert history[-1]["role"] == "assistant" and history[-1]["content"].startswith("respuesta 9")
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 150
+
+
+def test_window_is_cached_and_only_reads_new_messages(db, monkeypatch):
+    crud.create_message(db, USER_ID, "user", "hola")
+    crud.create_message(db, USER_ID, "ai", "bienvenida")
+    builder = ContextBuilder(budgets={"dialogo_sagrado": 1000})
+    builder.window(db, USER_ID)
+
+    def full_read(*args, **kwargs):
+        raise AssertionError("no debe releer todo el historial")
+
+    monkeypatch.setattr(crud, "get_messages", full_read)
+    crud.create_message(db, USER_ID, "user", "otra pregunta")
+    turns = [turn[2] for turn in builder.window(db, USER_ID).turns]
+    assert turns == ["hola", "bienvenida", "otra pregunta"]
+
+
+def test_modes_without_budget_skip_history():
+    builder = ContextBuilder(budgets={"dialogo_sagrado": 1000})
+    assert builder.uses_history("dialogo_sagrado")
+    assert not builder.uses_history("silencio_sagrado")
@@ -0,0 +1,38 @@
+import uuid
+import pytest
+from sqlalchemy import text
+import AIAPI.crud_async as crud_async
+from AIAPI.database import AsyncDatabase, AsyncSessionLocal, dispose_async_engine, to_async_url
+
+
+def test_async_url_uses_async_drivers():
+    assert to_async_url("sqlite:///./milo.db") == "sqlite+aiosqlite:///./milo.db"
+    assert to_async_url("postgresql://u:p@db/milo") == "postgresql+asyncpg://u:p@db/milo"
+
+
+@pytest.mark.asyncio
+async def test_async_crud_round_trip_releases_the_connection():
+    username = f"async-{uuid.uuid4().hex[:8]}"
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await crud_async.create_user(db, username, "Async", "x", hashed_password="-")
+            await crud_async.create_message(db, user.id, "user", "Hola")
+            await crud_async.create_message(db, user.id, "ai", "Respira.")
+            messages = await crud_async.get_messages(db, user.id, 1)
+            # Lecturas sin transacción abierta: la conexión vuelve al pool durante la espera al upstream
+            assert not db.in_transaction()
+            assert [m.content for m in messages] == ["Respira.", "Hola"]
+            assert (await crud_async.get_user(db, username)).id == user.id
+    finally:
+        await dispose_async_engine()
+
+
+@pytest.mark.asyncio
+async def test_async_database_is_lazy_and_disposable(tmp_path):
+    database = AsyncDatabase(f"sqlite:///{tmp_path / 'async.db'}", echo=False)
+    assert database._engine is None
+    async with database.session() as db:
+        assert (await db.execute(text("SELECT 1"))).scalar() == 1
+    assert not database.engine().echo
+    await database.dispose()
+    assert database._engine is None and database._sessionmaker is None
@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+import httpx
+from main import app
+from AIAPI import crud, crud_profile, dashboard, metrics
+from AIAPI.dashboard import DashboardCache
+from AIAPI.database import SessionLocal
+
+
+def cache_requests(result: str) -> float:
+    return metrics.REGISTRY.get_sample_value("milo_dashboard_cache_requests_total", {"result": result}) or 0.0
+
+
+def test_daily_stats_match_a_rebuild_from_events():
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, f"dash-{uuid.uuid4().hex[:8]}", "Dash", "x", hashed_password="-")
+        now = datetime.utcnow()
+        crud_profile.create_app_event(db, user.id, "meditation_session", "M", duration_minutes=12, created_at=now)
+        crud_profile.create_app_event(db, user.id, "meditation_session", "M", duration_minutes=8.5,
+                                      created_at=now - timedelta(days=1))
+        crud_profile.create_app_event(db, user.id, "dialog", "D", created_at=now - timedelta(days=2))
+        crud_profile.create_app_event(db, user.id, "dialog", "D", created_at=now - timedelta(days=20))
+
+        stats = crud_profile.get_dashboard_stats(db, user.id, 7)
+        assert stats["event_counts"] == {"meditation_session": 2, "dialog": 1}
+        assert stats["total_events"] == 3
+        assert stats["total_meditation_minutes"] == 20.5
+        assert stats["most_used_feature"] == "meditation_session"
+
+        dashboard.rebuild_daily_stats(db, user.id)
+        assert crud_profile.get_dashboard_stats(db, user.id, 7) == stats
+        assert crud_profile.get_dashboard_stats(db, user.id, 30)["total_events"] == 4
+    finally:
+        db.close()
+
+
+def test_cache_skips_results_computed_before_an_invalidation():
+    cache = DashboardCache(ttl=60)
+    generation = cache.generation(1)
+    cache.invalidate(1)  # una escritura llegó mientras se calculaba
+    cache.put(1, 7, {"total_events": 0}, generation)
+    assert cache.get(1, 7) is None
+    cache.put(1, 7, {"total_events": 1}, cache.generation(1))
+    assert cache.get(1, 7) == {"total_events": 1}
+
+
+def test_generations_stay_bounded_and_still_reject_stale_results():
+    cache = DashboardCache(ttl=60, max_users=2)
+    generation = cache.generation(1)
+    for user_id in range(1, 100):
+        cache.invalidate(user_id)
+    assert len(cache._generations) == 2
+    # La generación del usuario 1 ya se expulsó: el cálculo previo sigue sin guardarse
+    cache.put(1, 7, {"total_events": 0}, generation)
+    assert cache.get(1, 7) is None
+    cache.put(1, 7, {"total_events": 1}, cache.generation(1))
+    assert cache.get(1, 7) == {"total_events": 1}
+
+
+@pytest.mark.asyncio
+async def test_dashboard_is_cached_until_the_user_writes(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = await auth_headers(ac)
+
+        first = (await ac.get("/profile/dashboard", headers=headers)).json()
+        hits = cache_requests("hit")
+        assert (await ac.get("/profile/dashboard", headers=headers)).json() == first
+        assert cache_requests("hit") == hits + 1
+
+        readings = [{"recorded_at": datetime.utcnow().isoformat(), "heart_rate": 72}]
+        await ac.post("/profile/heart-rate/batch", json={"readings": readings}, headers=headers)
+        updated = (await ac.get("/profile/dashboard", headers=headers)).json()
+        assert first["heart_rate_stats"] is None
+        assert updated["heart_rate_stats"]["total_readings"] == 1
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+import httpx
+from main import app
+from AIAPI import llm
+from AIAPI.governor import Overloaded, UpstreamGovernor
+
+
+async def hold(governor, flow, mode, order, release):
+    async with governor.slot(mode, flow=flow):
+        order.append(flow)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_waiting_flows_are_served_fairly():
+    governor = UpstreamGovernor(max_concurrency=1, max_queue=50, max_queue_per_flow=20, max_wait=5)
+    order = []
+    gate = asyncio.Event()
+    blocker = asyncio.ensure_future(hold(governor, "blocker", "text", order, gate))
+    await asyncio.sleep(0)
+
+    async def call(flow, mode):
+        async with governor.slot(mode, flow=flow):
+            order.append(flow)
+
+    # Un usuario encola 6 mensajes de diálogo antes de que llegue la bienvenida de onboarding
+    tasks = [asyncio.ensure_future(call("user:1", "dialogo_sagrado")) for _ in range(6)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(call("onboarding:abc", "welcome")))
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(blocker, *tasks)
+
+    assert order.index("onboarding:abc") <= 2
+    assert governor.stats() == {"in_flight": 0, "queued": 0, "flows_waiting": 0}
+
+
+@pytest.mark.asyncio
+async def test_full_queues_reject_fast_with_retry_after():
+    governor = UpstreamGovernor(max_concurrency=1, max_queue=2, max_queue_per_flow=1, max_wait=5)
+    gate = asyncio.Event()
+    tasks = [asyncio.ensure_future(hold(governor, "user:1", "text", [], gate))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(hold(governor, "user:1", "text", [], gate)))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        async with governor.slot("text", flow="user:1"):
+            pass
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+    tasks.append(asyncio.ensure_future(hold(governor, "user:2", "text", [], gate)))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as exc:
+        async with governor.slot("text", flow="user:3"):
+            pass
+    assert exc.value.status_code == 503
+
+    gate.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_wait_timeout_and_cancellation_release_the_queue():
+    governor = UpstreamGovernor(max_concurrency=1, max_queue=10, max_queue_per_flow=10, max_wait=0.05)
+    gate = asyncio.Event()
+    blocker = asyncio.ensure_future(hold(governor, "user:1", "text", [], gate))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        async with governor.slot("text", flow="user:2"):
+            pass
+    assert exc.value.reason == "wait_timeout"
+
+    waiting = asyncio.ensure_future(hold(governor, "user:3", "text", [], gate))
+    await asyncio.sleep(0)
+    assert governor.queued == 1
+    waiting.cancel()
+    await asyncio.sleep(0)
+    assert governor.queued == 0
+
+    gate.set()
+    await blocker
+    assert governor.active == 0
+
+
+@pytest.mark.asyncio
+async def test_meditation_music_surfaces_overload_instead_of_fallback(monkeypatch, auth_headers):
+    async def chat(messages, **kwargs):
+        raise Overloaded(status_code=429, reason="queue_full", retry_after=3)
+
+    monkeypatch.setattr(llm, "chat", chat)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = await auth_headers(ac)
+        response = await ac.post("/meditation/music", headers=headers, json={"prompt": "calma", "mode": "music"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
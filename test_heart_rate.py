@@ -0,0 +1,117 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+import httpx
+from main import app
+from AIAPI import crud, crud_profile
+from AIAPI.database import SessionLocal
+
+
+@pytest.mark.asyncio
+async def test_batch_ingestion_deduplicates_readings(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = await auth_headers(ac)
+        now = datetime.utcnow().replace(microsecond=0)
+        readings = [
+            {"recorded_at": (now - timedelta(minutes=2)).isoformat(), "heart_rate": 64},
+            {"recorded_at": (now - timedelta(minutes=1)).isoformat() + "Z", "heart_rate": 66, "stress_level": 2},
+            {"recorded_at": (now - timedelta(minutes=1)).isoformat(), "heart_rate": 66, "device_type": "manual"},
+            {"recorded_at": (now - timedelta(minutes=2)).isoformat(), "heart_rate": 65},  # repetida en el lote
+        ]
+        response = await ac.post("/profile/heart-rate/batch", json={"readings": readings}, headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {"received": 4, "inserted": 3, "duplicates": 1}
+
+        response = await ac.post("/profile/heart-rate/batch", json={"readings": readings[:2]}, headers=headers)
+        assert response.json() == {"received": 2, "inserted": 0, "duplicates": 2}
+
+        history = (await ac.get("/profile/heart-rate?days=1", headers=headers)).json()
+        assert sorted((r["heart_rate"], r["device_type"]) for r in history) == [
+            (64, "smartwatch"), (66, "manual"), (66, "smartwatch")]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_invalid_readings_as_a_whole(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = await auth_headers(ac)
+        readings = [{"recorded_at": datetime.utcnow().isoformat(), "heart_rate": 70},
+                    {"recorded_at": datetime.utcnow().isoformat(), "heart_rate": 900}]
+        response = await ac.post("/profile/heart-rate/batch", json={"readings": readings}, headers=headers)
+        assert response.status_code == 422
+        assert (await ac.get("/profile/heart-rate?days=1", headers=headers)).json() == []
+
+
+def test_batch_matches_readings_stored_by_the_orm():
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, f"hr-{uuid.uuid4().hex[:8]}", "HR", "x", hashed_password="-")
+        recorded_at = datetime(2026, 1, 1, 8, 30, 15, 250000)
+        crud_profile.create_heart_rate_data(db, user.id, 70, recorded_at=recorded_at)
+        assert crud_profile.create_heart_rate_readings(db, user.id, [
+            {"recorded_at": recorded_at, "heart_rate": 71},
+            {"recorded_at": recorded_at + timedelta(seconds=1), "heart_rate": 72},
+        ]) == 1
+        assert crud_profile.simulate_heart_rate_data(db, user.id, 1) == 24
+    finally:
+        db.close()
+
+
+def test_batch_spans_several_insert_chunks(monkeypatch):
+    from AIAPI import rollups
+    monkeypatch.setattr(crud_profile, "HEART_RATE_INSERT_CHUNK", 4)
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, f"hr-{uuid.uuid4().hex[:8]}", "HR", "x", hashed_password="-")
+        start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        readings = [{"recorded_at": start + timedelta(seconds=20 * i), "heart_rate": 60 + i} for i in range(10)]
+        assert crud_profile.create_heart_rate_readings(db, user.id, readings) == 10
+        assert crud_profile.create_heart_rate_readings(db, user.id, readings[3:9]) == 0
+        stats = crud_profile.get_heart_rate_stats(db, user.id, 1)
+        assert (stats["total_readings"], stats["min"], stats["max"]) == (10, 60, 69)
+        rollups.rebuild_heart_rate_rollups(db, user.id)
+        assert crud_profile.get_heart_rate_stats(db, user.id, 1) == stats
+    finally:
+        db.close()
+
+
+def test_rollups_match_raw_readings_and_rebuild():
+    from AIAPI import rollups
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, f"hr-{uuid.uuid4().hex[:8]}", "HR", "x", hashed_password="-")
+        end = datetime.utcnow()
+        start = end - timedelta(days=3, hours=5)
+        readings = [{"recorded_at": start + timedelta(minutes=7 * i), "heart_rate": 50 + (i * 13) % 60}
+                    for i in range(int((end - start) / timedelta(minutes=7)))]
+        crud_profile.create_heart_rate_readings(db, user.id, readings[: len(readings) // 2])
+        crud_profile.create_heart_rate_readings(db, user.id, readings)  # solapado: la mitad repetida
+        crud_profile.create_heart_rate_data(db, user.id, 120, recorded_at=end - timedelta(seconds=5))
+        values = [r["heart_rate"] for r in readings if r["recorded_at"] >= end - timedelta(days=2)] + [120]
+
+        stats = crud_profile.get_heart_rate_stats(db, user.id, 2)
+        assert stats["total_readings"] == len(values)
+        assert stats["average"] == round(sum(values) / len(values), 1)
+        assert (stats["min"], stats["max"], stats["current"]) == (min(values), max(values), 120)
+
+        chart = crud_profile.get_heart_rate_chart(db, user.id, 7)
+        assert chart["resolution"] == "hour"
+        assert sum(p["readings"] for p in chart["points"]) == len(readings) + 1
+        assert crud_profile.get_heart_rate_chart(db, user.id, 30)["resolution"] == "day"
+
+        rollups.rebuild_heart_rate_rollups(db, user.id)
+        assert crud_profile.get_heart_rate_stats(db, user.id, 2) == stats
+    finally:
+        db.close()
+
+
+def test_window_spans_cover_the_window_without_overlap():
+    from AIAPI.rollups import window_spans
+    start, end = datetime(2026, 3, 1, 22, 47, 10), datetime(2026, 3, 5, 3, 12, 40)
+    spans = window_spans(start, end)
+    assert [s[0] for s in spans] == ["minute", "hour", "day", "hour", "minute"]
+    assert spans[0][1] == datetime(2026, 3, 1, 22, 47) and spans[-1][2] == datetime(2026, 3, 5, 3, 13)
+    assert all(a[2] == b[1] for a, b in zip(spans, spans[1:]))
+    assert window_spans(datetime(2026, 3, 1, 10, 5), datetime(2026, 3, 1, 10, 40)) == [
+        ("minute", datetime(2026, 3, 1, 10, 5), datetime(2026, 3, 1, 10, 40))]
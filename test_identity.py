@@ -0,0 +1,51 @@
+import time
+import uuid
+import pytest
+import httpx
+from main import app
+import AIAPI.crud as crud
+from AIAPI import metrics
+from AIAPI.database import SessionLocal
+from AIAPI.identity import IdentityCache, UserSnapshot, identity_cache
+
+
+def select_count() -> float:
+    return metrics.REGISTRY.get_sample_value("milo_db_query_seconds_count", {"operation": "select"}) or 0.0
+
+
+def test_snapshot_is_immutable_and_expires():
+    cache = IdentityCache(ttl=0.05)
+    snapshot = UserSnapshot(id=1, username="ana")
+    with pytest.raises(Exception):
+        snapshot.full_name = "Otra"
+    cache.put(snapshot)
+    assert cache.get("ana") is snapshot
+    time.sleep(0.06)
+    assert cache.get("ana") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_identity_skips_the_database_and_is_invalidated(auth_headers):
+    identity_cache.clear()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        username = f"identity-{uuid.uuid4().hex[:8]}"
+        headers = await auth_headers(ac, username, password="identidad123")
+        assert (await ac.get("/menu/opcion1", headers=headers)).status_code == 200
+        before = select_count()
+        assert (await ac.get("/menu/opcion1", headers=headers)).status_code == 200
+        assert select_count() == before
+
+        response = await ac.put("/profile/onboarding", headers=headers, json={"temple_name": "Templo Nuevo"})
+        assert response.status_code == 200
+        status = await ac.get("/user/onboarding-status", headers=headers)
+        assert status.json()["temple_name"] == "Templo Nuevo"
+
+        db = SessionLocal()
+        try:
+            crud.set_user_disabled(db, crud.get_user(db, username).id)
+        finally:
+            db.close()
+        assert (await ac.get("/menu/opcion1", headers=headers)).status_code == 401
+        relogin = await ac.post("/token", data={"username": username, "password": "identidad123"})
+        assert relogin.status_code == 401
@@ -0,0 +1,53 @@
+import pytest
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from AIAPI import llm
+from AIAPI.prompts import GENERATION_PROFILES, PROMPTS, get_generation_profile
+
+
+class RecordingCompletions:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=" Quietud. ")
+        usage = SimpleNamespace(prompt_tokens=30, completion_tokens=4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def test_every_prompt_mode_has_a_profile():
+    assert set(PROMPTS) <= set(GENERATION_PROFILES)
+    assert get_generation_profile("modo_desconocido").tier == "standard"
+
+
+def test_short_modes_route_to_fast_model(monkeypatch):
+    monkeypatch.setitem(llm.TIER_MODELS, "fast", "modelo-rapido")
+    monkeypatch.setitem(llm.TIER_MODELS, "standard", "modelo-completo")
+    assert llm.route_model("silencio_sagrado") == "modelo-rapido"
+    assert llm.route_model("medita_conmigo") == "modelo-completo"
+    monkeypatch.setitem(llm.MODEL_ROUTES, "medita_conmigo", "modelo-especial")
+    assert llm.route_model("medita_conmigo") == "modelo-especial"
+
+
+@pytest.mark.asyncio
+async def test_chat_applies_profile_and_records_tokens():
+    completions = RecordingCompletions()
+    llm.set_client(SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    model = llm.route_model("silencio_sagrado")
+    labels = {"profile": "silencio_sagrado", "model": model, "kind": "completion"}
+    before = REGISTRY.get_sample_value("milo_llm_tokens_total", labels) or 0
+    try:
+        assert await llm.chat([{"role": "user", "content": "..."}], mode="silencio_sagrado") == "Quietud."
+        call = completions.calls[0]
+        profile = GENERATION_PROFILES["silencio_sagrado"]
+        assert call["model"] == model
+        assert call["max_tokens"] == profile.max_tokens
+        assert call["stop"] == list(profile.stop)
+
+        await llm.chat([{"role": "user", "content": "..."}], mode="silencio_sagrado", temperature=1.0, max_tokens=10)
+        assert completions.calls[1]["temperature"] == 1.0
+        assert completions.calls[1]["max_tokens"] == 10
+    finally:
+        llm.set_client(None)
+    assert REGISTRY.get_sample_value("milo_llm_tokens_total", labels) == before + 8
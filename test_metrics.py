@@ -0,0 +1,51 @@
+import pytest
+import httpx
+from main import app
+from AIAPI import metrics
+from AIAPI.database import SessionLocal
+from sqlalchemy import text
+
+
+def sample(name: str, labels: dict) -> float:
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_engine_events_time_queries_by_operation():
+    before = sample("milo_db_query_seconds_count", {"operation": "select"})
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+    assert sample("milo_db_query_seconds_count", {"operation": "select"}) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_requires_token_when_configured(monkeypatch, auth_headers):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secreto")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        await auth_headers(ac)  # registro y login: observa el hash y la verificación de bcrypt
+        denied = await ac.get("/metrics")
+        wrong = await ac.get("/metrics", headers={"Authorization": "Bearer otro"})
+        allowed = await ac.get("/metrics", headers={"Authorization": "Bearer secreto"})
+    assert denied.status_code == 401
+    assert wrong.status_code == 401
+    assert allowed.status_code == 200
+    body = allowed.text
+    assert 'milo_password_hash_seconds_count{operation="verify"}' in body
+    assert "milo_db_query_seconds_bucket" in body
+    assert "http_request_duration_seconds" in body
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_is_closed_without_token_unless_opted_in(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        monkeypatch.setattr(metrics, "METRICS_PUBLIC", False)
+        closed = await ac.get("/metrics")
+        monkeypatch.setattr(metrics, "METRICS_PUBLIC", True)
+        opened = await ac.get("/metrics")
+    assert closed.status_code == 404
+    assert opened.status_code == 200
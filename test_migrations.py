@@ -0,0 +1,144 @@
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+from datetime import date, datetime
+from AIAPI import crud, crud_profile, dashboard, migrations, models
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_startup_check_refuses_an_outdated_schema(engine):
+    with pytest.raises(migrations.SchemaOutdated):
+        migrations.ensure_schema(engine, auto_migrate=False)
+    assert migrations.ensure_schema(engine, auto_migrate=True) == migrations.HEAD
+    assert migrations.ensure_schema(engine, auto_migrate=False) == migrations.HEAD
+    assert migrations.upgrade(engine) == []
+
+
+def test_upgrade_keeps_data_of_a_legacy_database(engine):
+    # BD creada antes de welcome_message y de los índices compuestos
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE user_onboarding_sessions (id INTEGER PRIMARY KEY, session_id VARCHAR NOT NULL, "
+                          "expires_at DATETIME)"))
+        conn.execute(text("INSERT INTO user_onboarding_sessions (session_id) VALUES ('legado')"))
+    assert migrations.upgrade(engine) == [1, 2, 3, 4, 5, 6]
+    inspector = inspect(engine)
+    assert "welcome_message" in {c["name"] for c in inspector.get_columns("user_onboarding_sessions")}
+    assert "ix_onboarding_expires_at" in {i["name"] for i in inspector.get_indexes("user_onboarding_sessions")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT session_id FROM user_onboarding_sessions")).scalar() == "legado"
+
+
+def test_unique_readings_migration_keeps_rows_with_null_keys(engine, caplog):
+    with engine.begin() as conn:
+        migrations.create_base_schema(conn)
+        migrations.create_per_user_indexes(conn)
+        for device in ("smartwatch", "smartwatch", None, None):
+            conn.execute(text("INSERT INTO heart_rate_data (user_id, heart_rate, recorded_at, device_type) "
+                              "VALUES (1, 70, '2026-01-01 08:00:00.000000', :device)"), {"device": device})
+        with caplog.at_level("WARNING", logger=migrations.__name__):
+            migrations.unique_heart_rate_readings(conn)
+        rows = conn.execute(text("SELECT id, device_type FROM heart_rate_data ORDER BY id")).all()
+    # Solo sobra la segunda smartwatch; las de device_type NULL no chocan con el índice único
+    assert rows == [(1, "smartwatch"), (3, None), (4, None)]
+    assert "1 lecturas de ritmo cardíaco repetidas eliminadas" in caplog.text
+
+
+def test_base_schema_does_not_follow_the_models(engine):
+    # La versión 1 crea solo las tablas previas a las migraciones, sin el índice único de la 3
+    with engine.begin() as conn:
+        migrations.create_base_schema(conn)
+    inspector = inspect(engine)
+    assert inspector.has_table("heart_rate_data")
+    assert not inspector.has_table("heart_rate_minute")
+    assert not inspector.has_table("user_daily_stats")
+    assert "ux_heart_rate_reading" not in {i["name"] for i in inspector.get_indexes("heart_rate_data")}
+
+
+def test_backfill_migrations_match_the_app_rebuilds(engine):
+    from AIAPI import rollups
+    with engine.begin() as conn:
+        for _, _, migrate in migrations.MIGRATIONS[:3]:
+            migrate(conn)
+        for i, (minute, bpm) in enumerate([(0, 60), (0, 80), (1, 70), (75, 90), (1500, 55)]):
+            conn.execute(text("INSERT INTO heart_rate_data (user_id, heart_rate, recorded_at, device_type) "
+                              "VALUES (1, :bpm, :at, 'smartwatch')"),
+                         {"bpm": bpm, "at": f"2026-01-0{1 + minute // 1440} {minute // 60 % 24:02d}:{minute % 60:02d}:{i:02d}.000000"})
+        for event_type, at, minutes in [("meditation_session", "2026-01-01 08:00:00", 10.0),
+                                        ("meditation_session", "2026-01-01 20:00:00", None),
+                                        (None, "2026-01-02 09:00:00", 5.0)]:
+            conn.execute(text("INSERT INTO app_events (user_id, event_type, duration_minutes, created_at) "
+                              "VALUES (1, :type, :minutes, :at)"), {"type": event_type, "minutes": minutes, "at": at})
+        migrations.heart_rate_rollups(conn)
+        migrations.user_daily_stats(conn)
+
+    tables = ["heart_rate_minute", "heart_rate_hour", "heart_rate_day", "user_daily_stats"]
+
+    def snapshot():
+        with engine.connect() as conn:
+            return {t: conn.execute(text(f"SELECT * FROM {t} ORDER BY 1, 2, 3")).all() for t in tables}
+
+    migrated = snapshot()
+    assert len(migrated["heart_rate_minute"]) == 4 and len(migrated["heart_rate_day"]) == 2
+    db = sessionmaker(bind=engine)()
+    try:
+        rollups.rebuild_heart_rate_rollups(db)
+        dashboard.rebuild_daily_stats(db)
+    finally:
+        db.close()
+    assert snapshot() == migrated
+
+
+def test_migrations_produce_the_schema_of_the_models(engine):
+    # Una columna o tabla nueva en models.py necesita su migración numerada
+    migrations.upgrade(engine)
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        assert inspector.has_table(table.name), table.name
+        assert {c["name"] for c in inspector.get_columns(table.name)} == set(table.columns.keys()), table.name
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def query_plans(engine, call) -> list:
+    """EXPLAIN QUERY PLAN de cada SELECT que ejecuta `call(db)`"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    db = sessionmaker(bind=engine)()
+    try:
+        call(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", capture)
+    with engine.connect() as conn:
+        return [" ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params))
+                for sql, params in statements]
+
+
+@pytest.mark.parametrize("call, index", [
+    (lambda db: crud.get_messages(db, 1, 7), "ix_messages_user_timestamp"),
+    (lambda db: crud.get_messages_after(db, 1, 10, 7), "ix_messages_user_timestamp"),
+    (lambda db: crud_profile.get_heart_rate_history(db, 1, 7), "ux_heart_rate_reading"),
+    (lambda db: crud_profile.get_app_events_history(db, 1, 30), "ix_app_events_user_created"),
+    (lambda db: crud_profile.get_app_events_history(db, 1, 30, "meditation_session"), "ix_app_events_user_type_created"),
+    (lambda db: crud.cleanup_expired_sessions(db), "ix_onboarding_expires_at"),
+    (lambda db: crud.get_messages_page(db, 1, 7, 50, (datetime(2026, 1, 1), 10)), "ix_messages_user_timestamp"),
+    (lambda db: crud_profile.get_heart_rate_page(db, 1, 7, 50, (datetime(2026, 1, 1), 10)), "ux_heart_rate_reading"),
+    (lambda db: crud_profile.get_app_events_page(db, 1, 30, 50, (datetime(2026, 1, 1), 10)), "ix_app_events_user_created"),
+    (lambda db: dashboard.event_totals(db, 1, date(2026, 1, 1)), "sqlite_autoindex_user_daily_stats_1"),
+])
+def test_hot_queries_use_the_composite_indexes(engine, call, index):
+    migrations.upgrade(engine)
+    plans = query_plans(engine, call)
+    assert plans, "la función no ejecutó ningún SELECT"
+    assert all(f"INDEX {index}" in plan for plan in plans), plans
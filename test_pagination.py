@@ -0,0 +1,95 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+import httpx
+from main import app
+from AIAPI import crud, crud_profile, pagination
+from AIAPI.database import SessionLocal
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    timestamp = datetime(2026, 5, 1, 12, 30, 5, 123456)
+    assert pagination.decode_cursor(pagination.encode_cursor(timestamp, 42)) == (timestamp, 42)
+    assert pagination.decode_cursor(None) is None
+    for token in ("no-es-un-cursor", "W10", "eyJ4IjoxfQ"):
+        with pytest.raises(pagination.InvalidCursor):
+            pagination.decode_cursor(token)
+
+
+def test_page_size_is_capped(monkeypatch):
+    monkeypatch.setattr(pagination, "PAGE_SIZE_MAX", 50)
+    assert pagination.page_size(None) == min(pagination.PAGE_SIZE_DEFAULT, 50)
+    assert pagination.page_size(10) == 10
+    assert pagination.page_size(100000) == 50
+
+
+async def login(ac: httpx.AsyncClient, auth_headers):
+    username = f"page-{uuid.uuid4().hex[:8]}"
+    headers = await auth_headers(ac, username)
+    db = SessionLocal()
+    try:
+        user_id = crud.get_user(db, username).id
+    finally:
+        db.close()
+    return user_id, headers
+
+
+async def follow(ac: httpx.AsyncClient, url: str, headers: dict) -> list:
+    pages = []
+    while url:
+        response = await ac.get(url, headers=headers)
+        assert response.status_code == 200
+        pages.append(response.json())
+        url = response.links.get("next", {}).get("url")
+        if url:
+            assert response.headers["X-Next-Cursor"] in url
+    return pages
+
+
+@pytest.mark.asyncio
+async def test_events_pages_follow_the_link_header_without_gaps(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id, headers = await login(ac, auth_headers)
+        db = SessionLocal()
+        try:
+            same_time = datetime.utcnow() - timedelta(hours=1)
+            for i in range(7):
+                # Varios con el mismo created_at: el id desempata
+                created_at = same_time if i < 4 else same_time - timedelta(minutes=i)
+                crud_profile.create_app_event(db, user_id, "dialog", f"E{i}", created_at=created_at)
+        finally:
+            db.close()
+
+        pages = await follow(ac, "/profile/events?limit=3", headers)
+        assert [len(page) for page in pages] == [3, 3, 1]
+        events = [event for page in pages for event in page]
+        assert sorted(e["event_name"] for e in events) == [f"E{i}" for i in range(7)]
+        keys = [(e["created_at"], e["id"]) for e in events]
+        assert keys == sorted(keys, reverse=True)
+
+        response = await ac.get("/profile/events?cursor=roto", headers=headers)
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_history_and_heart_rate_are_paginated(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        user_id, headers = await login(ac, auth_headers)
+        db = SessionLocal()
+        try:
+            for i in range(5):
+                crud.create_message(db, user_id, "user", f"mensaje {i}")
+        finally:
+            db.close()
+        now = datetime.utcnow()
+        readings = [{"recorded_at": (now - timedelta(minutes=i)).isoformat(), "heart_rate": 60 + i} for i in range(5)]
+        await ac.post("/profile/heart-rate/batch", json={"readings": readings}, headers=headers)
+
+        history = await follow(ac, "/dialogo_conmigo/history?limit=2", headers)
+        assert [m["content"] for page in history for m in page] == [f"mensaje {i}" for i in reversed(range(5))]
+
+        heart_rate = await follow(ac, "/profile/heart-rate?days=1&limit=4", headers)
+        assert [r["heart_rate"] for page in heart_rate for r in page] == [60, 61, 62, 63, 64]
+        assert "days=1" in (await ac.get("/profile/heart-rate?days=1&limit=4", headers=headers)).links["next"]["url"]
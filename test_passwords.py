@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import pytest
+from AIAPI.governor import Overloaded
+from AIAPI.passwords import PasswordHasher, hash_password
+
+
+@pytest.mark.asyncio
+async def test_hasher_runs_bcrypt_off_the_event_loop():
+    hasher = PasswordHasher(workers=1, max_pending=4)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        hashed = await hasher.hash("secreto123")
+        assert await hasher.verify("secreto123", hashed)
+        assert not await hasher.verify("otra", hashed)
+    finally:
+        task.cancel()
+        hasher.shutdown()
+    # El loop siguió atendiendo otras tareas mientras bcrypt calculaba
+    assert ticks > 3
+    assert hasher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_hasher_rejects_when_the_queue_is_full():
+    hasher = PasswordHasher(workers=1, max_pending=2)
+    release = threading.Event()
+    blocked = [asyncio.ensure_future(hasher.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as exc:
+        await hasher.run(hash_password, "secreto123")
+    assert exc.value.status_code == 503
+    release.set()
+    await asyncio.gather(*blocked)
+    hasher.shutdown()
+    assert hasher.pending == 0
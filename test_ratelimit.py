@@ -0,0 +1,94 @@
+import os
+import time
+import multiprocessing
+import pytest
+import httpx
+from main import app
+from AIAPI.ratelimit import MemoryBuckets, RateLimited, RateLimiter, SharedBuckets, fcntl, rate_limiter, route_cost
+
+
+def test_bucket_spends_route_costs_and_reports_retry_after():
+    limiter = RateLimiter(MemoryBuckets(), capacity=10, per_minute=60)
+    assert route_cost("generate", stream=True) > route_cost("generate")
+    assert route_cost("audio") > route_cost("generate")
+
+    limiter.hit(1, "audio")        # 4 fichas
+    limiter.hit(1, "audio")        # 8
+    with pytest.raises(RateLimited) as exc:
+        limiter.hit(1, "audio")    # faltan 2 fichas a 1 por segundo
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "2"
+    limiter.hit(1, "generate", stream=True)  # 2 fichas: aún caben
+    limiter.hit(2, "audio")                  # otro usuario, otro cubo
+
+
+def test_bucket_refills_over_time():
+    store = MemoryBuckets()
+    now = time.time()
+    assert store.take("user:1", 5, 5, 1.0, now) == (True, 0)
+    assert store.take("user:1", 1, 5, 1.0, now)[0] is False
+    assert store.take("user:1", 2, 5, 1.0, now + 2) == (True, 0)
+    assert store.take("user:1", 1, 5, 1.0, now + 100) == (True, 4)
+
+
+def _spend(path, count, results):
+    store = SharedBuckets(path, slots=64)
+    allowed = sum(store.take("user:7", 1, 50, 0.0, time.time())[0] for _ in range(count))
+    results.put(allowed)
+
+
+@pytest.mark.skipif(fcntl is None, reason="requiere fcntl")
+def test_shared_buckets_are_shared_across_processes(tmp_path):
+    path = str(tmp_path / "ratelimit.bin")
+    results = multiprocessing.get_context("fork").Queue()
+    workers = [multiprocessing.get_context("fork").Process(target=_spend, args=(path, 20, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    # 4 workers x 20 intentos contra un cubo de 50 fichas sin relleno
+    assert sum(results.get(timeout=5) for _ in workers) == 50
+
+
+@pytest.mark.skipif(fcntl is None, reason="requiere fcntl")
+def test_shared_buckets_reuse_the_stalest_slot_when_full(tmp_path):
+    store = SharedBuckets(str(tmp_path / "ratelimit.bin"), slots=4)
+    now = time.time()
+    for i in range(4):
+        store.take(f"user:{i}", 1, 10, 0.0, now + i)
+    # Una clave nueva expulsa la más antigua y empieza con el cubo lleno
+    assert store.take("user:new", 1, 10, 0.0, now + 10) == (True, 9)
+    reopened = SharedBuckets(store.path, slots=1024)
+    assert reopened.slots == 4
+    store.close()
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_generate_returns_429_when_the_user_bucket_is_empty(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = await auth_headers(ac)
+        capacity = rate_limiter.capacity
+        rate_limiter.capacity = 1
+        try:
+            first = await ac.post("/v1/generate", headers=headers, json={"prompt": "", "mode": "Playlist"})
+            second = await ac.post("/v1/generate", headers=headers, json={"prompt": "", "mode": "Playlist"})
+        finally:
+            rate_limiter.capacity = capacity
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) >= 1
+
+
+def test_default_path_follows_the_database(monkeypatch, tmp_path):
+    from AIAPI import ratelimit
+    from AIAPI.ratelimit import default_path
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'a' / 'milo.db'}")
+    first = default_path()
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'b' / 'milo.db'}")
+    assert default_path() != first
+    assert first == str(tmp_path / "a" / "milo.db-ratelimit")
+    monkeypatch.setenv("DATABASE_URL", "postgresql://milo@db/milo")
+    assert default_path() == os.path.join(os.path.dirname(os.path.abspath(ratelimit.__file__)), "milo_ratelimit.bin")
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from AIAPI import resilience
+from AIAPI.resilience import CircuitBreaker, UpstreamUnavailable, call_upstream
+from AIAPI.fallbacks import FALLBACKS, get_fallback
+
+
+def make_breaker(**kwargs):
+    config = {"window": 10, "min_calls": 4, "error_rate": 0.5, "slow_fraction": 0.8,
+              "slow_rate": 0.8, "open_seconds": 0.05}
+    config.update(kwargs)
+    return CircuitBreaker("test", **config)
+
+
+async def failing():
+    raise RuntimeError("upstream caído")
+
+
+async def ok():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_error_rate_and_fails_fast():
+    breaker = make_breaker()
+    for _ in range(4):
+        with pytest.raises(UpstreamUnavailable) as exc:
+            await call_upstream("text", failing, breaker)
+        assert exc.value.reason == "error"
+    assert breaker.state == resilience.OPEN
+
+    calls = 0
+
+    async def counted():
+        nonlocal calls
+        calls += 1
+        return "ok"
+
+    with pytest.raises(UpstreamUnavailable) as exc:
+        await call_upstream("text", counted, breaker)
+    assert exc.value.reason == "circuit_open"
+    assert calls == 0
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_or_reopens():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.01, 1.0)
+    assert breaker.state == resilience.OPEN
+
+    await asyncio.sleep(0.06)
+    assert breaker.state == resilience.HALF_OPEN
+    with pytest.raises(UpstreamUnavailable):
+        await call_upstream("text", failing, breaker)
+    assert breaker.state == resilience.OPEN
+
+    await asyncio.sleep(0.06)
+    assert await call_upstream("text", ok, breaker) == "ok"
+    assert breaker.state == resilience.CLOSED
+
+
+def test_slow_calls_are_relative_to_their_own_deadline():
+    breaker = make_breaker(window=5)
+    # 20 s de una meditación (plazo 45 s) o de TTS (30 s) no son lentos
+    for deadline in (45.0, 30.0, 45.0, 30.0, 45.0):
+        breaker.record(True, 20.0, deadline)
+    assert breaker.state == resilience.CLOSED
+    # 4,5 s de un modo con plazo de 5 s sí
+    for _ in range(5):
+        breaker.record(True, 4.5, 5.0)
+    assert breaker.state == resilience.OPEN
+
+
+@pytest.mark.asyncio
+async def test_slow_successful_probe_closes_the_breaker():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.01, 1.0)
+    await asyncio.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True, 0.95, 1.0)
+    assert breaker.state == resilience.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_deadline_raises_and_counts_as_failure(monkeypatch):
+    monkeypatch.setitem(resilience.MODE_DEADLINES, "silencio_sagrado", 0.02)
+    breaker = make_breaker(min_calls=1, error_rate=1.0)
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "tarde"
+
+    with pytest.raises(UpstreamUnavailable) as exc:
+        await call_upstream("silencio_sagrado", slow, breaker)
+    assert exc.value.reason == "deadline"
+    assert breaker.state == resilience.OPEN
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_uses_fastest_response(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_DELAY", 0.01)
+    delays = [0.5, 0.0]
+
+    async def call():
+        await asyncio.sleep(delays.pop(0))
+        return "rápida"
+
+    assert await call_upstream("text", call, make_breaker()) == "rápida"
+
+
+def test_fallback_per_mode():
+    assert get_fallback("silencio_sagrado", "deadline") in FALLBACKS["silencio_sagrado"]
+    assert get_fallback("modo_desconocido") in FALLBACKS["text"]
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from AIAPI.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "mensaje"
+
+    results = await asyncio.gather(*(flight.do("sesion-1", generate) for _ in range(5)))
+    assert results == ["mensaje"] * 5
+    assert calls == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_key_is_released():
+    flight = SingleFlight("test")
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream caído")
+
+    results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert not flight.in_flight("k")
+
+    async def ok():
+        return "ok"
+
+    assert await flight.do("k", ok) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "listo"
+
+    first = asyncio.ensure_future(flight.do("k", slow))
+    second = asyncio.ensure_future(flight.do("k", slow))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "listo"
@@ -0,0 +1,41 @@
+import uuid
+import pytest
+from sqlalchemy import text
+import AIAPI.crud as crud
+from AIAPI.database import SessionLocal, engine, read_engine
+from AIAPI.sqlite_profile import is_sqlite_file
+
+
+def test_only_file_urls_get_the_profile():
+    assert is_sqlite_file("sqlite:///./milo.db")
+    assert is_sqlite_file("sqlite+aiosqlite:////tmp/milo.db")
+    assert not is_sqlite_file("sqlite://")
+    assert not is_sqlite_file("sqlite:///:memory:")
+    assert not is_sqlite_file("postgresql://milo@db/milo")
+
+
+def test_pragmas_and_separate_reader_pool():
+    if read_engine is engine:
+        pytest.skip("perfil solo para SQLite en archivo")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 0
+    with read_engine.connect() as conn:
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+    assert engine.pool.size() == 1
+
+
+def test_session_reads_from_reader_and_writes_through_writer():
+    if read_engine is engine:
+        pytest.skip("perfil solo para SQLite en archivo")
+    db = SessionLocal()
+    try:
+        assert db.get_bind() is read_engine
+        user = crud.create_user(db, f"wal-{uuid.uuid4().hex[:8]}", "WAL", "x", hashed_password="-")
+        crud.create_message(db, user.id, "user", "hola")
+        assert db.get_bind() is read_engine  # transacción nueva tras el commit
+        assert [m.content for m in crud.get_messages(db, user.id, 5)] == ["hola"]
+    finally:
+        db.close()
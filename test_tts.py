@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from AIAPI import audio_cache, llm, tts
+from AIAPI.audio_cache import AudioCache
+from AIAPI.tts import split_script, synthesize_segments
+
+SCRIPT = (
+    "Cierra los ojos. Inhala lentamente, sostén el aire, y exhala. "
+    "Imagina una luz cálida en tu pecho que se expande con cada respiración.\n"
+    "Quédate aquí el tiempo que necesites.\n"
+    "Habito la calma que ya vive en mí."
+)
+
+
+def test_split_script_respects_limit_and_keeps_anchor_alone():
+    segments = split_script(SCRIPT, max_chars=80)
+    assert all(len(segment) <= 80 for segment in segments)
+    assert segments[-1] == "Habito la calma que ya vive en mí."
+    assert " ".join(segments).split() == SCRIPT.split()
+
+
+def test_split_script_cuts_long_sentences_at_pauses():
+    sentence = ", ".join(["respira con calma"] * 10) + "."
+    segments = split_script(sentence, max_chars=60)
+    assert len(segments) > 1
+    assert all(len(segment) <= 60 for segment in segments)
+
+
+@pytest.mark.asyncio
+async def test_segments_arrive_in_order_with_bounded_concurrency(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_cache, "_audio_cache", AudioCache(str(tmp_path)))
+    monkeypatch.setattr(tts, "TTS_CONCURRENCY", 2)
+    active = 0
+    peak = 0
+    calls = []
+
+    async def create(input, **kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        calls.append(input)
+        # Los primeros segmentos tardan más: el orden de entrega no debe cambiar
+        await asyncio.sleep(0.05 if input.startswith("uno") else 0.01)
+        active -= 1
+        return SimpleNamespace(content=input.encode("utf-8"))
+
+    llm.set_client(SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(create=create))))
+    try:
+        segments = ["uno.", "dos.", "tres.", "Habito la calma."]
+        results = [item async for item in synthesize_segments(segments, "nova")]
+        assert [index for index, _key, _hit in results] == [0, 1, 2, 3]
+        assert peak <= 2
+        cache = audio_cache.get_audio_cache()
+        assert open(cache.get(results[1][1]), "rb").read() == b"dos."
+
+        # Otra meditación con la misma frase de anclaje reutiliza su audio
+        again = [item async for item in synthesize_segments(["cuatro.", "Habito la calma."], "nova")]
+        assert again[1][2] is True
+        assert calls.count("Habito la calma.") == 1
+    finally:
+        llm.set_client(None)
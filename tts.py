@@ -0,0 +1,91 @@
+import os
+import re
+import asyncio
+from typing import AsyncIterator, List, Tuple
+
+from AIAPI.audio_cache import synthesize, DEFAULT_VOICE
+
+# --- TTS segmentado para guiones largos (medita_conmigo) ---
+# El guion se parte en frases o pausas de respiración y cada segmento se
+# sintetiza por separado: la reproducción empieza tras el primero y los
+# segmentos repetidos (p.ej. la frase de anclaje final) salen de la caché.
+SEGMENT_MAX_CHARS = int(os.getenv("MILO_TTS_SEGMENT_MAX_CHARS", "400"))
+TTS_CONCURRENCY = int(os.getenv("MILO_TTS_CONCURRENCY", "3"))  # segmentos en curso por guion
+TTS_MAX_INFLIGHT = int(os.getenv("MILO_TTS_MAX_INFLIGHT", "8"))  # llamadas TTS simultáneas por proceso
+
+SENTENCE_END = re.compile(r"(?<=[.!?…»\"])\s+|\n+")
+BREATH_PAUSE = re.compile(r"(?<=[,;:])\s+")
+
+_tts_slots = None
+
+
+def _slots() -> asyncio.Semaphore:
+    global _tts_slots
+    if _tts_slots is None:
+        _tts_slots = asyncio.Semaphore(TTS_MAX_INFLIGHT)
+    return _tts_slots
+
+
+def _pieces(text: str, max_chars: int) -> List[str]:
+    """Frases del guion; las demasiado largas se cortan en pausas (comas) o, en último caso, por palabras"""
+    pieces = []
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for part in BREATH_PAUSE.split(sentence):
+            while len(part) > max_chars:
+                cut = part.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(part[:cut].strip())
+                part = part[cut:].strip()
+            if part:
+                pieces.append(part)
+    return pieces
+
+
+def split_script(text: str, max_chars: int = SEGMENT_MAX_CHARS) -> List[str]:
+    """
+    Partir un guion en segmentos de hasta max_chars, respetando frases.
+    Las frases cortas consecutivas se agrupan, salvo la última (frase de anclaje),
+    que queda sola para reutilizar su audio entre meditaciones.
+    """
+    pieces = _pieces(text, max_chars)
+    if not pieces:
+        return []
+    anchor = pieces.pop() if len(pieces) > 1 else None
+    segments = []
+    for piece in pieces:
+        if segments and len(segments[-1]) + 1 + len(piece) <= max_chars:
+            segments[-1] = f"{segments[-1]} {piece}"
+        else:
+            segments.append(piece)
+    if anchor:
+        segments.append(anchor)
+    return segments
+
+
+async def synthesize_segments(segments: List[str], voice: str = DEFAULT_VOICE) -> AsyncIterator[Tuple[int, str, bool]]:
+    """
+    Sintetiza los segmentos con hasta TTS_CONCURRENCY en curso y los entrega en
+    orden como (índice, clave de audio, hit de caché) a medida que están listos.
+    """
+    async def run(segment: str):
+        async with _slots():
+            return await synthesize(segment, voice)
+
+    tasks = {}
+    try:
+        for index in range(len(segments)):
+            # Ventana deslizante: lanzar los siguientes mientras se espera el actual
+            for ahead in range(index, min(index + TTS_CONCURRENCY, len(segments))):
+                if ahead not in tasks:
+                    tasks[ahead] = asyncio.ensure_future(run(segments[ahead]))
+            key, hit = await tasks.pop(index)
+            yield index, key, hit
+    finally:
+        for task in tasks.values():
+            task.cancel()
@@ -1,33 +1,28 @@
-import os
 from database import engine
-import models
 import crud
 from database import SessionLocal
+from AIAPI.migrations import upgrade, HEAD
 
 print("🗄️ Actualizando base de datos con nuevos modelos...")
 
-# Eliminar archivo de base de datos antigua si existe
-if os.path.exists("milo.db"):
-    os.remove("milo.db")
-    print("✅ Base de datos antigua eliminada")
+# Migraciones versionadas: añaden tablas, columnas e índices sin borrar datos
+applied = upgrade(engine)
+print(f"✅ Esquema en la versión {HEAD} ({len(applied)} migraciones aplicadas)")
 
-# Crear todas las tablas con la estructura nueva
-models.Base.metadata.create_all(bind=engine)
-print("✅ Nuevas tablas creadas con estructura correcta")
-
-# Recrear usuarios
+# Usuarios iniciales (solo si no existen)
 db = SessionLocal()
 try:
-    # Crear usuarios
-    user1 = crud.create_user(db, "ebyted", "ebyted", "arkano")
-    print(f"✅ Usuario '{user1.username}' creado con ID: {user1.id}")
-    
-    user2 = crud.create_user(db, "admin", "Administrador", "admin123")
-    print(f"✅ Usuario '{user2.username}' creado con ID: {user2.id}")
+    for username, full_name, password in (("ebyted", "ebyted", "arkano"), ("admin", "Administrador", "admin123")):
+        user = crud.get_user(db, username)
+        if user:
+            print(f"ℹ️ Usuario '{user.username}' ya existe con ID: {user.id}")
+            continue
+        user = crud.create_user(db, username, full_name, password)
+        print(f"✅ Usuario '{user.username}' creado con ID: {user.id}")
     
     print("🎉 Base de datos actualizada completamente")
     
 except Exception as e:
     print(f"❌ Error: {e}")
 finally:
-    db.close()
\ No newline at end of file
+    db.close()